@@ -0,0 +1,41 @@
+import logging
+import time
+from controller.simulation import Simulation
+from engine.ensemble import EnsembleEngine
+from model.state import SimState
+
+"""
+Benchmark of the ensemble engine against running the simulations one after the other.
+Run from the sim folder with: python -m benchmarks.ensemble
+"""
+
+
+def create_state(size: int, seed: int) -> SimState:
+    state = SimState(size=size, susceptible_share=0.69, infected_share=0.01)
+    state.seed(seed)
+    return state
+
+
+def run(size: int = 100, replicas: int = 1000, sequential_runs: int = 3) -> None:
+    replica_days = 0
+    start = time.perf_counter()
+    for seed in range(sequential_runs):
+        simulation = Simulation(create_state(size, seed))
+        simulation.reset()
+        replica_days += simulation.run()
+    sequential = (time.perf_counter() - start) / replica_days * 1000
+
+    engine = EnsembleEngine(create_state(size, 1), replicas)
+    engine.reset()
+    start = time.perf_counter()
+    days = engine.run()
+    ensemble = (time.perf_counter() - start) / engine.elapsed_days().sum() * 1000
+
+    print(f'{replicas} replicas on a {size}x{size} grid, {days} days until all are extinct')
+    print(f'{"sequential simulations":>24}: {sequential:>8.3f} ms per replica and day')
+    print(f'{"ensemble engine":>24}: {ensemble:>8.3f} ms per replica and day')
+
+
+if __name__ == '__main__':
+    logging.disable(logging.INFO)
+    run()
@@ -0,0 +1,45 @@
+import logging
+import time
+from controller.simulation import Simulation
+from engine.gillespie import GillespieEngine
+from model.state import SimState
+
+"""
+Benchmark of the event driven engine against the day stepping simulation in a low prevalence regime (a handful of
+seeded infections on a large grid, the agents do not move).
+Run from the sim folder with: python -m benchmarks.gillespie
+"""
+
+
+def create_state(size: int, infected_share: float) -> SimState:
+    state = SimState(size=size, susceptible_share=0.69, infected_share=infected_share, infection_prob=0.1)
+    state.seed(1)
+    state.set_mixing_value_m(0)
+    return state
+
+
+def ms_per_day(sut, days: int) -> float:
+    start = time.perf_counter()
+    for _ in range(days):
+        sut.step()
+    return (time.perf_counter() - start) / days * 1000
+
+
+def run(size: int = 300, days: int = 10) -> None:
+    infected_share = 10 / size ** 2
+    simulation = Simulation(create_state(size, infected_share))
+    simulation.reset()
+    stepping = ms_per_day(simulation, days)
+
+    engine = GillespieEngine(create_state(size, infected_share))
+    engine.reset()
+    event_driven = ms_per_day(engine, days)
+
+    print(f'{size}x{size} grid with about 10 infected agents, {days} days, {engine.events()} events')
+    print(f'{"day stepping":>14}: {stepping:>8.3f} ms per day')
+    print(f'{"event driven":>14}: {event_driven:>8.3f} ms per day')
+
+
+if __name__ == '__main__':
+    logging.disable(logging.INFO)
+    run()
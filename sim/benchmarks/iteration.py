@@ -0,0 +1,49 @@
+import logging
+import time
+from numpy import uint
+from controller.scheduler import Scheduler
+from model.grid import Grid
+
+"""
+Benchmark of the random order iteration over the agents at different population densities.
+Run from the sim folder with: python -m benchmarks.iteration
+"""
+
+
+def full_grid_iteration(grid: Grid, exec) -> None:
+    """Former implementation, shuffles all cells including the empty ones. Kept as reference."""
+    size = grid.get_size()
+    cells = [grid.get_agent_at(index) for index in range(size * size)]
+    for i in grid.random_state().choice(len(cells), len(cells), replace=False):
+        agent = cells[i]
+        if agent is not None:
+            exec(agent)
+
+
+def measure(fn, repetitions: int) -> float:
+    """:return mean milliseconds per call"""
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        fn()
+    return (time.perf_counter() - start) / repetitions * 1000
+
+
+def run(size: int = 300, densities=(0.05, 0.25, 0.5, 0.9), repetitions: int = 10) -> None:
+    print(f'Random order iteration on a {size}x{size} grid (ms per pass)')
+    print(f'{"density":>8} {"agents":>8} {"full grid":>10} {"live agents":>12}')
+    for density in densities:
+        grid = Grid(Scheduler())
+        grid.place_agents_on_the_field(uint(size), uint(size), 1, density, 0.0)
+        visited = []
+
+        full = measure(lambda: full_grid_iteration(grid, visited.append), repetitions)
+        visited.clear()
+        live = measure(lambda: grid.exec_for_agents_in_rand_order(visited.append), repetitions)
+        visited.clear()
+
+        print(f'{density:>8.2f} {len(grid.live_agents()):>8} {full:>10.2f} {live:>12.2f}')
+
+
+if __name__ == '__main__':
+    logging.disable(logging.INFO)
+    run()
@@ -0,0 +1,60 @@
+import gc
+import logging
+import tracemalloc
+from numpy import uint
+from controller.scheduler import Scheduler
+from controller.simulation import Simulation
+from model.grid import Grid
+from model.state import SimState
+
+"""
+Memory benchmark of the agent representation.
+Run from the sim folder with: python -m benchmarks.memory
+"""
+
+
+def bytes_per_agent(size: int = 200, susceptible_share: float = 0.69, infected_share: float = 0.01) -> float:
+    """Measures the heap allocated per placed agent (agent record and its position)"""
+    grid = Grid(Scheduler())
+    grid.init_empty_grid(uint(size), uint(size))
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    grid.place_agents_on_the_field(uint(size), uint(size), 1, susceptible_share, infected_share)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    agent_count = round((susceptible_share + infected_share) * size * size)
+    return (after - before) / agent_count
+
+
+def heap_growth_across_resets(resets: int = 100, size: int = 50) -> (int, int):
+    """Resets one simulation repeatedly and measures how much heap and how many loggers are left behind.
+    :return Tuple of the heap growth in bytes and the number of newly registered loggers"""
+    state = SimState(size=uint(size))
+    state.seed(1)
+    simulation = Simulation(state)
+
+    tracemalloc.start()
+    simulation.reset()  # Warm up, traced so that freeing this grid is accounted for
+    gc.collect()
+    loggers_before = len(logging.Logger.manager.loggerDict)
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(resets):
+        simulation.reset()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    loggers_after = len(logging.Logger.manager.loggerDict)
+    tracemalloc.stop()
+
+    return after - before, loggers_after - loggers_before
+
+
+if __name__ == '__main__':
+    logging.disable(logging.INFO)
+
+    print(f'Bytes per agent: {bytes_per_agent():.1f}')
+
+    growth, loggers = heap_growth_across_resets()
+    print(f'Heap growth across 100 resets: {growth / 1024:.1f} KiB, new loggers: {loggers}')
@@ -0,0 +1,68 @@
+import gc
+import logging
+import time
+import tracemalloc
+import typing
+from controller.simulation import Simulation
+from model.state import SimState
+
+"""
+Benchmark of resetting a simulation, as done before every run of a batch.
+Compares resetting one simulation over and over (the grid and the state buffers are reused) with a new simulation
+per run. Run from the sim folder with: python -m benchmarks.reset
+"""
+
+
+def create_state(size: int) -> SimState:
+    state = SimState(size=size, susceptible_share=0.69, infected_share=0.01)
+    state.seed(1)
+    return state
+
+
+def reset_latency(size: int, resets: int, reuse: bool) -> float:
+    """:return Mean time of a reset in milliseconds"""
+    simulation = Simulation(create_state(size))
+    simulation.reset()
+    total = 0.0
+    for _ in range(resets):
+        if not reuse:
+            simulation = Simulation(create_state(size))
+        start = time.perf_counter()
+        simulation.reset()
+        total += time.perf_counter() - start
+    return total / resets * 1000
+
+
+def reset_allocations(size: int, reuse: bool) -> typing.Tuple[int, int]:
+    """Traces one reset after a warm up reset
+    :return Tuple of the number of allocated blocks and the peak of the traced memory in bytes"""
+    simulation = Simulation(create_state(size))
+    simulation.reset()
+    if not reuse:
+        simulation = Simulation(create_state(size))
+    gc.collect()
+
+    # Only the reset is traced, so the peak and the snapshot start with it (tracemalloc.reset_peak needs 3.9)
+    tracemalloc.start()
+    simulation.reset()
+    peak = tracemalloc.get_traced_memory()[1]
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    blocks = sum(stat.count for stat in snapshot.statistics('lineno'))
+    return blocks, peak
+
+
+def run(sizes=(100, 300), resets: int = 20) -> None:
+    print(f'{"size":>6} {"mode":>10} {"ms/reset":>10} {"blocks":>10} {"peak KiB":>10}')
+    for size in sizes:
+        for reuse in (False, True):
+            latency = reset_latency(size, resets, reuse)
+            blocks, peak = reset_allocations(size, reuse)
+            mode = 'in place' if reuse else 'new'
+            print(f'{size:>6} {mode:>10} {latency:>10.2f} {blocks:>10} {peak / 1024:>10.1f}')
+
+
+if __name__ == '__main__':
+    logging.disable(logging.INFO)
+    run()
@@ -0,0 +1,34 @@
+import logging
+import os
+import time
+from engine.tiled import TiledEngine
+from model.state import SimState
+
+"""
+Benchmark of the tile parallel engine for different numbers of worker processes.
+Run from the sim folder with: python -m benchmarks.tiled
+"""
+
+
+def run(size: int = 2000, days: int = 10) -> None:
+    cores = os.cpu_count() or 1
+    state = SimState(size=size, susceptible_share=0.69, infected_share=0.01)
+    state.seed(1)
+
+    print(f'Tiled engine on a {size}x{size} grid, {cores} tiles (ms per day)')
+    print(f'{"workers":>8} {"ms":>10}')
+    workers = 1
+    while workers <= cores:
+        with TiledEngine(state, tiles=cores, workers=workers) as engine:
+            engine.reset()
+            engine.step()  # Starts the workers
+            start = time.perf_counter()
+            for _ in range(days):
+                engine.step()
+            print(f'{workers:>8} {(time.perf_counter() - start) / days * 1000:>10.2f}')
+        workers *= 2
+
+
+if __name__ == '__main__':
+    logging.disable(logging.INFO)
+    run()
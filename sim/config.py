@@ -40,6 +40,25 @@ ACCENT_BRIGHTER_COLOR = (255, 102, 140)
 BATCH_RUN_ENABLED = False
 BATCH_RUN_ITERATIONS = 100
 BATCH_RESULT_FILE = 'BATCH_RESULT.txt'
+BATCH_SUMMARY_FILE = 'BATCH_SUMMARY.json'  # Streaming ensemble statistics of the batch run
+
+# Adaptive batch run: replicates run in parallel waves until the confidence intervals of the targets are tight
+# enough, BATCH_RUN_ITERATIONS is ignored then
+BATCH_ADAPTIVE_ENABLED = False
+BATCH_CONFIDENCE = 0.95
+BATCH_MIN_RUNS = 10
+BATCH_MAX_RUNS = 1000
+BATCH_WAVE_SIZE = None  # Defaults to the number of CPU cores
+# (metric, target half width, relative to the mean) of final_removed_share, peak_infected or peak_day
+BATCH_TARGETS = (
+    ('final_removed_share', 0.01, False),
+    ('peak_infected', 0.05, True),
+    ('peak_day', 1.0, False),
+)
+
+# Run the simulation in a child process that publishes frames to the UI through shared memory.
+# Batch runs always use the simulation in the UI process.
+REMOTE_SIMULATION_ENABLED = False
 
 # QT configuration
 styleSheet = f"""
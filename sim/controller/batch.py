@@ -0,0 +1,240 @@
+import copy
+import json
+import logging
+import multiprocessing
+import os
+import typing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.stats import t
+
+import config as cfg
+from controller.simulation import Simulation
+from model.state import SimState
+from util.statistics import EnsembleStatistics, RunningStatistics, COMPARTMENTS
+
+"""
+Adaptive replication: runs replicates of a scenario in parallel waves until the confidence intervals of the
+chosen statistics are tight enough or the maximum number of runs is reached.
+Run headless from the sim folder with: python -m controller.batch
+"""
+
+
+def run_metrics(counts: np.ndarray) -> dict:
+    """
+    Statistics of a single run.
+    :param counts: Compartment counts of shape (days, compartments), in the order of COMPARTMENTS
+    :return: final_removed_share (share of removed, dead and immune agents at the end), peak_infected and
+             peak_day (first day with the maximum infected count)
+    """
+    removed = counts[:, [COMPARTMENTS.index('removed'), COMPARTMENTS.index('dead'), COMPARTMENTS.index('immune')]]
+    infected = counts[:, COMPARTMENTS.index('infected')]
+    total = counts[-1].sum()
+    return {
+        'final_removed_share': float(removed[-1].sum() / total) if total > 0 else 0.0,
+        'peak_infected': float(infected.max()),
+        'peak_day': float(np.argmax(infected)),
+    }
+
+
+METRICS = ('final_removed_share', 'peak_infected', 'peak_day')
+
+
+class RunResult(typing.NamedTuple):
+    seed: int
+    counts: np.ndarray
+    metrics: dict
+
+
+def run_replicate(state: SimState, seed: int) -> RunResult:
+    """Runs one replicate of the scenario until the epidemic is over
+    :param state: Settings of the scenario, a copy is used
+    :param seed: Seed of the replicate"""
+    state = copy.deepcopy(state)
+    state.seed(seed)
+    simulation = Simulation(state)
+    simulation.reset()
+
+    def counts() -> tuple:
+        return (state.susceptible_count(), state.infected_count(), state.removed_count(), state.dead_count(),
+                state.immune_count(), state.incubation_count())
+
+    series = [counts()]
+    while not simulation.is_finished():
+        simulation.step()
+        series.append(counts())
+
+    series = np.array(series, dtype=float)
+    return RunResult(seed, series, run_metrics(series))
+
+
+class BatchTarget(typing.NamedTuple):
+    """Stopping rule of a statistic: the half width of its confidence interval must not exceed half_width,
+    relative to the absolute mean if relative is set"""
+    metric: str
+    half_width: float
+    relative: bool = False
+
+
+class AdaptiveBatch:
+    """Runs replicates of a scenario in parallel waves until all targets are met.
+    After every wave the confidence interval of the mean of every target statistic is computed with the
+    t distribution. The batch stops once every half width is within its target (and at least min_runs were run)
+    or max_runs is reached. The replicate seeds are derived from the seed of the state, so a batch is
+    reproducible independent of the number of workers."""
+
+    def run(self, on_run: typing.Callable[[int, RunResult], None] = None) -> dict:
+        """
+        Runs the batch.
+        :param on_run: Called with the index and the result of every finished run, in run order
+        :return: Report of the stopping rule and the achieved precision, see report()
+        """
+        self.__statistics = EnsembleStatistics()
+        self.__metrics = {metric: RunningStatistics() for metric in METRICS}
+        self.__runs = 0
+        self.__waves = 0
+
+        # Spawn instead of fork, the calling process may run a Qt application (see controller.remote)
+        executor = ProcessPoolExecutor(max_workers=self.__workers, mp_context=multiprocessing.get_context('spawn')) \
+            if self.__workers > 1 else None
+        try:
+            while not self.__is_done():
+                count = min(self.__wave_size, self.__max_runs - self.__runs)
+                seeds = [self.__seed_of(self.__runs + i) for i in range(count)]
+                if executor is None:
+                    results = [run_replicate(self.__state, seed) for seed in seeds]
+                else:
+                    results = list(executor.map(run_replicate, [self.__state] * count, seeds))
+
+                for result in results:
+                    self.__statistics.add_run(result.counts)
+                    for metric in METRICS:
+                        self.__metrics[metric].push(result.metrics[metric])
+                    if on_run is not None:
+                        on_run(self.__runs, result)
+                    self.__runs += 1
+                self.__waves += 1
+                self.__logger.info(f'Wave {self.__waves} done, {self.__runs} runs')
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        return self.report()
+
+    def statistics(self) -> EnsembleStatistics:
+        """Per day statistics of all runs"""
+        return self.__statistics
+
+    def half_width(self, metric: str) -> float:
+        """Half width of the confidence interval of the mean of a metric, infinite for less than two runs"""
+        statistics = self.__metrics[metric]
+        n = statistics.count()
+        if n < 2:
+            return float('inf')
+        return float(t.ppf((1 + self.__confidence) / 2, n - 1) * statistics.std() / np.sqrt(n))
+
+    def report(self) -> dict:
+        """:return JSON serializable report of the stopping rule and the achieved precision"""
+        precision = dict()
+        for metric in METRICS:
+            statistics = self.__metrics[metric]
+            entry = {
+                'mean': float(statistics.mean()),
+                'std': float(statistics.std()),
+                'half_width': self.half_width(metric),
+            }
+            target = self.__target_of(metric)
+            if target is not None:
+                entry['target_half_width'] = target.half_width
+                entry['relative'] = target.relative
+                entry['met'] = self.__is_met(target)
+            precision[metric] = entry
+
+        return {
+            'rule': 'confidence interval half width',
+            'confidence': self.__confidence,
+            'min_runs': self.__min_runs,
+            'max_runs': self.__max_runs,
+            'wave_size': self.__wave_size,
+            'runs': self.__runs,
+            'waves': self.__waves,
+            'stopped_by': 'precision' if self.__targets_met() else 'max_runs',
+            'precision': precision,
+        }
+
+    def __target_of(self, metric: str) -> typing.Optional[BatchTarget]:
+        for target in self.__targets:
+            if target.metric == metric:
+                return target
+        return None
+
+    def __is_met(self, target: BatchTarget) -> bool:
+        allowed = target.half_width
+        if target.relative:
+            allowed *= abs(float(self.__metrics[target.metric].mean()))
+        return self.half_width(target.metric) <= allowed
+
+    def __targets_met(self) -> bool:
+        return self.__runs >= self.__min_runs and all(self.__is_met(target) for target in self.__targets)
+
+    def __is_done(self) -> bool:
+        return self.__runs >= self.__max_runs or self.__targets_met()
+
+    def __seed_of(self, run: int) -> int:
+        return int(np.random.SeedSequence([self.__state.get_seed(), run]).generate_state(1)[0])
+
+    def __init__(self, state: SimState, targets: typing.Sequence[BatchTarget], confidence: float = 0.95,
+                 min_runs: int = 10, max_runs: int = 1000, wave_size: int = None, workers: int = None):
+        """
+        :param state: Settings of the scenario
+        :param targets: Stopping rules, see BatchTarget
+        :param confidence: Confidence level of the intervals
+        :param min_runs: Number of runs before the targets are checked
+        :param max_runs: Upper bound of runs
+        :param wave_size: Number of runs per wave, defaults to the number of workers
+        :param workers: Number of worker processes, defaults to the number of CPU cores. With one worker the runs
+                        are done in the calling process.
+        """
+        for target in targets:
+            if target.metric not in METRICS:
+                raise ValueError(f'Unknown metric {target.metric}, expected one of {METRICS}')
+
+        self.__logger = logging.getLogger("batch")
+        self.__state = state
+        self.__targets = tuple(targets)
+        self.__confidence = confidence
+        self.__min_runs = max(2, min_runs)
+        self.__max_runs = max_runs
+        self.__workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.__wave_size = wave_size if wave_size is not None else self.__workers
+        self.__statistics = EnsembleStatistics()
+        self.__metrics = {metric: RunningStatistics() for metric in METRICS}
+        self.__runs = 0
+        self.__waves = 0
+
+
+def configured_batch(state: SimState) -> AdaptiveBatch:
+    """:return An AdaptiveBatch with the settings of the configuration"""
+    return AdaptiveBatch(
+        state,
+        targets=[BatchTarget(*target) for target in cfg.BATCH_TARGETS],
+        confidence=cfg.BATCH_CONFIDENCE,
+        min_runs=cfg.BATCH_MIN_RUNS,
+        max_runs=cfg.BATCH_MAX_RUNS,
+        wave_size=cfg.BATCH_WAVE_SIZE,
+    )
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("grid").setLevel(logging.WARNING)
+
+    batch = configured_batch(SimState(
+        size=cfg.DEFAULT_SIZE,
+        susceptible_share=cfg.DEFAULT_SUSCEPTIBLE_SHARE,
+        infected_share=cfg.DEFAULT_INFECTED_SHARE,
+        infection_prob=cfg.DEFAULT_INFECTION_PROB,
+        remove_prob=cfg.DEFAULT_REMOVE_PROB
+    ))
+    print(json.dumps(batch.run(), indent=2))
@@ -0,0 +1,50 @@
+import typing
+from controller.events import Events
+
+
+class Dispatcher:
+    """Lightweight event dispatcher used by the scheduler.
+    Every event of the Events enum owns an immutable tuple of handlers, which is rebuilt on (un-)registration
+    only. Triggering an event is a single dict lookup and a loop over that tuple, events without
+    listeners are skipped entirely."""
+
+    def __init__(self):
+        self.__handlers: typing.Dict[Events, tuple] = {event: () for event in Events}
+
+    def on(self, event: Events, handler: typing.Callable) -> None:
+        """Registers a handler for the passed event.
+        :param event: Event to listen to
+        :param handler: Callable, called with the keyword arguments of the triggered event"""
+        self.__handlers[event] = self.__handlers[event] + (handler,)
+
+    def off(self, event: Events, handler: typing.Callable) -> None:
+        """Unregisters a handler from the passed event. Unknown handlers are ignored.
+        :param event: Event the handler was registered for
+        :param handler: Handler to remove"""
+        self.__handlers[event] = tuple(h for h in self.__handlers[event] if h != handler)
+
+    def is_registered(self, event: Events, handler: typing.Callable) -> bool:
+        return handler in self.__handlers[event]
+
+    def has_handlers(self, event: Events) -> bool:
+        return len(self.__handlers[event]) > 0
+
+    def handlers(self, event: Events) -> tuple:
+        """Returns the currently bound handlers of an event.
+        The tuple is never mutated, so it is safe to iterate while handlers are (un-)registered."""
+        return self.__handlers[event]
+
+    def trigger(self, event: Events, kw: typing.Any = None) -> None:
+        """Calls all handlers of an event with the passed keyword arguments.
+        :param event: Event to trigger
+        :param kw: Dictionary of keyword arguments for the handlers"""
+        handlers = self.__handlers[event]
+        if not handlers:
+            return
+
+        if kw:
+            for handler in handlers:
+                handler(**kw)
+        else:
+            for handler in handlers:
+                handler()
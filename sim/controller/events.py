@@ -9,6 +9,8 @@ class Events(Enum):
     PRE_NEXT_STEP = "pre_next_step"
     AGENT_MOVEMENT = "agent_movement"
     STATUS_UPDATE = "status_update"
+    POST_STATUS_UPDATE = "post_status_update"
     REPAINT = "repaint"
     RESET = "reset"
     AGENT_CHANGE_GUI = "agent_change_gui"
+    BULK_AGENT_CHANGE_GUI = "bulk_agent_change_gui"
@@ -0,0 +1,365 @@
+import multiprocessing
+import time
+import typing
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+
+import numpy as np
+
+from controller.simulation import Simulation
+from model.state import SimState
+from model.strategies.movement_strategy import LimitedMovementStrategy, DefaultMovementStrategy
+from util.metric import calc_effective_reproduction_number
+
+"""
+Runs a simulation in a child process, so the simulation and the UI do not share the GIL.
+The child publishes a frame (states of all cells plus counters) after every day into a shared memory ring
+buffer, the UI reads all frames it has not seen yet in order whenever it repaints. The child does not simulate
+further while the UI is a whole ring behind, so no day is lost. Commands go over a pipe.
+"""
+
+# Settings that can be changed while the simulation is running, as (getter, setter) pairs
+LIVE_SETTINGS = (
+    (SimState.infection_prob, SimState.set_infection_prob),
+    (SimState.remove_prob, SimState.set_remove_prob),
+    (SimState.infection_env_radius, SimState.set_infection_env_radius),
+    (SimState.infection_env_metric, SimState.set_infection_env_metric),
+    (SimState.speed, SimState.set_speed),
+    (SimState.get_mixing_value_m, SimState.set_mixing_value_m),
+    (SimState.calculate_real_effective_reproduction_number, SimState.set_calculate_real_effective_reproduction_number),
+    (SimState.lethality_toggle, SimState.set_lethality_toggle),
+    (SimState.lethality, SimState.set_lethality),
+    (SimState.vaccine_toggle, SimState.set_vaccine_toggle),
+    (SimState.vaccine_time, SimState.set_vaccine_time),
+    (SimState.vaccine_share, SimState.set_vaccine_share),
+    (SimState.vaccine_daily_capacity, SimState.set_vaccine_daily_capacity),
+    (SimState.movement_limit_enabled, SimState.set_movement_limit_enabled),
+    (SimState.movement_limit_radius, SimState.set_movement_limit_radius),
+    (SimState.movement_limit_metric, SimState.set_movement_limit_metric),
+    (SimState.movement_limit_high_distances_are_uncommon, SimState.set_movement_limit_high_distances_are_uncommon),
+    (SimState.incubation_period_enabled, SimState.set_incubation_period_enabled),
+    (SimState.incubation_period, SimState.set_incubation_period),
+    (SimState.quarantine_enabled, SimState.set_quarantine_enabled),
+    (SimState.quarantine_share, SimState.set_quarantine_share),
+    (SimState.update_mode, SimState.set_update_mode),
+    (SimState.transition_calendar_enabled, SimState.set_transition_calendar_enabled),
+    (SimState.bulk_movement_enabled, SimState.set_bulk_movement_enabled),
+)
+
+# Layout of the cursors in front of the ring buffer slots
+_CURSOR_LATEST = 0  # Number of the last published frame
+_CURSOR_READ = 1  # Number of the last frame the reader copied
+_CURSOR_LENGTH = 2
+
+# Layout of the header of a ring buffer slot
+_HEADER_SEQUENCE = 0  # Number of the frame, -1 while the slot is written
+_HEADER_DAY = 1
+_HEADER_QUARANTINED = 2
+_HEADER_BEGINNING_TOTAL = 3
+_HEADER_R = 4
+_HEADER_FINISHED = 5
+_HEADER_RUN = 6  # Number of the reset the frame belongs to
+_HEADER_LENGTH = 8
+
+
+def live_settings_of(state: SimState) -> tuple:
+    """:return Values of all LIVE_SETTINGS of the state"""
+    return tuple(getter(state) for getter, _ in LIVE_SETTINGS)
+
+
+def apply_live_settings(state: SimState, values: tuple) -> None:
+    for (_, setter), value in zip(LIVE_SETTINGS, values):
+        setter(state, value)
+
+
+class Frame(typing.NamedTuple):
+    """State of the simulation after a day"""
+    sequence: int
+    run: int
+    day: int
+    data: np.ndarray
+    quarantined_count: int
+    beginning_total_count: int
+    r_value: float
+    finished: bool
+
+
+class FrameRing:
+    """Ring buffer of frames in shared memory with a single writer and a single reader.
+    The writer marks a slot as busy, fills it and publishes its sequence number afterwards. The reader copies the
+    frames in order and discards a copy if the slot was overwritten meanwhile (seqlock). The writer should not
+    write while the ring is full, i.e. while the reader did not copy the frame in the slot to be written next."""
+
+    def name(self) -> str:
+        return self.__block.name
+
+    def size(self) -> int:
+        return self.__size
+
+    def slots(self) -> int:
+        return self.__slots
+
+    def is_full(self) -> bool:
+        """:return Whether the next write would overwrite a frame the reader did not copy yet"""
+        return self.__cursors[_CURSOR_LATEST] - self.__cursors[_CURSOR_READ] >= self.__slots
+
+    def write(self, run: int, day: int, data: np.ndarray, quarantined_count: int, beginning_total_count: int,
+              r_value: float, finished: bool) -> int:
+        """Publishes a frame
+        :return the sequence number of the frame"""
+        sequence = int(self.__cursors[_CURSOR_LATEST]) + 1
+        slot = sequence % self.__slots
+        header = self.__headers[slot]
+        header[_HEADER_SEQUENCE] = -1
+        self.__frames[slot] = data
+        header[_HEADER_DAY] = day
+        header[_HEADER_QUARANTINED] = quarantined_count
+        header[_HEADER_BEGINNING_TOTAL] = beginning_total_count
+        header[_HEADER_R] = r_value
+        header[_HEADER_FINISHED] = finished
+        header[_HEADER_RUN] = run
+        header[_HEADER_SEQUENCE] = sequence
+        self.__cursors[_CURSOR_LATEST] = sequence
+        return sequence
+
+    def read(self, after: int = -1) -> typing.Optional[Frame]:
+        """Copies the frame following the passed one and marks it as read. If it was overwritten already, the
+        oldest frame still held is copied instead
+        :param after: Sequence number of the last frame the caller has seen
+        :return the frame or None if there is no newer one (or it was overwritten while copying)"""
+        latest = int(self.__cursors[_CURSOR_LATEST])
+        if latest <= after:
+            return None
+
+        sequence = max(after + 1, latest - self.__slots + 1)
+        slot = sequence % self.__slots
+        header = self.__headers[slot].copy()
+        data = self.__frames[slot].copy()
+        if header[_HEADER_SEQUENCE] != sequence or self.__headers[slot][_HEADER_SEQUENCE] != sequence:
+            return None  # Torn, the next call gets a newer frame
+        self.__cursors[_CURSOR_READ] = sequence
+        return Frame(sequence, int(header[_HEADER_RUN]), int(header[_HEADER_DAY]), data,
+                     int(header[_HEADER_QUARANTINED]), int(header[_HEADER_BEGINNING_TOTAL]), float(header[_HEADER_R]),
+                     bool(header[_HEADER_FINISHED]))
+
+    def close(self) -> None:
+        self.__cursors = None
+        self.__headers = None
+        self.__frames = None
+        self.__block.close()
+
+    def unlink(self) -> None:
+        self.__block.unlink()
+
+    def __init__(self, size: int, slots: int = 4, name: str = None):
+        """
+        :param size: Number of rows and columns of the frames
+        :param slots: Number of frames held
+        :param name: Name of an existing ring buffer to attach to, a new one is created if omitted
+        """
+        header_bytes = (_CURSOR_LENGTH + slots * _HEADER_LENGTH) * 8
+        if name is None:
+            self.__block = shared_memory.SharedMemory(create=True, size=header_bytes + slots * size * size)
+        else:
+            self.__block = shared_memory.SharedMemory(name=name)
+        self.__size = size
+        self.__slots = slots
+
+        buffer = self.__block.buf
+        self.__cursors = np.ndarray((_CURSOR_LENGTH,), dtype=np.float64, buffer=buffer)
+        self.__headers = np.ndarray((slots, _HEADER_LENGTH), dtype=np.float64, buffer=buffer,
+                                    offset=_CURSOR_LENGTH * 8)
+        self.__frames = np.ndarray((slots, size, size), dtype=np.int8, buffer=buffer, offset=header_bytes)
+        if name is None:
+            self.__cursors[:] = -1
+            self.__headers[:, _HEADER_SEQUENCE] = -1
+
+
+def _serve(connection: Connection) -> None:
+    """Main loop of the child process"""
+    state = SimState()
+    simulation = Simulation(state)
+    ring = None
+    playing = False
+    pending_steps = 0
+    run = 0
+    day = 0
+
+    def publish() -> None:
+        r_value = 0.0
+        if state.calculate_real_effective_reproduction_number() or day == 0:
+            r_value = calc_effective_reproduction_number(
+                simulation.get_grid(),
+                remove_probability=state.remove_prob(),
+                infection_probability=state.infection_prob(),
+                infection_radius=state.infection_env_radius(),
+                infection_metric=state.infection_env_metric()
+            )
+        ring.write(run, day, state.data(), state.get_quarantined_count(), state.get_beginning_total_count(), r_value,
+                   simulation.is_finished())
+
+    def apply(values: tuple) -> None:
+        apply_live_settings(state, values)
+        if state.movement_limit_enabled():
+            if not isinstance(simulation.get_movement_strategy(), LimitedMovementStrategy):
+                simulation.set_movement_strategy(LimitedMovementStrategy())
+        elif not isinstance(simulation.get_movement_strategy(), DefaultMovementStrategy):
+            simulation.set_movement_strategy(DefaultMovementStrategy())
+
+    while True:
+        stepping = ring is not None and (playing or pending_steps > 0)
+        if stepping and ring.is_full():
+            # The UI is a whole ring behind, wait until it read a frame
+            has_command = connection.poll(0.001)
+        elif stepping:
+            # Wait for commands instead of sleeping, so the process stays responsive
+            delay = state.speed() / 1000 if playing and pending_steps == 0 else 0
+            has_command = connection.poll(delay)
+        else:
+            has_command = connection.poll(None)
+
+        if has_command:
+            command, payload = connection.recv()
+            if command == 'settings':
+                apply(payload)
+            elif command == 'reset':
+                ring_name, run, size, susceptible_share, infected_share, seed, values = payload
+                if ring is not None:
+                    ring.close()
+                ring = FrameRing(size, name=ring_name)
+                playing = False
+                pending_steps = 0
+                day = 0
+
+                state.set_size(size)
+                state.set_infected_share(0)  # Prevent errors due to shares being more than 1.0 in sum
+                state.set_susceptible_share(susceptible_share)
+                state.set_infected_share(infected_share)
+                state.seed(seed)
+                apply(values)
+                simulation.reset()
+                publish()
+            elif command == 'step' and ring is not None:
+                pending_steps += 1
+            elif command == 'play':
+                playing = ring is not None
+            elif command == 'pause':
+                playing = False
+            elif command == 'stop':
+                break
+            continue
+
+        if not stepping or ring.is_full():
+            continue
+
+        simulation.step()
+        day += 1
+        publish()
+        if pending_steps > 0:
+            pending_steps -= 1
+        else:
+            playing = not simulation.is_finished()
+
+    if ring is not None:
+        ring.close()
+    connection.close()
+
+
+class RemoteSimulation:
+    """Handle of a simulation running in a child process.
+    Settings are taken from a SimState of the calling process: the ones needed to place the agents are sent
+    with reset, all LIVE_SETTINGS are sent whenever sync notices a change."""
+
+    def reset(self, state: SimState) -> None:
+        """Resets the simulation with the settings of the state, the child publishes a frame of day 0.
+        Frames of the runs before that are not returned anymore"""
+        size = int(state.size())
+        old_ring = self.__ring
+        if old_ring is None or old_ring.size() != size:
+            # The child keeps the old block mapped until it attached the new one, unlinking only removes the name
+            self.__ring = FrameRing(size)
+            self.__last_sequence = -1
+            if old_ring is not None:
+                old_ring.close()
+                old_ring.unlink()
+        self.__run += 1
+
+        self.__settings = live_settings_of(state)
+        self.__connection.send(('reset', (self.__ring.name(), self.__run, size, state.susceptible_share(),
+                                          state.infected_share(), state.get_seed(), self.__settings)))
+
+    def sync(self, state: SimState) -> None:
+        """Sends the live settings of the state if they changed since the last call"""
+        settings = live_settings_of(state)
+        if settings != self.__settings:
+            self.__settings = settings
+            self.__connection.send(('settings', settings))
+
+    def step(self) -> None:
+        self.__connection.send(('step', None))
+
+    def play(self) -> None:
+        self.__connection.send(('play', None))
+
+    def pause(self) -> None:
+        self.__connection.send(('pause', None))
+
+    def next_frame(self) -> typing.Optional[Frame]:
+        """:return the oldest frame of the current run that was not returned before, else None"""
+        if self.__ring is None:
+            return None
+        while True:
+            frame = self.__ring.read(self.__last_sequence)
+            if frame is None:
+                return None
+            self.__last_sequence = frame.sequence
+            if frame.run == self.__run:
+                return frame
+
+    def wait_frame(self, timeout: float = 10.0) -> Frame:
+        """Blocks until the next frame is published
+        :raise TimeoutError if no frame was published within timeout seconds"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            frame = self.next_frame()
+            if frame is not None:
+                return frame
+            time.sleep(0.001)
+        raise TimeoutError('No frame was published')
+
+    def close(self) -> None:
+        """Stops the child process and frees the ring buffer"""
+        if self.__process is None:
+            return
+        try:
+            self.__connection.send(('stop', None))
+        except (BrokenPipeError, OSError):
+            pass
+        self.__process.join(timeout=5)
+        if self.__process.is_alive():
+            self.__process.terminate()
+        self.__process = None
+        self.__connection.close()
+        if self.__ring is not None:
+            self.__ring.close()
+            self.__ring.unlink()
+            self.__ring = None
+
+    def __enter__(self) -> 'RemoteSimulation':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def __init__(self):
+        # Spawn instead of fork, the calling process usually runs a Qt application
+        context = multiprocessing.get_context('spawn')
+        self.__connection, child_connection = context.Pipe()
+        self.__process = context.Process(target=_serve, args=(child_connection,), daemon=True)
+        self.__process.start()
+        child_connection.close()
+        self.__ring = None
+        self.__settings = None
+        self.__last_sequence = -1
+        self.__run = 0
+
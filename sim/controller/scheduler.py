@@ -1,17 +1,16 @@
-from observable import Observable, EventNotFound, HandlerNotFound
+from controller.dispatcher import Dispatcher
 from controller.events import Events
 from model.agent_state import AgentState
 from model.state import SimState
 from model.grid_pos import GridPos
 import logging
+import numpy as np
 import sys
 import typing
 import config as cfg
 
 
 class Scheduler:
-    main_observable: Observable = Observable()
-    gui_observable: Observable = Observable()
     __logger = logging.getLogger("scheduler")
 
     """Scheduler class controlling the flow of the program
@@ -20,37 +19,63 @@ class Scheduler:
     - next_step: triggered by gui, initial event for all computation
     - agent_movement: triggered by scheduler, agents move
     - status_update: triggered by scheduler, agents update their status according to the neighbors
+    - post_status_update: triggered by scheduler, scheduled transitions of the day are applied
     - ... tba
-    - repaint: last event for the chain, triggers gui repaint"""
+    - repaint: last event for the chain, triggers gui repaint
+    Changed cells are reported with agent_change_gui, or with one bulk_agent_change_gui event for many cells set to
+    the same state. Listeners of the per cell event have to listen to the bulk event as well, the bulk changes are
+    only reported cell by cell while nobody listens to the bulk event."""
 
     def update_gui_state(self, grid_pos: GridPos, agent_state: AgentState) -> None:
-        self.trigger_gui_event(Events.AGENT_CHANGE_GUI,
-                               {"row": grid_pos.row(), "col": grid_pos.col(), "state": agent_state.value})
-        self.__logger.debug(f"Agent update, at position {grid_pos.row()},{grid_pos.col()}, new state: {agent_state}")
-
-    def trigger_event(self, event: Events, kw: typing.Any = {}) -> None:
-        try:
-            self.main_observable.trigger(event.value, **kw)
-        except HandlerNotFound as ex:
-            self.trigger_event(Events.ERROR, {"message": ex})
-
-    def trigger_gui_event(self, event: Events, kw: typing.Any = {}) -> None:
-        try:
-            self.gui_observable.trigger(event.value, **kw)
-        except HandlerNotFound as ex:
-            self.trigger_event(Events.ERROR, {"message": ex})
+        self.update_gui_cell(int(grid_pos.row()), int(grid_pos.col()), agent_state)
+
+    def update_gui_index(self, index: int, size: int, agent_state: AgentState) -> None:
+        """Same as update_gui_state, but takes the flat index of the cell on a grid of the passed size"""
+        if not self.__gui_dispatcher.has_handlers(Events.AGENT_CHANGE_GUI):
+            return  # Nobody is listening (e.g. headless runs), skip building the event
+
+        self.update_gui_cell(index // size, index % size, agent_state)
+
+    def update_gui_cell(self, row: int, col: int, agent_state: AgentState) -> None:
+        handlers = self.__gui_dispatcher.handlers(Events.AGENT_CHANGE_GUI)
+        if not handlers:
+            return  # Nobody is listening (e.g. headless runs), skip building the event
+
+        value = agent_state.value
+        for handler in handlers:
+            handler(row=row, col=col, state=value)
+
+        if self.__logger.isEnabledFor(logging.DEBUG):
+            self.__logger.debug(f"Agent update, at position {row},{col}, new state: {agent_state}")
+
+    def update_gui_indices(self, indices: typing.Sequence[int], size: int, agent_state: AgentState) -> None:
+        """Same as update_gui_index for many distinct cells set to the same state, reported as one event
+        :param indices: Flat indices of the cells on a grid of the passed size"""
+        if len(indices) == 0:
+            return
+
+        if self.__gui_dispatcher.has_handlers(Events.BULK_AGENT_CHANGE_GUI):
+            rows, cols = np.divmod(np.asarray(indices, dtype=np.intp), size)
+            self.__gui_dispatcher.trigger(Events.BULK_AGENT_CHANGE_GUI,
+                                          {"rows": rows, "cols": cols, "state": agent_state.value})
+            return
+
+        if not self.__gui_dispatcher.has_handlers(Events.AGENT_CHANGE_GUI):
+            return
+        for index in indices:
+            self.update_gui_cell(index // size, index % size, agent_state)
+
+    def trigger_event(self, event: Events, kw: typing.Any = None) -> None:
+        self.__main_dispatcher.trigger(event, kw)
+
+    def trigger_gui_event(self, event: Events, kw: typing.Any = None) -> None:
+        self.__gui_dispatcher.trigger(event, kw)
 
     def register_handler(self, event: Events, handlers: typing.Callable) -> None:
-        try:
-            self.main_observable.on(event.value, handlers)
-        except EventNotFound as ex:
-            self.trigger_event(Events.ERROR, {"message": ex})
+        self.__main_dispatcher.on(event, handlers)
 
     def register_gui_handler(self, event: Events, handlers: typing.Callable) -> None:
-        try:
-            self.gui_observable.on(event.value, handlers)
-        except EventNotFound as ex:
-            self.trigger_event(Events.ERROR, {"message": ex})
+        self.__gui_dispatcher.on(event, handlers)
 
     def __error_handler(self, message) -> None:
         self.__logger.error(f"An error occurred: {message}")
@@ -73,6 +98,7 @@ class Scheduler:
         self.__logger.info("Agent movement finished, starting status update")
         self.trigger_event(Events.STATUS_UPDATE, {"state": state})
         self.__logger.info("Status update finished, starting additional events")
+        self.trigger_event(Events.POST_STATUS_UPDATE, {"state": state})
         self.__logger.info("Additional events finished. Starting repaint")
         self.trigger_gui_event(Events.REPAINT)
 
@@ -80,13 +106,20 @@ class Scheduler:
         self.__logger.info("Initializing new simulation...")
 
     def __init__(self):
+        # Every scheduler owns its handler tables, so several simulations do not share listeners
+        self.__main_dispatcher = Dispatcher()
+        self.__gui_dispatcher = Dispatcher()
+
         self.register_handler(Events.ERROR, self.__error_handler)
         self.register_handler(Events.NEXT_STEP, self.__next_step)
         self.register_gui_handler(Events.NEXT_STEP, self.__next_gui_step)
         self.register_gui_handler(Events.RESET, self.__reset)
 
-    def get_observable(self) -> Observable:
-        return self.main_observable
+    def get_observable(self) -> Dispatcher:
+        return self.__main_dispatcher
+
+    def get_gui_observable(self) -> Dispatcher:
+        return self.__gui_dispatcher
 
 
 logging.basicConfig(stream=sys.stdout, level=cfg.DEFAULT_LOG_LEVEL)
@@ -0,0 +1,157 @@
+from __future__ import annotations
+import numpy as np
+from controller.dispatcher import Dispatcher
+from controller.events import Events
+from controller.scheduler import Scheduler
+from model.agent_state import AgentState
+from model.grid import Grid
+from model.state import SimState
+from model.strategies.movement_strategy import MovementStrategy, DefaultMovementStrategy, LimitedMovementStrategy
+from model.strategies.status_strategy import LethalityStatusStrategy, \
+    IncubationStatusStrategy, DefaultInfectionStrategy, DefaultRemoveStrategy, \
+    QuarantineStatusStrategy
+from model.strategies.status_pipeline import StatusPipeline
+
+
+class Simulation:
+    """Context of a single simulation.
+    A simulation owns its scheduler, grid, strategies, random stream and state. Nothing is shared between
+    two Simulation instances, so several of them can run side by side in one process (e.g. in a thread or
+    process pool for batch runs)."""
+
+    def set_grid(self, grid: Grid) -> None:
+        self.__grid = grid
+
+    def get_grid(self) -> Grid:
+        return self.__grid
+
+    def get_state(self) -> SimState:
+        return self.__state
+
+    def get_movement_strategy(self) -> MovementStrategy:
+        """Gets the curently active movement strategy
+        :return the Movement Strategy"""
+        return self.__movement_strategy
+
+    def set_movement_strategy(self, strategy) -> None:
+        self.__movement_strategy = strategy
+
+    def get_scheduler(self) -> Scheduler:
+        """Returns the Scheduler instance
+        :return the Scheduler instance"""
+        return self.__scheduler
+
+    def get_observable(self) -> Dispatcher:
+        """Returns the schedulers Dispatcher. This is useful if you need to register your own handler.
+        :return the active Dispatcher"""
+        return self.__scheduler.get_observable()
+
+    def get_status_strategies(self) -> dict:
+        return self.__status_strategies
+
+    def get_status_pipeline(self) -> StatusPipeline:
+        """Returns the compiled status strategies. Call its invalidate() after changing the strategies dict
+        :return the StatusPipeline of the status strategies"""
+        return self.__status_pipeline
+
+    def get_random_state(self) -> np.random.RandomState:
+        """Returns the random stream of this simulation. It is reseeded from the state on every reset.
+        :return the random stream or None if the simulation was never reset"""
+        if self.__grid is None:
+            return None
+        return self.__grid.random_state()
+
+    def reset(self) -> None:
+        """Resets the owned state and rebuilds the grid (headless counterpart of the reset button)"""
+        state = self.__owned_state()
+        state.reset()
+        self.__scheduler.trigger_gui_event(Events.RESET, {"state": state})
+
+    def step(self) -> None:
+        """Simulates the next day"""
+        self.__scheduler.trigger_gui_event(Events.NEXT_STEP, {"state": self.__owned_state()})
+
+    def is_finished(self) -> bool:
+        """Whether the epidemic is over, i.e. nobody is infected anymore and all quarantined agents are back"""
+        state = self.__owned_state()
+        return state.infected_count() == 0 and state.get_total_count() >= state.get_beginning_total_count()
+
+    def run(self, max_days: int = None) -> int:
+        """Simulates until the epidemic is over.
+        :param max_days: Optional upper bound of days to simulate
+        :return the number of simulated days"""
+        self.__owned_state()
+        days = 0
+        while not self.is_finished() and (max_days is None or days < max_days):
+            self.step()
+            days += 1
+        return days
+
+    def __owned_state(self) -> SimState:
+        if self.__state is None:
+            raise ValueError('The simulation has no state, pass a SimState to Simulation(state)')
+        return self.__state
+
+    def __reset(self, state: SimState) -> None:
+        grid = self.get_grid()
+        if grid is not None and grid.get_size() == int(state.size()):
+            grid.clear()  # Same size, the grid and its listeners are reused
+        else:
+            if grid is not None:
+                grid.remove_listeners()
+            grid = Grid(self.__scheduler, self)
+            self.set_grid(grid)
+        state.set_beginning_total_count(grid.reset(state))
+
+    def __init__(self, state: SimState = None):
+        """
+        :param state: Settings and counters of the simulation. Without one only the dependencies (scheduler, grid,
+                      strategies) are provided, reset(), step(), is_finished() and run() raise a ValueError
+        """
+        self.__scheduler = Scheduler()
+        self.__grid = None
+        self.__state = state
+
+        """The status strategies are initialized here.
+        The lambda expression is given the current state to determine if it should be active, currently"""
+        # ADD YOUR STRATEGIES HERE!
+        quarantinestrategy = QuarantineStatusStrategy()
+        self.__status_strategies = {
+            AgentState.SUSCEPTIBLE: [
+                (IncubationStatusStrategy(), lambda state: state.incubation_period_enabled()
+                                                           and not state.transition_calendar_enabled()),
+            ],
+            AgentState.INFECTIVE: [
+                (quarantinestrategy, lambda state: state.quarantine_enabled()),
+                (DefaultInfectionStrategy(), lambda state: True),
+                (LethalityStatusStrategy(), lambda state: state.lethality_toggle()
+                                                          and not state.transition_calendar_enabled()),
+                (DefaultRemoveStrategy(), lambda state: not state.lethality_toggle()
+                                                        and not state.transition_calendar_enabled()),
+            ],
+            AgentState.INCUBATION: [
+                (DefaultInfectionStrategy(), lambda state: True),
+                (IncubationStatusStrategy(), lambda state: state.incubation_period_enabled()
+                                                           and not state.transition_calendar_enabled()),
+            ],
+            AgentState.IMMUNE: [
+                (quarantinestrategy, lambda state: state.quarantine_enabled()),
+            ],
+            AgentState.DEAD: [
+                (quarantinestrategy, lambda state: state.quarantine_enabled()),
+            ],
+            AgentState.REMOVED: [
+                (quarantinestrategy, lambda state: state.quarantine_enabled()),
+            ],
+        }
+        self.__status_pipeline = StatusPipeline(self.__status_strategies)
+        self.__scheduler.register_handler(Events.RESET, self.__reset)
+        if state is not None and state.movement_limit_enabled():
+            self.__movement_strategy = LimitedMovementStrategy()
+        else:
+            self.__movement_strategy = DefaultMovementStrategy()
+
+        if state is not None:
+            # Keep the owned state's counters and image data in sync with the agents
+            self.__scheduler.register_gui_handler(Events.AGENT_CHANGE_GUI, state.agent_update)
+            self.__scheduler.register_gui_handler(Events.BULK_AGENT_CHANGE_GUI, state.bulk_agent_update)
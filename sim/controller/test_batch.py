@@ -0,0 +1,36 @@
+from unittest import TestCase
+from controller.batch import AdaptiveBatch, BatchTarget
+from model.state import SimState
+
+
+class TestAdaptiveBatch(TestCase):
+
+    def test_stops_once_targets_are_met(self):
+        sut = AdaptiveBatch(self.__create_state(), [BatchTarget('peak_day', 1000.0)], min_runs=4, max_runs=50,
+                            wave_size=2, workers=1)
+        report = sut.run()
+
+        self.assertEqual(report['stopped_by'], 'precision')
+        self.assertEqual(report['runs'], 4)
+        self.assertEqual(report['waves'], 2)
+        self.assertTrue(report['precision']['peak_day']['met'])
+
+    def test_stops_at_max_runs(self):
+        sut = AdaptiveBatch(self.__create_state(), [BatchTarget('final_removed_share', 0.0)], min_runs=2,
+                            max_runs=5, wave_size=2, workers=1)
+        report = sut.run()
+
+        self.assertEqual(report['stopped_by'], 'max_runs')
+        self.assertEqual(report['runs'], 5)
+        self.assertEqual(sut.statistics().runs(), 5)
+
+    def test_same_seed_same_report(self):
+        first = AdaptiveBatch(self.__create_state(), [], min_runs=3, max_runs=3, workers=1).run()
+        second = AdaptiveBatch(self.__create_state(), [], min_runs=3, max_runs=3, wave_size=3, workers=2).run()
+
+        self.assertEqual(first['precision'], second['precision'])
+
+    def __create_state(self) -> SimState:
+        state = SimState(size=10, susceptible_share=0.69, infected_share=0.05)
+        state.seed(8)
+        return state
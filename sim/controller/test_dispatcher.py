@@ -0,0 +1,42 @@
+from unittest import TestCase
+from controller.dispatcher import Dispatcher
+from controller.events import Events
+from controller.scheduler import Scheduler
+
+
+class TestDispatcher(TestCase):
+
+    def test_trigger_calls_handlers_in_order(self):
+        sut = Dispatcher()
+        calls = []
+        sut.on(Events.RESET, lambda state: calls.append(("first", state)))
+        sut.on(Events.RESET, lambda state: calls.append(("second", state)))
+
+        sut.trigger(Events.RESET, {"state": 1})
+        self.assertEqual(calls, [("first", 1), ("second", 1)])
+
+    def test_trigger_without_handlers(self):
+        sut = Dispatcher()
+        self.assertFalse(sut.has_handlers(Events.AGENT_CHANGE_GUI))
+        sut.trigger(Events.AGENT_CHANGE_GUI, {"row": 0, "col": 0, "state": 1})
+
+    def test_off(self):
+        sut = Dispatcher()
+        handler = lambda: None
+        sut.on(Events.REPAINT, handler)
+        self.assertTrue(sut.is_registered(Events.REPAINT, handler))
+
+        sut.off(Events.REPAINT, handler)
+        self.assertFalse(sut.is_registered(Events.REPAINT, handler))
+        sut.off(Events.REPAINT, handler)  # Unknown handlers are ignored
+
+    def test_schedulers_do_not_share_handlers(self):
+        first = Scheduler()
+        second = Scheduler()
+        calls = []
+        first.register_handler(Events.STATUS_UPDATE, lambda state: calls.append(state))
+
+        second.trigger_event(Events.STATUS_UPDATE, {"state": 2})
+        self.assertEqual(calls, [])
+        first.trigger_event(Events.STATUS_UPDATE, {"state": 1})
+        self.assertEqual(calls, [1])
@@ -1,5 +1,5 @@
 from unittest import TestCase
-from observable import Observable
+from controller.dispatcher import Dispatcher
 from controller.provider import Provider
 from controller.scheduler import Scheduler
 from model.grid import Grid
@@ -24,7 +24,7 @@ class TestProvider(TestCase):
 
     def test_get_observable(self):
         sut = self.__create_sut()
-        self.assertIsInstance(sut.get_observable(), Observable)
+        self.assertIsInstance(sut.get_observable(), Dispatcher)
 
     def __create_sut(self):
         return Provider()
@@ -0,0 +1,68 @@
+import time
+from unittest import TestCase
+import numpy as np
+from controller.remote import RemoteSimulation, FrameRing
+from controller.simulation import Simulation
+from model.state import SimState
+
+
+class TestRemoteSimulation(TestCase):
+
+    def test_frames_match_local_simulation(self):
+        state = self.__create_state()
+        local = Simulation(self.__create_state())
+        local.reset()
+
+        with RemoteSimulation() as sut:
+            sut.reset(state)
+            first = sut.wait_frame()
+            self.assertEqual(first.day, 0)
+            self.assertEqual(first.data.tolist(), local.get_state().data().astype(np.int8).tolist())
+
+            for _ in range(3):
+                sut.step()
+                local.step()
+                frame = sut.wait_frame()
+
+            self.assertEqual(frame.day, 3)
+            self.assertEqual(frame.data.tolist(), local.get_state().data().astype(np.int8).tolist())
+            self.assertEqual(frame.beginning_total_count, local.get_state().get_beginning_total_count())
+
+    def test_slow_reader_gets_every_day(self):
+        state = SimState(size=20, susceptible_share=0.5, infected_share=0.3, remove_prob=0.01)
+        state.set_speed(0)
+
+        with RemoteSimulation() as sut:
+            sut.reset(state)
+            self.assertEqual(sut.wait_frame().day, 0)
+            sut.play()
+            days = []
+            for _ in range(12):
+                time.sleep(0.01)  # The child simulates much faster than this
+                days.append(sut.wait_frame().day)
+
+        self.assertEqual(days, list(range(1, 13)))
+
+    def test_ring_reads_frames_in_order(self):
+        writer = FrameRing(2, slots=2)
+        reader = FrameRing(2, slots=2, name=writer.name())
+        try:
+            for day in range(2):
+                writer.write(1, day, np.full((2, 2), day), 0, 4, 0.0, False)
+            self.assertTrue(writer.is_full())
+
+            frame = reader.read()
+            self.assertEqual(frame.day, 0)
+            self.assertFalse(writer.is_full())
+            frame = reader.read(frame.sequence)
+            self.assertEqual(frame.day, 1)
+            self.assertIsNone(reader.read(frame.sequence))
+        finally:
+            reader.close()
+            writer.close()
+            writer.unlink()
+
+    def __create_state(self) -> SimState:
+        state = SimState(size=20, susceptible_share=0.69, infected_share=0.01)
+        state.seed(11)
+        return state
@@ -0,0 +1,175 @@
+import math
+from unittest import TestCase
+import numpy as np
+from controller.simulation import Simulation
+from model.agent_state import AgentState
+from model.environmentmetric import EnvironmentMetric
+from model.state import SimState
+from model.update_mode import UpdateMode
+
+
+class TestSimulation(TestCase):
+
+    def test_stepping_without_state_fails_clearly(self):
+        sut = Simulation()
+        for method in (sut.reset, sut.step, sut.is_finished, sut.run):
+            with self.assertRaises(ValueError):
+                method()
+
+    def test_reset_counts_agents(self):
+        sut = self.__create_sut(seed=1)
+        sut.reset()
+
+        state = sut.get_state()
+        self.assertEqual(state.get_beginning_total_count(), state.get_total_count())
+        self.assertEqual(state.susceptible_count(), round(0.69 * 20 * 20))
+        self.assertEqual(state.infected_count(), round(0.7 * 20 * 20) - round(0.69 * 20 * 20))
+
+    def test_same_seed_same_result(self):
+        first = self.__create_sut(seed=7)
+        second = self.__create_sut(seed=7)
+        first.reset()
+        second.reset()
+
+        # Interleave the steps, a shared random stream or shared listeners would make the runs diverge
+        for _ in range(5):
+            first.step()
+            second.step()
+
+        self.assertEqual(first.get_state().susceptible_count(), second.get_state().susceptible_count())
+        self.assertEqual(first.get_state().infected_count(), second.get_state().infected_count())
+        self.assertEqual(first.get_state().removed_count(), second.get_state().removed_count())
+        self.assertEqual(first.get_state().data().tolist(), second.get_state().data().tolist())
+
+    def test_reset_in_place_matches_a_new_simulation(self):
+        sut = self.__create_sut(seed=4)
+        sut.reset()
+        grid = sut.get_grid()
+        data = sut.get_state().data()
+        sut.run(10)
+
+        sut.reset()
+        fresh = self.__create_sut(seed=4)
+        fresh.reset()
+
+        self.assertIs(sut.get_grid(), grid)
+        self.assertIs(sut.get_state().data(), data)
+        self.assertEqual(sut.get_state().data().tolist(), fresh.get_state().data().tolist())
+        self.assertEqual(sut.get_state().get_beginning_total_count(), fresh.get_state().get_beginning_total_count())
+        self.assertEqual(grid.free_cell_count(), fresh.get_grid().free_cell_count())
+        for _ in range(3):
+            sut.step()
+            fresh.step()
+        self.assertEqual(sut.get_state().data().tolist(), fresh.get_state().data().tolist())
+
+    def test_run_until_finished(self):
+        sut = self.__create_sut(seed=3)
+        sut.reset()
+        sut.run()
+
+        self.assertTrue(sut.is_finished())
+        self.assertEqual(sut.get_state().infected_count(), 0)
+
+    def test_synchronous_update_uses_states_of_the_day_before(self):
+        state = SimState(size=3, susceptible_share=0, infected_share=0, infection_prob=1, remove_prob=0)
+        state.set_update_mode(UpdateMode.SYNCHRONOUS)
+        sut = Simulation(state)
+        sut.reset()
+
+        grid = sut.get_grid()
+        grid.spawn_agent_at(0, AgentState.INFECTIVE)
+        grid.spawn_agent_at(1, AgentState.SUSCEPTIBLE)
+        grid.spawn_agent_at(2, AgentState.SUSCEPTIBLE)
+
+        # The agent at 1 only gets infected at the end of the day, so it cannot pass it on to 2 on the same day
+        grid.on_status_update(state)
+
+        self.assertEqual(grid.get_agent_at(1).state(), AgentState.INFECTIVE)
+        self.assertEqual(grid.get_agent_at(2).state(), AgentState.SUSCEPTIBLE)
+
+    def test_quarantine_isolates_the_share_in_one_batch(self):
+        state = SimState(size=20, susceptible_share=0.5, infected_share=0.2, infection_prob=0, remove_prob=0)
+        state.seed(5)
+        state.set_mixing_value_m(0)
+        state.set_quarantine_enabled(True)
+        state.set_quarantine_share(0.3)
+        sut = Simulation(state)
+        sut.reset()
+        infected = state.infected_count()
+
+        sut.step()
+
+        grid = sut.get_grid()
+        quarantined = len(grid.get_quarantinedAgents())
+        self.assertEqual(quarantined, math.ceil(0.3 * infected))
+        self.assertEqual(state.get_quarantined_count(), quarantined)
+        self.assertEqual(state.infected_count(), infected - quarantined)
+        self.assertEqual(np.count_nonzero(state.data() == AgentState.INFECTIVE.value), infected - quarantined)
+        self.assertTrue(all(agent.is_quarantined() for agent in grid.get_quarantinedAgents()))
+
+    def test_bulk_movement_keeps_agents_and_image_in_sync(self):
+        sut = self.__create_sut(seed=6)
+        state = sut.get_state()
+        state.set_bulk_movement_enabled(True)
+        sut.reset()
+        before = state.data().copy()
+
+        sut.step()
+
+        grid = sut.get_grid()
+        self.assertNotEqual(state.data().tolist(), before.tolist())
+        for index in range(20 * 20):
+            agent = grid.get_agent_at(index)
+            expected = AgentState.EMPTY.value if agent is None else agent.state().value
+            self.assertEqual(state.data()[divmod(index, 20)], expected)
+            if agent is not None:
+                self.assertEqual(agent.get_index(), index)
+        self.assertEqual(grid.free_cell_count(), np.count_nonzero(state.data() == AgentState.EMPTY.value))
+
+    def test_bulk_limited_movement_stays_in_the_environment(self):
+        state = SimState(size=20, susceptible_share=0.5, infected_share=0, infection_prob=0)
+        state.seed(9)
+        state.set_movement_limit_enabled(True)
+        state.set_movement_limit_radius(2)
+        state.set_movement_limit_metric(EnvironmentMetric.MANHATTAN)
+        state.set_bulk_movement_enabled(True)
+        sut = Simulation(state)
+        sut.reset()
+        grid = sut.get_grid()
+        before = {grid.get_agent_at(i): i for i in range(20 * 20) if grid.get_agent_at(i) is not None}
+
+        sut.step()
+
+        distances = []
+        for agent, old_index in before.items():
+            (old_row, old_col), (row, col) = divmod(old_index, 20), divmod(agent.get_index(), 20)
+            distances.append(abs(row - old_row) + abs(col - old_col))
+            self.assertIs(grid.get_agent_at(agent.get_index()), agent)
+        self.assertLessEqual(max(distances), 2)
+        self.assertGreater(np.count_nonzero(distances), len(before) / 2)
+        self.assertEqual(grid.free_cell_count(), 200)
+
+    def test_status_pipeline_is_compiled_on_setting_changes_only(self):
+        sut = self.__create_sut(4)
+        state = sut.get_state()
+        sut.reset()
+        pipeline = sut.get_status_pipeline()
+
+        sut.step()
+        remove = pipeline.dispatch()[AgentState.INFECTIVE]
+        self.assertEqual(pipeline.dispatch()[AgentState.EMPTY], ())
+        self.assertNotIn(AgentState.SUSCEPTIBLE, pipeline.active_states())
+        state.set_speed(0)
+        state.set_mixing_value_m(0.5)
+        sut.step()
+        self.assertIs(pipeline.dispatch()[AgentState.INFECTIVE], remove)
+
+        state.set_incubation_period_enabled(True)
+        sut.step()
+        self.assertIsNot(pipeline.dispatch()[AgentState.INFECTIVE], remove)
+        self.assertIn(AgentState.INCUBATION, pipeline.active_states())
+
+    def __create_sut(self, seed: int) -> Simulation:
+        state = SimState(size=20, susceptible_share=0.69, infected_share=0.01)
+        state.seed(seed)
+        return Simulation(state)
@@ -0,0 +1,155 @@
+import typing
+import numpy as np
+from engine import kernels
+from engine.rules import CompiledRules
+from model.agent_state import AgentState
+from model.state import SimState
+
+"""
+Monte Carlo ensemble engine.
+Runs many replicas of the same scenario with different seeds as one (replicas, size, size) array, so a day of
+the whole ensemble is a handful of NumPy operations instead of one Python pass per agent and replica.
+"""
+
+
+class EnsembleEngine:
+    """Advances R replicas of the scenario described by a SimState at once.
+    Replica r starts with the same placement as a Simulation seeded with seeds()[r]. The days are simulated
+    with the synchronous array kernels (see engine.kernels), all replicas draw from one stream seeded with the
+    seed of the state. Replicas in which nobody is infective or incubating anymore are extinct: they are masked
+    out and not touched again, so their final states can be read at any time.
+    Quarantine is not supported."""
+
+    def replicas(self) -> int:
+        return self.__replicas
+
+    def seeds(self) -> typing.List[int]:
+        """Placement seed of every replica"""
+        return list(self.__seeds)
+
+    def day(self) -> int:
+        """Number of simulated days since the last reset"""
+        return self.__day
+
+    def data(self) -> np.ndarray:
+        """Copy of the current states, shape (replicas, size, size)"""
+        return self.__states.copy()
+
+    def active(self) -> np.ndarray:
+        """Boolean mask of the replicas that are not extinct yet"""
+        return self.__active.copy()
+
+    def elapsed_days(self) -> np.ndarray:
+        """Number of days every replica ran until it went extinct (the current day for the active ones)"""
+        return np.where(self.__active, self.__day, self.__extinct_day)
+
+    def counts(self) -> np.ndarray:
+        """
+        Number of agents per AgentState and replica.
+        :return: Array of shape (replicas, len(AgentState)), indexed by the AgentState values
+        """
+        states_count = len(AgentState)
+        offsets = (np.arange(self.__replicas) * states_count)[:, np.newaxis]
+        flat = self.__states.reshape(self.__replicas, -1).astype(np.intp) + offsets
+        return np.bincount(flat.reshape(-1), minlength=self.__replicas * states_count) \
+            .reshape(self.__replicas, states_count)
+
+    def is_finished(self) -> bool:
+        """Whether all replicas are extinct"""
+        return not self.__active.any()
+
+    def reset(self) -> None:
+        """Places the agents of all replicas"""
+        size = int(self.__state.size())
+        seed = self.__state.get_seed()
+        if self.__fixed_seeds is None:
+            self.__seeds = [int(s) for s in np.random.SeedSequence(seed).generate_state(self.__replicas)]
+
+        self.__states = np.empty((self.__replicas, size, size), dtype=kernels.STATE_DTYPE)
+        for replica, replica_seed in enumerate(self.__seeds):
+            rs = np.random.RandomState(np.random.MT19937(np.random.SeedSequence(replica_seed)))
+            self.__states[replica] = kernels.place_agents(size, self.__state.susceptible_share(),
+                                                          self.__state.infected_share(), rs)
+        self.__days = np.zeros(self.__states.shape, dtype=kernels.DAYS_DTYPE)
+
+        self.__rs = np.random.RandomState(np.random.MT19937(np.random.SeedSequence([seed, self.__replicas])))
+        self.__day = 0
+        self.__active = np.ones(self.__replicas, dtype=bool)
+        self.__extinct_day = np.zeros(self.__replicas, dtype=int)
+        self.__update_active()
+
+    def step(self) -> None:
+        """Simulates the next day of all active replicas: movement, then the status update"""
+        if self.__states is None:
+            raise RuntimeError('The engine has to be reset before stepping')
+        self.__day += 1
+
+        active = np.flatnonzero(self.__active)
+        if len(active) == 0:
+            return
+
+        # Work on a compact copy of the active replicas, skipped entirely when all of them are active
+        all_active = len(active) == self.__replicas
+        states = self.__states if all_active else self.__states[active]
+        days = self.__days if all_active else self.__days[active]
+
+        movement = kernels.MovementParams.of(self.__state)
+        if movement.limited:
+            kernels.limited_moves(states, days, movement, self.__rs)
+        else:
+            kernels.batched_long_range_moves(states, days, movement.mixing_value_m, self.__rs)
+
+        if self.__rules is None:
+            status = kernels.StatusParams.of(self.__state, self.__day)
+            states, days = kernels.advance_status(states, days, status, self.__rs)
+        else:
+            states, days = self.__rules(states, days, self.__rs)
+
+        if all_active:
+            self.__states = states
+            self.__days = days
+        else:
+            self.__states[active] = states
+            self.__days[active] = days
+        self.__update_active()
+
+    def run(self, max_days: int = None) -> int:
+        """Simulates until all replicas are extinct.
+        :param max_days: Optional upper bound of days to simulate
+        :return the number of simulated days"""
+        days = 0
+        while not self.is_finished() and (max_days is None or days < max_days):
+            self.step()
+            days += 1
+        return days
+
+    def __update_active(self) -> None:
+        states = self.__states.reshape(self.__replicas, -1)
+        infectious = ((states == kernels.INFECTIVE) | (states == kernels.INCUBATION)).any(axis=1)
+        extinct = self.__active & ~infectious
+        self.__extinct_day[extinct] = self.__day
+        self.__active &= infectious
+
+    def __init__(self, state: SimState, replicas: int, seeds: typing.Sequence[int] = None,
+                 rules: CompiledRules = None):
+        """
+        :param state: Settings of the scenario, read on every reset and step
+        :param replicas: Number of replicas
+        :param seeds: Placement seeds of the replicas, derived from the seed of the state on every reset if omitted
+        :param rules: Transition rules (see engine.rules) replacing the status settings of the state, the movement
+        and the placement still follow the state
+        """
+        if seeds is not None and len(seeds) != replicas:
+            raise ValueError(f'Expected {replicas} seeds, got {len(seeds)}')
+
+        self.__state = state
+        self.__rules = rules
+        self.__replicas = replicas
+        self.__fixed_seeds = None if seeds is None else list(seeds)
+        self.__seeds = [] if seeds is None else list(seeds)
+        self.__states = None
+        self.__days = None
+        self.__rs = None
+        self.__day = 0
+        self.__active = np.zeros(replicas, dtype=bool)
+        self.__extinct_day = np.zeros(replicas, dtype=int)
@@ -0,0 +1,295 @@
+import heapq
+import math
+import typing
+import numpy as np
+from engine import kernels
+from model.agent_state import AgentState
+from model.state import SimState
+
+"""
+Event driven continuous time engine.
+Instead of visiting every agent each day, the engine keeps the rate of the next event of every cell and only
+processes the events that actually happen (Gillespie's direct method). The cost of a day is proportional to the
+number of events, which is small in the early seeding and the tail of an epidemic.
+"""
+
+# Daily probabilities of 1 would give infinite rates, they are capped slightly below
+MAX_PROB = 1.0 - 1e-9
+
+
+def rate_of(prob: float) -> float:
+    """
+    Converts a daily probability into the rate of an exponential waiting time with the same chance to happen
+    within a day: 1 - exp(-rate) = prob.
+    :param prob: Probability per day
+    :return: Rate per day
+    """
+    return -math.log1p(-min(prob, MAX_PROB))
+
+
+class SumTree:
+    """Binary tree over non negative weights, every inner node holds the sum of its children.
+    Updating a weight and drawing an index proportional to the weights are O(log n)."""
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def total(self) -> float:
+        return float(self.__tree[1])
+
+    def weight(self, index: int) -> float:
+        return float(self.__tree[self.__capacity + index])
+
+    def set_all(self, weights: np.ndarray) -> None:
+        """Replaces all weights and rebuilds the inner nodes level by level, O(n)"""
+        tree = self.__tree
+        capacity = self.__capacity
+        tree[:] = 0.0
+        tree[capacity:capacity + self.__count] = weights
+        low = capacity // 2
+        while low >= 1:
+            tree[low:2 * low] = tree[2 * low:4 * low:2] + tree[2 * low + 1:4 * low:2]
+            low //= 2
+
+    def update(self, index: int, weight: float) -> None:
+        """Sets one weight, the ancestors are summed up from their children again so no rounding error builds up"""
+        tree = self.__tree
+        node = self.__capacity + index
+        tree[node] = weight
+        node //= 2
+        while node >= 1:
+            tree[node] = tree[2 * node] + tree[2 * node + 1]
+            node //= 2
+
+    def find(self, value: float) -> int:
+        """
+        :param value: Number in [0, total())
+        :return: Index whose range of the cumulated weights contains the value
+        """
+        tree = self.__tree
+        node = 1
+        while node < self.__capacity:
+            left = 2 * node
+            if value < tree[left] or tree[left + 1] <= 0.0:
+                node = left
+            else:
+                value -= tree[left]
+                node = left + 1
+        return node - self.__capacity
+
+    def __init__(self, count: int):
+        """
+        :param count: Number of weights, all start at 0
+        """
+        self.__count = count
+        self.__capacity = 1 << max(0, (count - 1).bit_length())
+        self.__tree = np.zeros(2 * self.__capacity)
+
+
+class GillespieEngine:
+    """Simulates the scenario described by a SimState in continuous time.
+    A susceptible cell is infected with rate -ln(1 - infection_prob) per infectious cell (infective or incubating)
+    within the infection environment, an infective cell is removed with rate -ln(1 - remove_prob). Over a day
+    these are the same chances as the daily draws of the day stepping. The rates of all cells are kept in a
+    SumTree, an event only touches the cell itself and its environment. Incubation ends at a fixed time: a cell
+    infected during day d is reported incubating from day d to day d + incubation_period, like in the day stepping.
+    The vaccination starts at the beginning of day vaccine_time() with vaccine_share() of the susceptible cells,
+    with a daily capacity the rest is vaccinated on the following days (like model.vaccination.VaccinationCampaign).
+    The state is reported at integer days, step() simulates all events up to the end of the next day, so data()
+    can be shown with SimState.load_data like a frame of the other engines.
+    The agents do not move (the movement settings are ignored). Quarantine is not supported."""
+
+    def state(self) -> SimState:
+        return self.__state
+
+    def day(self) -> int:
+        """Number of simulated days since the last reset"""
+        return self.__day
+
+    def time(self) -> float:
+        """Simulated time in days, the end of the last simulated day between the steps"""
+        return self.__time
+
+    def events(self) -> int:
+        """Number of events processed since the last reset"""
+        return self.__events
+
+    def data(self) -> np.ndarray:
+        """Copy of the current states, shape (size, size)"""
+        return self.__states.reshape(self.__size, self.__size).copy()
+
+    def counts(self) -> typing.Dict[AgentState, int]:
+        """Number of agents per AgentState"""
+        return kernels.state_counts(self.__states)
+
+    def is_finished(self) -> bool:
+        """Whether the epidemic is over, i.e. nobody is infective or incubating anymore"""
+        return self.__infective == 0 and not self.__incubation_ends
+
+    def reset(self) -> None:
+        """Places the agents, the placement is the same as the one of the tiled engine with the same seed"""
+        self.__size = size = int(self.__state.size())
+        rs = np.random.RandomState(np.random.MT19937(np.random.SeedSequence(self.__state.get_seed())))
+        self.__states = kernels.place_agents(size, self.__state.susceptible_share(),
+                                             self.__state.infected_share(), rs).reshape(-1)
+        self.__rs = rs
+        self.__day = 0
+        self.__time = 0.0
+        self.__events = 0
+        self.__incubation_ends = []
+        self.__sequence = 0
+        self.__params = None
+        self.__infective = int(np.count_nonzero(self.__states == kernels.INFECTIVE))
+        self.__vaccine_remaining = 0
+        self.__tree = SumTree(size * size)
+        self.__pressure = np.zeros(size * size, dtype=np.int32)
+
+        self.__apply(kernels.StatusParams.of(self.__state, 0)._replace(vaccinate=False))
+
+        incubating = np.flatnonzero(self.__states == kernels.INCUBATION)
+        period = self.__state.incubation_period()
+        for index in incubating:
+            self.__schedule_incubation_end(int(index), period + 1.0)
+
+    def step(self) -> None:
+        """Simulates all events until the end of the next day"""
+        if self.__states is None:
+            raise RuntimeError('The engine has to be reset before stepping')
+        self.__day += 1
+        params = kernels.StatusParams.of(self.__state, self.__day)
+        if params._replace(vaccinate=False) != self.__params:
+            self.__apply(params._replace(vaccinate=False))
+        if params.vaccinate:
+            susceptible_count = np.count_nonzero(self.__states == kernels.SUSCEPTIBLE)
+            self.__vaccine_remaining = int(round(params.vaccine_share * susceptible_count))
+        if self.__vaccine_remaining > 0:
+            self.__vaccinate()
+
+        end = float(self.__day)
+        tree = self.__tree
+        rs = self.__rs
+        while True:
+            total = tree.total()
+            next_event = self.__time + rs.exponential(1.0 / total) if total > 0.0 else math.inf
+            next_end = self.__incubation_ends[0][0] if self.__incubation_ends else math.inf
+            if min(next_event, next_end) >= end:
+                break  # The waiting times are memoryless, the drawn one may be dropped
+
+            self.__events += 1
+            if next_end <= next_event:
+                self.__time, _, index = heapq.heappop(self.__incubation_ends)
+                self.__set_state(index, kernels.INFECTIVE)
+            else:
+                self.__time = next_event
+                index = tree.find(rs.random_sample() * total)
+                self.__fire(index)
+        self.__time = end
+
+    def run(self, max_days: int = None) -> int:
+        """Simulates until the epidemic is over.
+        :param max_days: Optional upper bound of days to simulate
+        :return the number of simulated days"""
+        days = 0
+        while not self.is_finished() and (max_days is None or days < max_days):
+            self.step()
+            days += 1
+        return days
+
+    def __apply(self, params: kernels.StatusParams) -> None:
+        """Takes over changed settings, the pressure and the rates of all cells are computed again"""
+        self.__params = params
+        self.__infection_rate = rate_of(params.infection_prob)
+        self.__remove_rate = rate_of(params.remove_prob)
+        states = self.__states
+        infectious = (states == kernels.INFECTIVE) | (states == kernels.INCUBATION)
+        self.__pressure[:] = kernels.neighbour_counts(infectious.reshape(self.__size, self.__size),
+                                                      params.infection_offsets).reshape(-1)
+        self.__tree.set_all(self.__rates())
+
+    def __rates(self) -> np.ndarray:
+        states = self.__states
+        rates = np.where(states == kernels.SUSCEPTIBLE, self.__infection_rate * self.__pressure, 0.0)
+        rates[states == kernels.INFECTIVE] = self.__remove_rate
+        return rates
+
+    def __vaccinate(self) -> None:
+        """Vaccinates the cells of today, at most vaccine_daily_capacity() of the remaining ones"""
+        if not self.__state.vaccine_toggle():
+            self.__vaccine_remaining = 0
+            return  # Campaign stopped
+
+        susceptible = np.flatnonzero(self.__states == kernels.SUSCEPTIBLE)
+        count = min(self.__vaccine_remaining, len(susceptible))
+        capacity = self.__state.vaccine_daily_capacity()
+        if capacity > 0:
+            count = min(count, capacity)
+        vaccinated = self.__rs.choice(susceptible, count, replace=False)
+        self.__vaccine_remaining = self.__vaccine_remaining - count if count < len(susceptible) else 0
+        self.__states[vaccinated] = kernels.IMMUNE
+        self.__tree.set_all(self.__rates())
+
+    def __fire(self, index: int) -> None:
+        params = self.__params
+        state = self.__states[index]
+        if state == kernels.SUSCEPTIBLE:
+            self.__set_state(index, params.infection_state)
+            if params.infection_state == kernels.INCUBATION:
+                self.__schedule_incubation_end(index, self.__time + params.incubation_period + 1.0)
+        elif state == kernels.INFECTIVE:
+            if params.lethality_enabled:
+                dead = self.__rs.random_sample() < params.lethality
+                self.__set_state(index, kernels.DEAD if dead else kernels.IMMUNE)
+            else:
+                self.__set_state(index, kernels.REMOVED)
+
+    def __schedule_incubation_end(self, index: int, time: float) -> None:
+        heapq.heappush(self.__incubation_ends, (time, self.__sequence, index))
+        self.__sequence += 1
+
+    def __set_state(self, index: int, new_state: int) -> None:
+        states = self.__states
+        was_infectious = states[index] == kernels.INFECTIVE or states[index] == kernels.INCUBATION
+        is_infectious = new_state == kernels.INFECTIVE or new_state == kernels.INCUBATION
+        if states[index] == kernels.INFECTIVE:
+            self.__infective -= 1
+        if new_state == kernels.INFECTIVE:
+            self.__infective += 1
+        states[index] = new_state
+        self.__tree.update(index, self.__remove_rate if new_state == kernels.INFECTIVE else 0.0)
+        if was_infectious == is_infectious:
+            return
+
+        # The infection pressure on the environment changes
+        change = 1 if is_infectious else -1
+        size = self.__size
+        row, col = divmod(index, size)
+        pressure = self.__pressure
+        for row_offset, col_offset in self.__params.infection_offsets:
+            r = row + row_offset
+            c = col + col_offset
+            if 0 <= r < size and 0 <= c < size:
+                neighbour = r * size + c
+                pressure[neighbour] += change
+                if states[neighbour] == kernels.SUSCEPTIBLE:
+                    self.__tree.update(neighbour, self.__infection_rate * pressure[neighbour])
+
+    def __init__(self, state: SimState):
+        """
+        :param state: Settings of the scenario, read on every reset and step
+        """
+        self.__state = state
+        self.__size = 0
+        self.__states = None
+        self.__pressure = None
+        self.__tree = SumTree(0)
+        self.__rs = None
+        self.__day = 0
+        self.__time = 0.0
+        self.__events = 0
+        self.__incubation_ends = []
+        self.__sequence = 0
+        self.__params = None
+        self.__infective = 0
+        self.__vaccine_remaining = 0
+        self.__infection_rate = 0.0
+        self.__remove_rate = 0.0
@@ -0,0 +1,347 @@
+import typing
+import numpy as np
+from model.agent_state import AgentState
+from model.environmentmetric import EnvironmentMetric
+from model.neighborhood import environment_offsets
+from model.state import SimState
+
+"""
+Array kernels of the simulation rules.
+The grid is an int8 array holding the AgentState values of the cells (EMPTY = 0), the incubation days of the
+agents are held in a parallel int16 array and move together with the states. All kernels work on whole blocks
+of cells and are synchronous: every rule reads the states of the beginning of the step.
+"""
+
+EMPTY = AgentState.EMPTY.value
+SUSCEPTIBLE = AgentState.SUSCEPTIBLE.value
+INFECTIVE = AgentState.INFECTIVE.value
+REMOVED = AgentState.REMOVED.value
+IMMUNE = AgentState.IMMUNE.value
+DEAD = AgentState.DEAD.value
+INCUBATION = AgentState.INCUBATION.value
+
+STATE_DTYPE = np.int8
+DAYS_DTYPE = np.int16
+
+
+class StatusParams(typing.NamedTuple):
+    """Snapshot of the SimState settings used by the status kernels. Plain data, so it can be sent to workers."""
+    infection_prob: float
+    infection_offsets: tuple
+    infection_state: int
+    remove_prob: float
+    lethality_enabled: bool
+    lethality: float
+    incubation_enabled: bool
+    incubation_period: int
+    vaccinate: bool
+    vaccine_share: float
+
+    @staticmethod
+    def of(state: SimState, day: int) -> 'StatusParams':
+        """
+        Takes the snapshot for a day.
+        :param state: Settings of the simulation
+        :param day: Number of the simulated day (the first step is day 1), needed for the vaccination
+        :return: Parameters of the status kernels
+        """
+        if state.quarantine_enabled():
+            raise ValueError('Quarantine is not supported by the array kernels')
+        return StatusParams(
+            infection_prob=state.infection_prob(),
+            infection_offsets=environment_offsets(state.infection_env_radius(), state.infection_env_metric()),
+            infection_state=INCUBATION if state.incubation_period_enabled() else INFECTIVE,
+            remove_prob=state.remove_prob(),
+            lethality_enabled=state.lethality_toggle(),
+            lethality=state.lethality(),
+            incubation_enabled=state.incubation_period_enabled(),
+            incubation_period=state.incubation_period(),
+            vaccinate=state.vaccine_toggle() and day == state.vaccine_time(),
+            vaccine_share=state.vaccine_share(),
+        )
+
+
+class MovementParams(typing.NamedTuple):
+    """Snapshot of the SimState settings used by the movement kernels"""
+    mixing_value_m: float
+    limited: bool
+    radius: int
+    metric: EnvironmentMetric
+    high_distances_are_uncommon: bool
+
+    @staticmethod
+    def of(state: SimState) -> 'MovementParams':
+        return MovementParams(
+            mixing_value_m=state.get_mixing_value_m(),
+            limited=state.movement_limit_enabled(),
+            radius=state.movement_limit_radius(),
+            metric=state.movement_limit_metric(),
+            high_distances_are_uncommon=state.movement_limit_high_distances_are_uncommon(),
+        )
+
+
+def neighbour_counts(mask: np.ndarray, offsets: tuple) -> np.ndarray:
+    """
+    Counts for every cell the cells within the environment for which the mask is set.
+    Cells outside of the block count as not set. Leading dimensions (e.g. replicas) are supported, the last two
+    dimensions are rows and columns.
+    :param mask: Boolean array
+    :param offsets: Environment, see environment_offsets
+    :return: Count array of the same shape
+    """
+    return neighbour_sums(mask.astype(np.int16), offsets)
+
+
+def neighbour_sums(values: np.ndarray, offsets: tuple) -> np.ndarray:
+    """
+    Sums up for every cell the values of the cells within the environment, cells outside of the block count as 0.
+    :param values: Numeric array, the last two dimensions are rows and columns
+    :param offsets: Environment, see environment_offsets
+    :return: Array of the same shape and type
+    """
+    rows, cols = values.shape[-2:]
+    sums = np.zeros(values.shape, dtype=values.dtype)
+    for row_offset, col_offset in offsets:
+        if abs(row_offset) >= rows or abs(col_offset) >= cols:
+            continue
+        # sums[r, c] += values[r + row_offset, c + col_offset] for all cells where both are inside
+        dst_rows = slice(max(0, -row_offset), rows - max(0, row_offset))
+        src_rows = slice(max(0, row_offset), rows - max(0, -row_offset))
+        dst_cols = slice(max(0, -col_offset), cols - max(0, col_offset))
+        src_cols = slice(max(0, col_offset), cols - max(0, -col_offset))
+        sums[..., dst_rows, dst_cols] += values[..., src_rows, src_cols]
+    return sums
+
+
+def advance_status(states: np.ndarray, days: np.ndarray, params: StatusParams, rs: np.random.RandomState,
+                   inner: slice = slice(None)) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Applies all status rules for one day.
+    Every susceptible cell with k infectious cells (infective or incubating) within the infection environment is
+    infected with probability 1 - (1 - p)^k, which is the chance that at least one of them infects it. Vaccinated
+    cells are not infected anymore on the same day.
+    :param states: State block, may contain halo rows around the rows to update
+    :param days: Incubation days of the rows to update
+    :param params: Rules to apply
+    :param rs: Random stream, only the cells a rule applies to draw numbers
+    :param inner: Rows of the block to update, the remaining rows are only read as environment
+    :return: New states and incubation days of the inner rows
+    """
+    infectious = (states == INFECTIVE) | (states == INCUBATION)
+    counts = neighbour_counts(infectious, params.infection_offsets)[..., inner, :]
+    current = states[..., inner, :]
+    next_states = current.copy()
+    next_days = days.copy()
+
+    susceptible = current == SUSCEPTIBLE
+    if params.vaccinate:
+        vaccinated = np.zeros(current.shape, dtype=bool)
+        vaccinated[susceptible] = rs.random_sample(np.count_nonzero(susceptible)) < params.vaccine_share
+        next_states[vaccinated] = IMMUNE
+        susceptible &= ~vaccinated
+
+    exposed = susceptible & (counts > 0)
+    infection_chance = 1.0 - np.power(1.0 - params.infection_prob, counts[exposed])
+    infected = np.zeros(current.shape, dtype=bool)
+    infected[exposed] = rs.random_sample(infection_chance.shape) < infection_chance
+    next_states[infected] = params.infection_state
+
+    infective = current == INFECTIVE
+    removed = np.zeros(current.shape, dtype=bool)
+    removed[infective] = rs.random_sample(np.count_nonzero(infective)) < params.remove_prob
+    if params.lethality_enabled:
+        dead = np.zeros(current.shape, dtype=bool)
+        dead[removed] = rs.random_sample(np.count_nonzero(removed)) < params.lethality
+        next_states[dead] = DEAD
+        next_states[removed & ~dead] = IMMUNE
+    else:
+        next_states[removed] = REMOVED
+
+    if params.incubation_enabled:
+        incubating = current == INCUBATION
+        done = incubating & (days == params.incubation_period)
+        next_states[done] = INFECTIVE
+        next_days[incubating & ~done] += 1
+
+    return next_states, next_days
+
+
+def movers(states: np.ndarray, mixing_value_m: float, rs: np.random.RandomState) -> np.ndarray:
+    """
+    Draws the agents that move today, the dead ones never move.
+    :return: Flat indices of the moving agents (in index order)
+    """
+    flat = states.reshape(-1)
+    candidates = np.flatnonzero((flat != EMPTY) & (flat != DEAD))
+    chance = rs.randint(low=0, high=100, size=len(candidates))
+    return candidates[chance <= mixing_value_m * 100]
+
+
+def move_cells(states: np.ndarray, days: np.ndarray, sources: np.ndarray, targets: np.ndarray) -> None:
+    """Moves the agents at the flat source indices to the (free) flat target indices, in place"""
+    flat_states = states.reshape(-1)
+    flat_days = days.reshape(-1)
+    flat_states[targets] = flat_states[sources]
+    flat_days[targets] = flat_days[sources]
+    flat_states[sources] = EMPTY
+    flat_days[sources] = 0
+
+
+def long_range_moves(states: np.ndarray, days: np.ndarray, mixing_value_m: float,
+                     rs: np.random.RandomState) -> int:
+    """
+    Moves every moving agent to a random free cell of the whole block, in place.
+    The moving agents are matched in random order with distinct cells drawn from the cells that were free before
+    anybody moved, so the cells vacated today are only used from the next day on. If there are more moving agents
+    than free cells, the surplus stays.
+    :return: Number of moved agents
+    """
+    moving = movers(states, mixing_value_m, rs)
+    free = np.flatnonzero(states.reshape(-1) == EMPTY)
+    count = min(len(moving), len(free))
+    if count == 0:
+        return 0
+
+    sources = moving[rs.permutation(len(moving))[:count]]
+    targets = rs.choice(free, count, replace=False)
+    move_cells(states, days, sources, targets)
+    return count
+
+
+def batched_long_range_moves(states: np.ndarray, days: np.ndarray, mixing_value_m: float,
+                             rs: np.random.RandomState) -> np.ndarray:
+    """
+    Same as long_range_moves for a stack of independent blocks (e.g. replicas), shape (blocks, rows, cols).
+    One sort per day puts every block into the order: movers in random order, free cells in random order, the
+    rest. The first movers of a block are then matched with its first free cells.
+    :return: Number of moved agents per block
+    """
+    count_blocks = states.shape[0]
+    flat_states = states.reshape(count_blocks, -1)
+    flat_days = days.reshape(count_blocks, -1)
+
+    agents = (flat_states != EMPTY) & (flat_states != DEAD)
+    moving = np.zeros(flat_states.shape, dtype=bool)
+    moving[agents] = rs.randint(low=0, high=100, size=np.count_nonzero(agents)) <= mixing_value_m * 100
+    free = flat_states == EMPTY
+    moving_count = moving.sum(axis=1)
+    count = np.minimum(moving_count, free.sum(axis=1))
+
+    keys = np.full(flat_states.shape, 4.0)
+    keys[moving] = rs.random_sample(np.count_nonzero(moving))
+    keys[free] = 2.0 + rs.random_sample(np.count_nonzero(free))
+    order = np.argsort(keys, axis=1)
+
+    block = np.repeat(np.arange(count_blocks), count)
+    rank = np.arange(len(block)) - np.repeat(np.cumsum(count) - count, count)
+    sources = order[block, rank]
+    targets = order[block, moving_count[block] + rank]
+    flat_states[block, targets] = flat_states[block, sources]
+    flat_days[block, targets] = flat_days[block, sources]
+    flat_states[block, sources] = EMPTY
+    flat_days[block, sources] = 0
+    return count
+
+
+def limited_moves(states: np.ndarray, days: np.ndarray, params: MovementParams, rs: np.random.RandomState,
+                  rounds: int = 3) -> int:
+    """
+    Moves every moving agent to a free cell within its movement environment, in place. Only cells of the block
+    are considered, moves leaving the block are rejected. Leading dimensions are independent blocks (e.g.
+    replicas), nobody moves from one to another.
+    Every moving agent proposes a uniformly drawn offset of its environment. A proposal is rejected if it leaves
+    the block or hits an occupied cell, if several agents propose the same cell the one with the highest random
+    priority wins. Rejected agents propose again in the next round, where the cells vacated in the rounds
+    before are free.
+    :param rounds: Number of proposal rounds
+    :return: Number of moved agents
+    """
+    moved = 0
+    occupied = states.reshape(-1) != EMPTY
+    sources = movers(states, params.mixing_value_m, rs)
+    for round_sources, round_targets in limited_move_rounds(occupied, states.shape, sources, params, rs, rounds):
+        move_cells(states, days, round_sources, round_targets)
+        moved += len(round_sources)
+    return moved
+
+
+def limited_move_rounds(occupied: np.ndarray, shape: tuple, sources: np.ndarray, params: MovementParams,
+                        rs: np.random.RandomState, rounds: int = 3) \
+        -> typing.Iterator[typing.Tuple[np.ndarray, np.ndarray]]:
+    """
+    Proposal rounds of limited_moves on a mask of the occupied cells, see there.
+    :param occupied: Flat mask of the occupied cells, updated in place after every round
+    :param shape: Shape of the cells, the last two dimensions are rows and columns, leading ones are blocks
+    :param sources: Flat indices of the moving agents
+    :param rounds: Number of proposal rounds
+    :return: Yields the flat source and target indices of the moves accepted in every round. A target is free at
+             its round, it may be the source of a move of an earlier round.
+    """
+    rows, cols = shape[-2:]
+    pending = np.asarray(sources, dtype=np.intp)
+    if len(pending) == 0:
+        return
+    pending = pending[rs.permutation(len(pending))]  # Random priority, earlier wins
+
+    radii = np.full(len(pending), params.radius)
+    if params.high_distances_are_uncommon:
+        # Lower radius is more probable, same distribution as the LimitedMovementStrategy
+        drawn = np.round(np.abs(rs.normal(loc=0, scale=params.radius / 3, size=len(pending)))).astype(int)
+        radii = np.minimum(np.maximum(1, drawn), params.radius)
+
+    for _ in range(rounds):
+        if len(pending) == 0:
+            break
+
+        row_offsets = np.zeros(len(pending), dtype=np.intp)
+        col_offsets = np.zeros(len(pending), dtype=np.intp)
+        for radius in np.unique(radii):
+            selected = np.flatnonzero(radii == radius)
+            table = np.array(environment_offsets(int(radius), params.metric), dtype=np.intp)
+            choice = table[rs.randint(len(table), size=len(selected))]
+            row_offsets[selected] = choice[:, 0]
+            col_offsets[selected] = choice[:, 1]
+
+        blocks, cells = np.divmod(pending, rows * cols)
+        source_rows, source_cols = np.divmod(cells, cols)
+        target_rows = source_rows + row_offsets
+        target_cols = source_cols + col_offsets
+        inside = (target_rows >= 0) & (target_rows < rows) & (target_cols >= 0) & (target_cols < cols)
+        targets = np.where(inside, blocks * (rows * cols) + target_rows * cols + target_cols, 0)
+        valid = inside & ~occupied[targets]
+
+        # np.unique returns the first occurrence, i.e. the proposal with the highest priority
+        candidates = np.flatnonzero(valid)
+        _, first = np.unique(targets[candidates], return_index=True)
+        accepted = np.zeros(len(pending), dtype=bool)
+        accepted[candidates[first]] = True
+
+        round_sources = pending[accepted]
+        round_targets = targets[accepted]
+        occupied[round_sources] = False
+        occupied[round_targets] = True
+        yield round_sources, round_targets
+        pending = pending[~accepted]
+        radii = radii[~accepted]
+
+
+def place_agents(size: int, susceptible_share: float, infected_share: float,
+                 rs: np.random.RandomState) -> np.ndarray:
+    """
+    Initial placement of the agents, draws the same cells as Grid.place_agents_on_the_field for the same stream.
+    :return: State array of shape (size, size)
+    """
+    total = size * size
+    choice = rs.choice(total, int(np.round((susceptible_share + infected_share) * total)), replace=False)
+    susceptible_count = int(round(susceptible_share * total))
+
+    states = np.zeros(total, dtype=STATE_DTYPE)
+    states[choice[:susceptible_count]] = SUSCEPTIBLE
+    states[choice[susceptible_count:]] = INFECTIVE
+    return states.reshape(size, size)
+
+
+def state_counts(states: np.ndarray) -> typing.Dict[AgentState, int]:
+    """:return Number of cells per AgentState"""
+    counts = np.bincount(states.reshape(-1), minlength=len(AgentState))
+    return {agent_state: int(counts[agent_state.value]) for agent_state in AgentState}
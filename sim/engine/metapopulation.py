@@ -0,0 +1,221 @@
+import typing
+import numpy as np
+from engine import kernels
+from model.agent_state import AgentState
+from model.neighborhood import environment_offsets
+from model.state import SimState
+
+"""
+Metapopulation engine.
+Every cell of the grid holds the number of people per compartment instead of a single agent, a day is a handful
+of binomial draws per cell and compartment (tau leaping with a step of one day). The cost only depends on the
+number of cells, not on the number of people, so the population can be scaled to millions.
+"""
+
+# Compartments that change their cell, the dead ones stay
+MOVING = (AgentState.SUSCEPTIBLE, AgentState.INFECTIVE, AgentState.REMOVED, AgentState.IMMUNE)
+
+
+class MetapopulationEngine:
+    """Simulates the scenario described by a SimState with people_per_cell people in every cell.
+    The shares of the state split the people of a cell into susceptible and infected ones.
+    Every day, first the movement: every living person leaves the cell with probability mixing_value_m, either to a
+    random cell within the movement limit (moves leaving the grid are rejected, the person stays) or, without the
+    limit, to a random cell of the whole grid.
+    Then the status update, all flows are drawn from the counts of the beginning of the day:
+    - on the day vaccine_time() the vaccination takes vaccine_share() of the susceptible people, spread over the
+      following days with a vaccine_daily_capacity(),
+    - a person meets contacts people per day, drawn from the living people of its cell and the cells within the
+      infection environment. Infectious (infective or incubating) ones infect with infection_prob, so a
+      susceptible person is infected with probability 1 - (1 - p)^(contacts * x), x being the infectious share
+      of the people around it. By default contacts is the size of the infection environment, one person per
+      cell then has the contacts of the agent based model with a fully occupied grid,
+    - infective people are removed with remove_prob, with lethality they die with lethality() or become immune,
+    - the incubation lasts incubation_period + 1 days, like in the agent based model.
+    Quarantine is not supported."""
+
+    def state(self) -> SimState:
+        return self.__state
+
+    def day(self) -> int:
+        """Number of simulated days since the last reset"""
+        return self.__day
+
+    def people_per_cell(self) -> int:
+        return self.__people_per_cell
+
+    def contacts(self) -> float:
+        return self.__contacts
+
+    def compartments(self) -> np.ndarray:
+        """
+        Number of people per compartment and cell.
+        :return: Copy of shape (len(AgentState), size, size), indexed by the AgentState values
+        """
+        compartments = self.__counts.copy()
+        compartments[AgentState.INCUBATION.value] = self.__incubating.sum(axis=0)
+        return compartments
+
+    def counts(self) -> typing.Dict[AgentState, int]:
+        """Number of people per AgentState"""
+        totals = self.__counts.reshape(len(AgentState), -1).sum(axis=1)
+        counts = {agent_state: int(totals[agent_state.value]) for agent_state in AgentState}
+        counts[AgentState.INCUBATION] = int(self.__incubating.sum())
+        return counts
+
+    def is_finished(self) -> bool:
+        """Whether the epidemic is over, i.e. nobody is infective or incubating anymore"""
+        return not self.__counts[AgentState.INFECTIVE.value].any() and not self.__incubating.any()
+
+    def reset(self) -> None:
+        """Fills the cells with people"""
+        if self.__state.quarantine_enabled():
+            raise ValueError('Quarantine is not supported by the metapopulation engine')
+        size = int(self.__state.size())
+        self.__rs = np.random.RandomState(np.random.MT19937(np.random.SeedSequence(self.__state.get_seed())))
+
+        shares = self.__state.susceptible_share() + self.__state.infected_share()
+        infected_share = self.__state.infected_share() / shares if shares > 0 else 0.0
+        self.__counts = np.zeros((len(AgentState), size, size), dtype=np.int64)
+        infected = self.__rs.binomial(self.__people_per_cell, infected_share, (size, size))
+        self.__counts[AgentState.INFECTIVE.value] = infected
+        self.__counts[AgentState.SUSCEPTIBLE.value] = self.__people_per_cell - infected
+        self.__incubating = np.zeros((0, size, size), dtype=np.int64)
+        self.__day = 0
+        self.__vaccine_target = None
+
+    def step(self) -> None:
+        """Simulates the next day: movement, then the status update"""
+        if self.__counts is None:
+            raise RuntimeError('The engine has to be reset before stepping')
+        self.__day += 1
+        self.__move()
+        self.__advance_status()
+
+    def run(self, max_days: int = None) -> int:
+        """Simulates until the epidemic is over.
+        :param max_days: Optional upper bound of days to simulate
+        :return the number of simulated days"""
+        days = 0
+        while not self.is_finished() and (max_days is None or days < max_days):
+            self.step()
+            days += 1
+        return days
+
+    def __move(self) -> None:
+        state = self.__state
+        mixing = state.get_mixing_value_m()
+        if mixing <= 0:
+            return
+
+        layers = [self.__counts[agent_state.value] for agent_state in MOVING] + list(self.__incubating)
+        if state.movement_limit_enabled():
+            offsets = environment_offsets(state.movement_limit_radius(), state.movement_limit_metric())
+            for layer in layers:
+                movers = self.__rs.binomial(layer, mixing)
+                layer -= movers
+                layer += self.__scatter(movers, offsets)
+        else:
+            cells = layers[0].size
+            for layer in layers:
+                movers = self.__rs.binomial(layer, mixing)
+                layer -= movers
+                layer += self.__rs.multinomial(movers.sum(), np.full(cells, 1.0 / cells)).reshape(layer.shape)
+
+    def __scatter(self, movers: np.ndarray, offsets: tuple) -> np.ndarray:
+        """Splits the movers of every cell evenly at random over the offsets, moves off the grid are rejected
+        :return: Number of arrived (or staying) movers per cell"""
+        rows, cols = movers.shape
+        arrived = np.zeros(movers.shape, dtype=np.int64)
+        remaining = movers.copy()
+        for k, (row_offset, col_offset) in enumerate(offsets):
+            # Multinomial with equal probabilities as a chain of binomial draws
+            share = self.__rs.binomial(remaining, 1.0 / (len(offsets) - k))
+            remaining -= share
+            arrived += share
+            if abs(row_offset) >= rows or abs(col_offset) >= cols:
+                continue
+            # Move share[r, c] to (r + row_offset, c + col_offset) where that cell exists
+            src_rows = slice(max(0, -row_offset), rows - max(0, row_offset))
+            dst_rows = slice(max(0, row_offset), rows - max(0, -row_offset))
+            src_cols = slice(max(0, -col_offset), cols - max(0, col_offset))
+            dst_cols = slice(max(0, col_offset), cols - max(0, -col_offset))
+            arrived[src_rows, src_cols] -= share[src_rows, src_cols]
+            arrived[dst_rows, dst_cols] += share[src_rows, src_cols]
+        return arrived
+
+    def __advance_status(self) -> None:
+        state = self.__state
+        rs = self.__rs
+        counts = self.__counts
+        susceptible = counts[AgentState.SUSCEPTIBLE.value]
+        infective = counts[AgentState.INFECTIVE.value]
+
+        vaccinated = self.__vaccinated(susceptible)
+
+        infectious = infective + self.__incubating.sum(axis=0)
+        living = counts.sum(axis=0) - counts[AgentState.DEAD.value] + self.__incubating.sum(axis=0)
+        offsets = environment_offsets(state.infection_env_radius(), state.infection_env_metric())
+        infectious_around = infectious + kernels.neighbour_sums(infectious, offsets)
+        living_around = living + kernels.neighbour_sums(living, offsets)
+        exposure = self.__contacts * infectious_around / np.maximum(living_around, 1)
+        chance = -np.expm1(exposure * np.log1p(-min(state.infection_prob(), 1.0 - 1e-12)))
+        infected = rs.binomial(susceptible - vaccinated, chance)
+
+        removed = rs.binomial(infective, state.remove_prob())
+
+        susceptible -= vaccinated + infected
+        counts[AgentState.IMMUNE.value] += vaccinated
+        infective -= removed
+        if state.lethality_toggle():
+            dead = rs.binomial(removed, state.lethality())
+            counts[AgentState.DEAD.value] += dead
+            counts[AgentState.IMMUNE.value] += removed - dead
+        else:
+            counts[AgentState.REMOVED.value] += removed
+
+        # Incubation cohorts, the first one was infected today, the last one becomes infective
+        cohorts = state.incubation_period() + 1 if state.incubation_period_enabled() else 0
+        incubating = np.zeros((cohorts + 1,) + infected.shape, dtype=np.int64)
+        incubating[0] = infected
+        kept = min(cohorts, len(self.__incubating))
+        incubating[1:kept + 1] = self.__incubating[:kept]
+        infective += incubating[cohorts:].sum(axis=0) + self.__incubating[kept:].sum(axis=0)
+        self.__incubating = incubating[:cohorts]
+
+    def __vaccinated(self, susceptible: np.ndarray) -> np.ndarray:
+        """Draws the people vaccinated today"""
+        state = self.__state
+        if not state.vaccine_toggle():
+            self.__vaccine_target = None
+            return np.zeros(susceptible.shape, dtype=np.int64)
+        if self.__day == state.vaccine_time():
+            self.__vaccine_target = int(round(state.vaccine_share() * susceptible.sum()))
+        if not self.__vaccine_target:
+            return np.zeros(susceptible.shape, dtype=np.int64)
+
+        total = int(susceptible.sum())
+        count = min(self.__vaccine_target, total)
+        if state.vaccine_daily_capacity() > 0:
+            count = min(count, state.vaccine_daily_capacity())
+        vaccinated = self.__rs.binomial(susceptible, count / total if total > 0 else 0.0)
+        self.__vaccine_target = max(0, self.__vaccine_target - int(vaccinated.sum())) if count < total else 0
+        return vaccinated
+
+    def __init__(self, state: SimState, people_per_cell: int, contacts: float = None):
+        """
+        :param state: Settings of the scenario, read on every reset and step
+        :param people_per_cell: Number of people in every cell at the beginning
+        :param contacts: People met per day, the size of the infection environment of the state if omitted
+        """
+        if people_per_cell < 1:
+            raise ValueError(f'A cell needs at least one person, got {people_per_cell}')
+        self.__state = state
+        self.__people_per_cell = people_per_cell
+        self.__contacts = float(contacts) if contacts is not None else \
+            float(len(environment_offsets(state.infection_env_radius(), state.infection_env_metric())))
+        self.__counts = None
+        self.__incubating = None
+        self.__rs = None
+        self.__day = 0
+        self.__vaccine_target = None
@@ -0,0 +1,254 @@
+import typing
+import numpy as np
+from engine import kernels
+from model.agent_state import AgentState
+from model.environmentmetric import EnvironmentMetric
+from model.neighborhood import environment_offsets
+from model.state import SimState
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+"""
+Declarative transition rules compiled to array kernels.
+A model variant is a list of rules, each one moves cells from one state to another:
+
+    from INFECTIVE to REMOVED with prob p
+    from SUSCEPTIBLE to INCUBATION with prob p per contact in INFECTIVE, INCUBATION within radius r (metric)
+    from INCUBATION to INFECTIVE after k days
+
+The rules are given as Python data or TOML, e.g.
+
+    [[rule]]
+    from = "SUSCEPTIBLE"
+    to = "INCUBATION"
+    prob = 0.2
+    contacts = ["INFECTIVE", "INCUBATION"]
+    radius = 1
+    metric = "MANHATTAN"
+
+and compiled with compile_rules into a kernel that works like kernels.advance_status, so it can replace the built
+in rules of the array engines (see engine.ensemble.EnsembleEngine).
+"""
+
+
+class Rule(typing.NamedTuple):
+    """Transition of the cells in state source to state target.
+    Without contacts a cell changes with probability prob per day. With contacts every cell in one of the contact
+    states within the environment (radius, metric) is a chance of prob, so a cell with k contacts changes with
+    probability 1 - (1 - prob)^k. With after set the cell changes (with probability prob) once it was in the source
+    state for that many days."""
+    source: AgentState
+    target: AgentState
+    prob: float = 1.0
+    contacts: typing.Tuple[AgentState, ...] = ()
+    radius: int = 1
+    metric: EnvironmentMetric = EnvironmentMetric.MANHATTAN
+    after: int = None
+
+    @staticmethod
+    def of(data: dict) -> 'Rule':
+        """
+        Reads a rule from plain data, the states and the metric are given by name.
+        :param data: Dict with the keys from, to and optionally prob, contacts, radius, metric and after
+        :return: The rule
+        """
+        unknown = set(data) - {'from', 'to', 'prob', 'contacts', 'radius', 'metric', 'after'}
+        if unknown:
+            raise ValueError(f'Unknown rule keys {sorted(unknown)}')
+        if 'from' not in data or 'to' not in data:
+            raise ValueError(f'A rule needs a from and a to state, got {data}')
+
+        rule = Rule(
+            source=_agent_state(data['from']),
+            target=_agent_state(data['to']),
+            prob=float(data.get('prob', 1.0)),
+            contacts=tuple(_agent_state(name) for name in data.get('contacts', ())),
+            radius=int(data.get('radius', 1)),
+            metric=_metric(data.get('metric', EnvironmentMetric.MANHATTAN)),
+            after=None if data.get('after') is None else int(data['after']),
+        )
+        rule.validate()
+        return rule
+
+    def validate(self) -> None:
+        if self.source is AgentState.EMPTY or self.target is AgentState.EMPTY:
+            raise ValueError('Rules can not create or remove agents')
+        if self.source is self.target:
+            raise ValueError(f'Rule from {self.source.name} to itself')
+        if not 0.0 <= self.prob <= 1.0:
+            raise ValueError(f'Rule probability must be in range [0.0; 1.0], value was {self.prob}')
+        if self.contacts and self.after is not None:
+            raise ValueError('A rule can either depend on contacts or on days, not both')
+        if self.contacts and self.radius < 1:
+            raise ValueError(f'Contact radius must be at least 1, value was {self.radius}')
+        if self.after is not None and self.after < 0:
+            raise ValueError(f'Days must not be negative, value was {self.after}')
+
+
+def _agent_state(value) -> AgentState:
+    if isinstance(value, AgentState):
+        return value
+    try:
+        return AgentState[str(value).upper()]
+    except KeyError:
+        raise ValueError(f'Unknown agent state {value}') from None
+
+
+def _metric(value) -> EnvironmentMetric:
+    if isinstance(value, EnvironmentMetric):
+        return value
+    for metric in EnvironmentMetric:
+        if str(value).upper() in (metric.name, metric.value.upper()):
+            return metric
+    raise ValueError(f'Unknown metric {value}')
+
+
+def load_rules(data: typing.Iterable) -> typing.List[Rule]:
+    """
+    Reads rules from plain data.
+    :param data: Rules or dicts (see Rule.of), or a dict with such a list under the key rule
+    :return: List of the rules in the given order
+    """
+    if isinstance(data, dict):
+        data = data.get('rule', [])
+    return [item if isinstance(item, Rule) else Rule.of(item) for item in data]
+
+
+def load_rules_toml(text: str) -> typing.List[Rule]:
+    """
+    Reads rules from a TOML document with one [[rule]] table per rule.
+    Needs Python 3.11 or the tomli package.
+    :param text: TOML document
+    :return: List of the rules in the given order
+    """
+    if tomllib is None:
+        raise ImportError('Reading TOML needs Python 3.11 or the tomli package')
+    return load_rules(tomllib.loads(text))
+
+
+def rules_of(state: SimState) -> typing.List[Rule]:
+    """
+    Rules of the default model with the settings of the state (vaccination and quarantine are not covered).
+    :param state: Settings of the simulation
+    :return: List of the rules
+    """
+    infection_target = AgentState.INCUBATION if state.incubation_period_enabled() else AgentState.INFECTIVE
+    rules = [Rule(AgentState.SUSCEPTIBLE, infection_target, state.infection_prob(),
+                  contacts=(AgentState.INFECTIVE, AgentState.INCUBATION), radius=state.infection_env_radius(),
+                  metric=state.infection_env_metric())]
+    if state.lethality_toggle():
+        rules.append(Rule(AgentState.INFECTIVE, AgentState.DEAD, state.remove_prob() * state.lethality()))
+        rules.append(Rule(AgentState.INFECTIVE, AgentState.IMMUNE,
+                          state.remove_prob() * (1.0 - state.lethality())))
+    else:
+        rules.append(Rule(AgentState.INFECTIVE, AgentState.REMOVED, state.remove_prob()))
+    if state.incubation_period_enabled():
+        rules.append(Rule(AgentState.INCUBATION, AgentState.INFECTIVE, after=state.incubation_period()))
+    return rules
+
+
+class CompiledRules:
+    """Kernel of a list of rules, called like kernels.advance_status (the rules take the place of the params).
+    All rules read the states of the beginning of the day. The rules of one source state compete: every cell of
+    that state draws one number and takes the first rule whose probability covers it, so a rule keeps its
+    probability as long as the rules before it leave room (the probabilities of a cell are capped at 1 in rule
+    order). The days array counts the days a cell spent in its state for the states with a rule depending on
+    days and is zero for all other cells. The neighbour counts are computed once per combination of contact
+    states and environment."""
+
+    def rules(self) -> typing.List[Rule]:
+        return list(self.__rules)
+
+    def halo(self) -> int:
+        """Number of rows around a block that the kernel reads as environment"""
+        return max((rule.radius for rule in self.__rules if rule.contacts), default=0)
+
+    def __call__(self, states: np.ndarray, days: np.ndarray, rs: np.random.RandomState,
+                 inner: slice = slice(None)) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """
+        Applies the rules for one day.
+        :param states: State block, may contain halo rows around the rows to update
+        :param days: Days in state of the rows to update
+        :param rs: Random stream, only the cells of states with rules draw numbers
+        :param inner: Rows of the block to update, the remaining rows are only read as environment
+        :return: New states and days of the inner rows
+        """
+        counts = {key: kernels.neighbour_counts(np.isin(states, contacts), offsets)[..., inner, :]
+                  for key, (contacts, offsets) in self.__environments.items()}
+        current = states[..., inner, :]
+        next_states = current.copy()
+        next_days = days.copy()
+        changed = np.zeros(current.shape, dtype=bool)
+
+        for source, rules in self.__groups:
+            cells = current == source
+            cell_count = np.count_nonzero(cells)
+            if cell_count == 0:
+                continue
+
+            # Cumulative probabilities of the rules for every cell of the source state
+            covered = np.zeros(cell_count)
+            bounds = []
+            for rule, environment in rules:
+                if environment is not None:
+                    chance = 1.0 - np.power(1.0 - rule.prob, counts[environment][cells])
+                elif rule.after is not None:
+                    chance = np.where(days[cells] >= rule.after, rule.prob, 0.0)
+                else:
+                    chance = rule.prob
+                covered = np.minimum(covered + chance, 1.0)
+                bounds.append(covered)
+
+            candidates = covered > 0
+            if not candidates.any():
+                continue
+            draws = np.ones(cell_count)
+            draws[candidates] = rs.random_sample(np.count_nonzero(candidates))
+
+            # The first rule whose bound lies above the draw wins, so the earlier rules are written last
+            targets = np.full(cell_count, -1, dtype=np.int64)
+            for (rule, _), bound in reversed(list(zip(rules, bounds))):
+                targets[draws < bound] = rule.target.value
+            fired = targets >= 0
+
+            indices = tuple(axis[fired] for axis in np.nonzero(cells))
+            next_states[indices] = targets[fired]
+            changed[indices] = True
+
+        next_days[changed] = 0
+        if self.__timed_states:
+            next_days[np.isin(current, self.__timed_states) & ~changed] += 1
+        return next_states, next_days
+
+    def __init__(self, rules: typing.Iterable[Rule]):
+        """
+        :param rules: Rules in order of precedence
+        """
+        self.__rules = list(rules)
+        self.__environments = dict()
+        groups = dict()
+        for rule in self.__rules:
+            rule.validate()
+            environment = None
+            if rule.contacts:
+                contacts = tuple(sorted({state.value for state in rule.contacts}))
+                environment = (contacts, rule.radius, rule.metric)
+                self.__environments[environment] = (contacts, environment_offsets(rule.radius, rule.metric))
+            groups.setdefault(rule.source.value, []).append((rule, environment))
+        self.__groups = list(groups.items())
+        self.__timed_states = sorted({rule.source.value for rule in self.__rules if rule.after is not None})
+
+
+def compile_rules(rules: typing.Iterable) -> CompiledRules:
+    """
+    Compiles rules into a kernel.
+    :param rules: Rules or plain data, see load_rules
+    :return: The kernel
+    """
+    return CompiledRules(load_rules(rules))
@@ -0,0 +1,51 @@
+from unittest import TestCase
+import numpy as np
+from controller.simulation import Simulation
+from engine.ensemble import EnsembleEngine
+from model.agent_state import AgentState
+from model.state import SimState
+
+
+class TestEnsembleEngine(TestCase):
+
+    def test_replicas_start_like_simulations(self):
+        sut = EnsembleEngine(self.__create_state(seed=1), replicas=3)
+        sut.reset()
+
+        for replica, seed in enumerate(sut.seeds()):
+            simulation = Simulation(self.__create_state(seed=seed))
+            simulation.reset()
+            self.assertEqual(sut.data()[replica].tolist(), simulation.get_state().data().astype(np.int8).tolist())
+
+    def test_same_seed_same_result(self):
+        first = EnsembleEngine(self.__create_state(seed=4), replicas=5)
+        second = EnsembleEngine(self.__create_state(seed=4), replicas=5)
+        first.reset()
+        second.reset()
+        first.run(max_days=10)
+        second.run(max_days=10)
+
+        self.assertEqual(first.data().tolist(), second.data().tolist())
+
+    def test_extinct_replicas_are_frozen(self):
+        state = self.__create_state(seed=2)
+        state.set_movement_limit_enabled(True)
+        sut = EnsembleEngine(state, replicas=8)
+        sut.reset()
+        population = sut.counts()[:, 1:].sum(axis=1)
+        sut.run()
+
+        self.assertTrue(sut.is_finished())
+        counts = sut.counts()
+        self.assertEqual(counts[:, AgentState.INFECTIVE.value].tolist(), [0] * 8)
+        self.assertEqual(counts[:, 1:].sum(axis=1).tolist(), population.tolist())
+
+        final = sut.data()
+        sut.step()
+        self.assertEqual(sut.data().tolist(), final.tolist())
+        self.assertTrue((sut.elapsed_days() < sut.day()).all())
+
+    def __create_state(self, seed: int) -> SimState:
+        state = SimState(size=15, susceptible_share=0.69, infected_share=0.01)
+        state.seed(seed)
+        return state
@@ -0,0 +1,100 @@
+from unittest import TestCase
+import numpy as np
+from engine import kernels
+from engine.gillespie import GillespieEngine, SumTree, rate_of
+from model.agent_state import AgentState
+from model.state import SimState
+
+
+class TestSumTree(TestCase):
+
+    def test_draws_proportional_to_the_weights(self):
+        sut = SumTree(5)
+        sut.set_all(np.array([1.0, 0.0, 2.0, 0.0, 0.0]))
+        sut.update(4, 1.0)
+        sut.update(0, 0.0)
+        self.assertEqual(sut.total(), 3.0)
+
+        rs = np.random.RandomState(1)
+        draws = np.bincount([sut.find(rs.random_sample() * sut.total()) for _ in range(3000)], minlength=5)
+        self.assertEqual(draws[0] + draws[1] + draws[3], 0)
+        self.assertAlmostEqual(draws[2] / 3000, 2 / 3, delta=0.03)
+
+
+class TestGillespieEngine(TestCase):
+
+    def test_recovery_matches_the_daily_probability(self):
+        state = SimState(size=60, susceptible_share=0, infected_share=0.5, infection_prob=0, remove_prob=0.4)
+        state.seed(2)
+        sut = GillespieEngine(state)
+        sut.reset()
+        infected = sut.counts()[AgentState.INFECTIVE]
+
+        sut.step()
+        sut.step()
+
+        self.assertAlmostEqual(sut.counts()[AgentState.INFECTIVE] / infected, 0.6 ** 2, delta=0.03)
+        self.assertEqual(sut.events(), infected - sut.counts()[AgentState.INFECTIVE])
+        self.assertAlmostEqual(rate_of(0.4), -np.log(0.6))
+
+    def test_incubation_is_reported_at_integer_days(self):
+        state = SimState(size=2, susceptible_share=0.5, infected_share=0.25, infection_prob=1, remove_prob=0)
+        state.seed(3)
+        state.set_infection_env_radius(2)
+        state.set_incubation_period_enabled(True)
+        state.set_incubation_period(2)
+        sut = GillespieEngine(state)
+        sut.reset()
+
+        history = []
+        for _ in range(4):
+            sut.step()
+            counts = sut.counts()
+            history.append((counts[AgentState.INCUBATION], counts[AgentState.INFECTIVE]))
+
+        # Infected on day 1, incubating for two more days
+        self.assertEqual(history, [(2, 1), (2, 1), (2, 1), (0, 3)])
+        self.assertEqual(sut.time(), 4.0)
+
+    def test_run_until_finished(self):
+        state = SimState(size=30, susceptible_share=0.6, infected_share=0.01)
+        state.seed(4)
+        state.set_lethality_toggle(True)
+        sut = GillespieEngine(state)
+        sut.reset()
+        agents = sum(count for agent_state, count in sut.counts().items() if agent_state is not AgentState.EMPTY)
+
+        days = sut.run(1000)
+
+        self.assertTrue(sut.is_finished())
+        self.assertEqual(sut.day(), days)
+        counts = sut.counts()
+        self.assertEqual(counts[AgentState.IMMUNE] + counts[AgentState.DEAD] + counts[AgentState.SUSCEPTIBLE],
+                         agents)
+        self.assertEqual(np.count_nonzero(sut.data() == kernels.IMMUNE), counts[AgentState.IMMUNE])
+
+    def test_isolated_infectives_are_not_finished(self):
+        state = SimState(size=2, susceptible_share=0, infected_share=0.5, remove_prob=0)
+        sut = GillespieEngine(state)
+        sut.reset()
+
+        sut.step()
+
+        self.assertFalse(sut.is_finished())
+
+    def test_vaccination_keeps_the_daily_capacity(self):
+        state = SimState(size=20, susceptible_share=0.5, infected_share=0, infection_prob=0)
+        state.seed(5)
+        state.set_vaccine_toggle(True)
+        state.set_vaccine_time(1)
+        state.set_vaccine_share(0.5)
+        state.set_vaccine_daily_capacity(40)
+        sut = GillespieEngine(state)
+        sut.reset()
+
+        immune = []
+        for _ in range(4):
+            sut.step()
+            immune.append(sut.counts()[AgentState.IMMUNE])
+
+        self.assertEqual(immune, [40, 80, 100, 100])
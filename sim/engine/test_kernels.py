@@ -0,0 +1,43 @@
+from unittest import TestCase
+import numpy as np
+from engine import kernels
+from model.environmentmetric import EnvironmentMetric
+from model.neighborhood import environment_offsets
+
+
+class TestKernels(TestCase):
+
+    def test_neighbour_counts_match_offsets(self):
+        rs = np.random.RandomState(1)
+        mask = rs.random_sample((7, 9)) < 0.3
+        offsets = environment_offsets(2, EnvironmentMetric.EUCLIDEAN)
+
+        counts = kernels.neighbour_counts(mask, offsets)
+
+        for row in range(7):
+            for col in range(9):
+                expected = sum(1 for r, c in offsets
+                               if 0 <= row + r < 7 and 0 <= col + c < 9 and mask[row + r, col + c])
+                self.assertEqual(counts[row, col], expected)
+
+    def test_long_range_moves_keep_agents(self):
+        rs = np.random.RandomState(2)
+        states = kernels.place_agents(20, 0.5, 0.1, rs)
+        days = np.zeros(states.shape, dtype=kernels.DAYS_DTYPE)
+        before = kernels.state_counts(states)
+
+        moved = kernels.long_range_moves(states, days, 1.0, rs)
+
+        self.assertGreater(moved, 0)
+        self.assertEqual(kernels.state_counts(states), before)
+
+    def test_limited_moves_stay_in_environment(self):
+        rs = np.random.RandomState(3)
+        states = np.zeros((5, 5), dtype=kernels.STATE_DTYPE)
+        states[2, 2] = kernels.INFECTIVE
+        days = np.zeros(states.shape, dtype=kernels.DAYS_DTYPE)
+        params = kernels.MovementParams(1.0, True, 1, EnvironmentMetric.MANHATTAN, False)
+
+        self.assertEqual(kernels.limited_moves(states, days, params, rs), 1)
+        row, col = np.argwhere(states == kernels.INFECTIVE)[0]
+        self.assertEqual(abs(row - 2) + abs(col - 2), 1)
@@ -0,0 +1,67 @@
+from unittest import TestCase
+import numpy as np
+from engine.metapopulation import MetapopulationEngine
+from model.agent_state import AgentState
+from model.environmentmetric import EnvironmentMetric
+from model.state import SimState
+
+
+class TestMetapopulationEngine(TestCase):
+
+    def test_people_are_kept_until_the_end(self):
+        for limited in (False, True):
+            state = SimState(size=20, susceptible_share=0.69, infected_share=0.01)
+            state.seed(1)
+            state.set_movement_limit_enabled(limited)
+            state.set_incubation_period_enabled(True)
+            state.set_lethality_toggle(True)
+            sut = MetapopulationEngine(state, 2500)
+            sut.reset()
+
+            sut.run(500)
+
+            self.assertTrue(sut.is_finished())
+            counts = sut.counts()
+            self.assertEqual(sum(counts.values()), 1000000)
+            self.assertEqual(counts[AgentState.INFECTIVE] + counts[AgentState.INCUBATION], 0)
+            self.assertGreater(counts[AgentState.DEAD], 0)
+            self.assertEqual(sut.compartments()[AgentState.IMMUNE.value].sum(), counts[AgentState.IMMUNE])
+
+    def test_limited_movement_stays_in_the_environment(self):
+        state = SimState(size=5, susceptible_share=0.5, infected_share=0, infection_prob=0)
+        state.seed(2)
+        state.set_mixing_value_m(1.0)
+        state.set_movement_limit_enabled(True)
+        state.set_movement_limit_radius(1)
+        state.set_movement_limit_metric(EnvironmentMetric.MANHATTAN)
+        sut = MetapopulationEngine(state, 1000)
+        sut.reset()
+        before = sut.compartments()[AgentState.SUSCEPTIBLE.value]
+
+        sut.step()
+
+        after = sut.compartments()[AgentState.SUSCEPTIBLE.value]
+        self.assertEqual(after.sum(), before.sum())
+        # The corners keep the rejected moves off the grid and receive from their two neighbours
+        self.assertAlmostEqual(after[0, 0] / 1000, 0.5 + 0.5, delta=0.1)
+        self.assertAlmostEqual(after[2, 2] / 1000, 1.0, delta=0.1)
+
+    def test_recovery_and_incubation(self):
+        state = SimState(size=10, susceptible_share=0.5, infected_share=0.5, infection_prob=1, remove_prob=0.3)
+        state.seed(3)
+        state.set_mixing_value_m(0)
+        state.set_incubation_period_enabled(True)
+        state.set_incubation_period(1)
+        sut = MetapopulationEngine(state, 1000)
+        sut.reset()
+        infected = sut.counts()[AgentState.INFECTIVE]
+
+        sut.step()
+        sut.step()
+        counts = sut.counts()
+        self.assertAlmostEqual(counts[AgentState.INFECTIVE] / infected, 0.7 ** 2, delta=0.01)
+        self.assertGreater(counts[AgentState.INCUBATION], 0)
+
+        sut.step()
+        self.assertGreater(sut.counts()[AgentState.INFECTIVE], counts[AgentState.INFECTIVE])
+        self.assertTrue(np.all(sut.compartments()[AgentState.EMPTY.value] == 0))
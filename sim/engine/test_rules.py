@@ -0,0 +1,90 @@
+from unittest import TestCase
+import numpy as np
+from engine import kernels
+from engine.ensemble import EnsembleEngine
+from engine.rules import Rule, compile_rules, load_rules, load_rules_toml, rules_of
+from model.agent_state import AgentState
+from model.environmentmetric import EnvironmentMetric
+from model.state import SimState
+
+
+class TestRules(TestCase):
+
+    def test_toml_and_data_give_the_same_rules(self):
+        rules = load_rules_toml('''
+            [[rule]]
+            from = "SUSCEPTIBLE"
+            to = "INCUBATION"
+            prob = 0.2
+            contacts = ["INFECTIVE", "INCUBATION"]
+            radius = 2
+            metric = "Euclidean"
+
+            [[rule]]
+            from = "INCUBATION"
+            to = "INFECTIVE"
+            after = 3
+        ''')
+
+        self.assertEqual(rules, load_rules([
+            {'from': 'susceptible', 'to': 'incubation', 'prob': 0.2, 'contacts': ['INFECTIVE', 'INCUBATION'],
+             'radius': 2, 'metric': 'EUCLIDEAN'},
+            {'from': 'INCUBATION', 'to': 'INFECTIVE', 'after': 3},
+        ]))
+        self.assertEqual(rules[0].metric, EnvironmentMetric.EUCLIDEAN)
+        self.assertRaises(ValueError, lambda: load_rules([{'from': 'INFECTIVE', 'to': 'REMOVED', 'prob': 2}]))
+        self.assertRaises(ValueError, lambda: load_rules([{'from': 'INFECTIVE', 'to': 'GONE'}]))
+
+    def test_competing_rules_keep_their_probabilities(self):
+        kernel = compile_rules([Rule(AgentState.INFECTIVE, AgentState.DEAD, 0.1),
+                                Rule(AgentState.INFECTIVE, AgentState.IMMUNE, 0.5)])
+        states = np.full((200, 200), kernels.INFECTIVE, dtype=kernels.STATE_DTYPE)
+        days = np.zeros(states.shape, dtype=kernels.DAYS_DTYPE)
+
+        next_states, _ = kernel(states, days, np.random.RandomState(1))
+
+        self.assertAlmostEqual(np.mean(next_states == kernels.DEAD), 0.1, delta=0.01)
+        self.assertAlmostEqual(np.mean(next_states == kernels.IMMUNE), 0.5, delta=0.01)
+
+    def test_contacts_within_the_environment(self):
+        kernel = compile_rules([Rule(AgentState.SUSCEPTIBLE, AgentState.INFECTIVE, 1.0,
+                                     contacts=(AgentState.INFECTIVE,), radius=1)])
+        states = np.full((5, 5), kernels.SUSCEPTIBLE, dtype=kernels.STATE_DTYPE)
+        states[2, 2] = kernels.INFECTIVE
+        days = np.zeros(states.shape, dtype=kernels.DAYS_DTYPE)
+
+        next_states, _ = kernel(states, days, np.random.RandomState(2))
+
+        self.assertEqual(np.count_nonzero(next_states == kernels.INFECTIVE), 5)
+        self.assertEqual(next_states[1, 2], kernels.INFECTIVE)
+        self.assertEqual(next_states[1, 1], kernels.SUSCEPTIBLE)
+
+    def test_rule_after_days(self):
+        kernel = compile_rules([{'from': 'INCUBATION', 'to': 'INFECTIVE', 'after': 2}])
+        states = np.full((1, 1), kernels.INCUBATION, dtype=kernels.STATE_DTYPE)
+        days = np.zeros(states.shape, dtype=kernels.DAYS_DTYPE)
+        rs = np.random.RandomState(3)
+
+        history = []
+        for _ in range(4):
+            states, days = kernel(states, days, rs)
+            history.append((int(states[0, 0]), int(days[0, 0])))
+
+        self.assertEqual(history, [(kernels.INCUBATION, 1), (kernels.INCUBATION, 2),
+                                   (kernels.INFECTIVE, 0), (kernels.INFECTIVE, 0)])
+
+    def test_ensemble_with_the_rules_of_the_state(self):
+        state = SimState(size=20, susceptible_share=0.6, infected_share=0.05)
+        state.seed(4)
+        state.set_incubation_period_enabled(True)
+        state.set_incubation_period(2)
+        sut = EnsembleEngine(state, 4, rules=compile_rules(rules_of(state)))
+        sut.reset()
+        agents = sut.counts()[:, 1:].sum(axis=1)
+
+        sut.run(200)
+
+        self.assertTrue(sut.is_finished())
+        counts = sut.counts()
+        self.assertTrue((counts[:, 1:].sum(axis=1) == agents).all())
+        self.assertTrue((counts[:, AgentState.REMOVED.value] > 0).all())
@@ -0,0 +1,47 @@
+from unittest import TestCase
+from engine.tiled import TiledEngine
+from model.agent_state import AgentState
+from model.state import SimState
+
+
+class TestTiledEngine(TestCase):
+
+    def test_same_seed_same_result(self):
+        with TiledEngine(self.__create_state(seed=5), tiles=3, workers=1) as first, \
+                TiledEngine(self.__create_state(seed=5), tiles=3, workers=1) as second:
+            first.reset()
+            second.reset()
+            for _ in range(5):
+                first.step()
+                second.step()
+
+            self.assertEqual(first.data().tolist(), second.data().tolist())
+
+    def test_result_does_not_depend_on_workers(self):
+        state = self.__create_state(seed=9)
+        state.set_movement_limit_enabled(True)
+        with TiledEngine(state, tiles=3, workers=1) as serial, TiledEngine(state, tiles=3, workers=2) as parallel:
+            serial.reset()
+            parallel.reset()
+            for _ in range(5):
+                serial.step()
+                parallel.step()
+
+            self.assertEqual(serial.data().tolist(), parallel.data().tolist())
+
+    def test_run_until_finished(self):
+        state = self.__create_state(seed=3)
+        with TiledEngine(state, tiles=4, workers=1) as sut:
+            sut.reset()
+            total = sum(sut.counts().values()) - sut.counts()[AgentState.EMPTY]
+            sut.run()
+
+            counts = sut.counts()
+            self.assertTrue(sut.is_finished())
+            self.assertEqual(counts[AgentState.INFECTIVE], 0)
+            self.assertEqual(sum(counts.values()) - counts[AgentState.EMPTY], total)
+
+    def __create_state(self, seed: int) -> SimState:
+        state = SimState(size=30, susceptible_share=0.69, infected_share=0.01)
+        state.seed(seed)
+        return state
@@ -0,0 +1,240 @@
+import multiprocessing
+import os
+import typing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from engine import kernels
+from model.agent_state import AgentState
+from model.state import SimState
+
+"""
+Tile parallel engine.
+The grid is split into row tiles that are processed by a pool of worker processes. The state array lives in
+shared memory, so the workers read the halo rows around their tile directly from it instead of exchanging them.
+"""
+
+# Phases of a day, part of the seeds of the per tile random streams
+PHASE_MOVEMENT = 0
+PHASE_STATUS = 1
+
+# Shared memory blocks attached by this process, by name
+_attached = dict()
+
+
+class _Layout(typing.NamedTuple):
+    """Names of the shared memory blocks of an engine"""
+    states: tuple  # Front and back buffer of the states
+    days: str
+    size: int
+
+
+def _shared_array(name: str, size: int, dtype) -> np.ndarray:
+    block = _attached.get(name)
+    if block is None:
+        block = shared_memory.SharedMemory(name=name)
+        _attached[name] = block
+    return np.ndarray((size, size), dtype=dtype, buffer=block.buf)
+
+
+def _stream(seed: int, day: int, phase: int, tile: int) -> np.random.RandomState:
+    """Random stream of a tile on a day, independent of the process it is computed in"""
+    return np.random.RandomState(np.random.MT19937(np.random.SeedSequence([seed, day, phase, tile])))
+
+
+class _TileTask(typing.NamedTuple):
+    layout: _Layout
+    front: int
+    tile: int
+    start: int
+    end: int
+    halo: int
+    seed: int
+    day: int
+    params: tuple
+
+
+def _move_tile(task: _TileTask) -> int:
+    """Limited movement within the rows of a tile, moves leaving the tile are rejected"""
+    states = _shared_array(task.layout.states[task.front], task.layout.size, kernels.STATE_DTYPE)
+    days = _shared_array(task.layout.days, task.layout.size, kernels.DAYS_DTYPE)
+    rs = _stream(task.seed, task.day, PHASE_MOVEMENT, task.tile)
+    return kernels.limited_moves(states[task.start:task.end], days[task.start:task.end], task.params, rs)
+
+
+def _status_tile(task: _TileTask) -> None:
+    """Status update of the rows of a tile, reads the front buffer including the halo and writes the back buffer"""
+    size = task.layout.size
+    front = _shared_array(task.layout.states[task.front], size, kernels.STATE_DTYPE)
+    back = _shared_array(task.layout.states[1 - task.front], size, kernels.STATE_DTYPE)
+    days = _shared_array(task.layout.days, size, kernels.DAYS_DTYPE)
+
+    low = max(0, task.start - task.halo)
+    high = min(size, task.end + task.halo)
+    inner = slice(task.start - low, task.end - low)
+    rs = _stream(task.seed, task.day, PHASE_STATUS, task.tile)
+    next_states, next_days = kernels.advance_status(front[low:high], days[task.start:task.end], task.params, rs,
+                                                    inner)
+    back[task.start:task.end] = next_states
+    days[task.start:task.end] = next_days
+
+
+class TiledEngine:
+    """Runs a simulation on the array kernels, split into row tiles that are processed in parallel.
+    The status update is synchronous (see UpdateMode.SYNCHRONOUS): the tiles read the states of the beginning of
+    the day from the front buffer, including halo rows of infection_env_radius() rows above and below the tile,
+    and write their own rows into the back buffer. No tile writes rows of another one, so no locking is needed.
+    Every tile draws from its own stream seeded with (seed, day, phase, tile), so the result only depends on the
+    seed and the number of tiles, not on the number of workers or the scheduling.
+    Movement across tiles: the long range movement matches movers with free cells of the whole grid and is done
+    by the coordinating process between the parallel phases. The limited movement is done per tile, moves that
+    would leave the tile are rejected (the agent gets another proposal round, see kernels.limited_moves).
+    Quarantine is not supported."""
+
+    def state(self) -> SimState:
+        return self.__state
+
+    def day(self) -> int:
+        """Number of simulated days since the last reset"""
+        return self.__day
+
+    def tiles(self) -> typing.List[typing.Tuple[int, int]]:
+        """Row ranges [start, end) of the tiles"""
+        return list(self.__tiles)
+
+    def data(self) -> np.ndarray:
+        """Copy of the current states, shape (size, size)"""
+        return self.__states[self.__front].copy()
+
+    def counts(self) -> typing.Dict[AgentState, int]:
+        """Number of agents per AgentState"""
+        return kernels.state_counts(self.__states[self.__front])
+
+    def is_finished(self) -> bool:
+        """Whether the epidemic is over, i.e. nobody is infective or incubating anymore"""
+        counts = self.counts()
+        return counts[AgentState.INFECTIVE] == 0 and counts[AgentState.INCUBATION] == 0
+
+    def reset(self) -> None:
+        """Allocates the shared buffers (unless the size did not change) and places the agents"""
+        size = int(self.__state.size())
+        if self.__layout is None or self.__layout.size != size:
+            self.__release()
+            self.__allocate(size)
+
+        self.__day = 0
+        self.__front = 0
+        self.__seed = self.__state.get_seed()
+        rs = np.random.RandomState(np.random.MT19937(np.random.SeedSequence(self.__seed)))
+        self.__states[0][:] = kernels.place_agents(size, self.__state.susceptible_share(),
+                                                   self.__state.infected_share(), rs)
+        self.__days[:] = 0
+
+        bounds = np.linspace(0, size, min(self.__tile_count, size) + 1).astype(int)
+        self.__tiles = [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def step(self) -> None:
+        """Simulates the next day: movement, then the status update"""
+        if self.__layout is None:
+            raise RuntimeError('The engine has to be reset before stepping')
+        self.__day += 1
+
+        movement = kernels.MovementParams.of(self.__state)
+        if movement.limited:
+            self.__run_tiles(_move_tile, movement, 0)
+        else:
+            rs = _stream(self.__seed, self.__day, PHASE_MOVEMENT, len(self.__tiles))
+            kernels.long_range_moves(self.__states[self.__front], self.__days, movement.mixing_value_m, rs)
+
+        status = kernels.StatusParams.of(self.__state, self.__day)
+        self.__run_tiles(_status_tile, status, self.__state.infection_env_radius())
+        self.__front = 1 - self.__front
+
+    def run(self, max_days: int = None) -> int:
+        """Simulates until the epidemic is over.
+        :param max_days: Optional upper bound of days to simulate
+        :return the number of simulated days"""
+        days = 0
+        while not self.is_finished() and (max_days is None or days < max_days):
+            self.step()
+            days += 1
+        return days
+
+    def close(self) -> None:
+        """Stops the workers and frees the shared memory"""
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+        self.__release()
+
+    def __run_tiles(self, fn, params: tuple, halo: int) -> list:
+        tasks = [_TileTask(self.__layout, self.__front, tile, start, end, halo, self.__seed, self.__day, params)
+                 for tile, (start, end) in enumerate(self.__tiles)]
+        if self.__workers <= 1:
+            return [fn(task) for task in tasks]
+
+        if self.__executor is None:
+            # Spawn instead of fork, the calling process may run a Qt application (see controller.remote)
+            self.__executor = ProcessPoolExecutor(max_workers=self.__workers,
+                                                  mp_context=multiprocessing.get_context('spawn'))
+        return list(self.__executor.map(fn, tasks))
+
+    def __allocate(self, size: int) -> None:
+        state_bytes = size * size * np.dtype(kernels.STATE_DTYPE).itemsize
+        days_bytes = size * size * np.dtype(kernels.DAYS_DTYPE).itemsize
+        blocks = [shared_memory.SharedMemory(create=True, size=state_bytes),
+                  shared_memory.SharedMemory(create=True, size=state_bytes),
+                  shared_memory.SharedMemory(create=True, size=days_bytes)]
+        for block in blocks:
+            _attached[block.name] = block
+        self.__blocks = blocks
+
+        self.__layout = _Layout((blocks[0].name, blocks[1].name), blocks[2].name, size)
+        self.__states = [_shared_array(blocks[0].name, size, kernels.STATE_DTYPE),
+                         _shared_array(blocks[1].name, size, kernels.STATE_DTYPE)]
+        self.__days = _shared_array(blocks[2].name, size, kernels.DAYS_DTYPE)
+
+    def __release(self) -> None:
+        if self.__layout is None:
+            return
+        if self.__executor is not None:
+            # Workers keep the old blocks attached
+            self.__executor.shutdown()
+            self.__executor = None
+
+        self.__states = None
+        self.__days = None
+        self.__layout = None
+        for block in self.__blocks:
+            _attached.pop(block.name, None)
+            block.close()
+            block.unlink()
+        self.__blocks = []
+
+    def __enter__(self) -> 'TiledEngine':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def __init__(self, state: SimState, tiles: int = None, workers: int = None):
+        """
+        :param state: Settings of the simulation, read on every reset and step
+        :param tiles: Number of row tiles, defaults to the number of CPU cores
+        :param workers: Number of worker processes, defaults to the number of tiles. With one worker the tiles
+                        are processed in the calling process.
+        """
+        self.__state = state
+        self.__tile_count = tiles if tiles is not None else (os.cpu_count() or 1)
+        self.__workers = workers if workers is not None else self.__tile_count
+        self.__executor = None
+        self.__blocks = []
+        self.__layout = None
+        self.__states = None
+        self.__days = None
+        self.__tiles = []
+        self.__front = 0
+        self.__day = 0
+        self.__seed = 0
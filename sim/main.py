@@ -7,21 +7,22 @@ from ui.ui import SimUi
 AUTHOR: Benjamin Eder
 """
 
-# Initialize state
-state = SimState(
-    size=cfg.DEFAULT_SIZE,
-    susceptible_share=cfg.DEFAULT_SUSCEPTIBLE_SHARE,
-    infected_share=cfg.DEFAULT_INFECTED_SHARE,
-    infection_prob=cfg.DEFAULT_INFECTION_PROB,
-    remove_prob=cfg.DEFAULT_REMOVE_PROB
-)
-
-ui = SimUi(state)
-ui.win.show()
-
 # Start Qt event loop unless running in interactive mode
+# Everything runs under the main guard, the remote simulation spawns a child process that imports this module
 if __name__ == '__main__':
     import sys
 
+    # Initialize state
+    state = SimState(
+        size=cfg.DEFAULT_SIZE,
+        susceptible_share=cfg.DEFAULT_SUSCEPTIBLE_SHARE,
+        infected_share=cfg.DEFAULT_INFECTED_SHARE,
+        infection_prob=cfg.DEFAULT_INFECTION_PROB,
+        remove_prob=cfg.DEFAULT_REMOVE_PROB
+    )
+
+    ui = SimUi(state, remote=cfg.REMOTE_SIMULATION_ENABLED and not cfg.BATCH_RUN_ENABLED)
+    ui.win.show()
+
     if (sys.flags.interactive != 1) or not hasattr(QtCore, 'PYQT_VERSION'):
         QtWidgets.QApplication.instance().exec_()
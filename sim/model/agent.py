@@ -6,17 +6,29 @@ import logging
 
 
 class Agent:
-    num = 0
     """Class representing an agent
+    The agent is a slotted record without a per-instance __dict__ and shares one logger with all other agents,
+    since a simulation creates millions of them across resets.
     Author: Konstantin Schlosser, Benedikt Beil, Andreas Stiglmeier"""
 
+    __slots__ = ('__infectionState', '__scheduler', '__grid', '__sickDays', '__incubationDays', '__infected_count',
+                 '__index', '__quarantined', '__counted_since')
+
+    __logger = logging.getLogger("agent")
+
     def state(self) -> AgentState:
         return self.__infectionState
 
     def set_state(self, state: AgentState) -> None:
-        self.__logger.debug(f"Changing state from {self.state()} to {state}")
+        if self.__grid.defer_state_change(self, state):
+            return  # Applied at the end of the synchronous status update
+
+        if Agent.__logger.isEnabledFor(logging.DEBUG):
+            Agent.__logger.debug(f"Changing state from {self.state()} to {state}")
+        old_state = self.__infectionState
         self.__infectionState = state
-        self.__scheduler.update_gui_state(self.__grid_pos, state)
+        self.__grid.on_agent_state_change(self, old_state, state)
+        self.__scheduler.update_gui_index(self.__index, self.__grid.get_size(), state)
 
     def infected_count(self) -> int:
         return self.__infected_count
@@ -25,19 +37,46 @@ class Agent:
         self.__infected_count += 1
 
     def sick_days(self) -> int:
+        if self.__counted_since is not None and self.__infectionState is AgentState.INFECTIVE:
+            return self.__sickDays + self.__grid.calendar().day() - self.__counted_since
         return self.__sickDays
 
     def update_sick_days(self) -> None:
         self.__sickDays += 1
 
     def incubation_days(self) -> int:
+        if self.__counted_since is not None and self.__infectionState is AgentState.INCUBATION:
+            return self.__incubationDays + self.__grid.calendar().day() - self.__counted_since
         return self.__incubationDays
 
     def update_incubation_days(self) -> None:
         self.__incubationDays += 1
 
+    def start_day_count(self, day: int) -> None:
+        """Derives the sick or incubation days of the current state from the calendar day instead of the daily
+        update calls, used while the transitions are scheduled (see model.calendar.TransitionCalendar)
+        :param day: Calendar day from which on the days are counted"""
+        self.__counted_since = day
+
+    def stop_day_count(self, day: int, counted_state: AgentState) -> None:
+        """Adds the days counted since start_day_count to the counter of the passed state and stops counting
+        :param day: Current calendar day
+        :param counted_state: State the days were counted for"""
+        if self.__counted_since is None:
+            return
+        days = day - self.__counted_since
+        self.__counted_since = None
+        if counted_state is AgentState.INFECTIVE:
+            self.__sickDays += days
+        elif counted_state is AgentState.INCUBATION:
+            self.__incubationDays += days
+
     def get_pos(self) -> GridPos:
-        return self.__grid_pos
+        return self.__grid.pos_of(self.__index)
+
+    def get_index(self) -> int:
+        """Flat index (row * size + col) of the agent on its grid"""
+        return self.__index
 
     def get_scheduler(self) -> Scheduler:
         return self.__scheduler
@@ -49,10 +88,17 @@ class Agent:
         self.__quarantined = quarantined
 
     def set_pos(self, grid_pos: GridPos) -> None:
-        self.__logger.debug(
-            f"Moving agent from {self.__grid_pos.row()},{self.__grid_pos.col()} to {grid_pos.row()},{grid_pos.col()}")
-        self.__grid_pos = grid_pos
-        self.__scheduler.update_gui_state(self.__grid_pos, self.__infectionState)
+        self.set_index(self.__grid.index_of(grid_pos))
+
+    def set_index(self, index: int) -> None:
+        if Agent.__logger.isEnabledFor(logging.DEBUG):
+            Agent.__logger.debug(f"Moving agent from index {self.__index} to {index}")
+        self.__index = index
+        self.__scheduler.update_gui_index(index, self.__grid.get_size(), self.__infectionState)
+
+    def relocate(self, index: int) -> None:
+        """Sets the flat index without reporting the move, for batched moves reported by the grid"""
+        self.__index = index
 
     def grid(self):
         """
@@ -61,9 +107,10 @@ class Agent:
         """
         return self.__grid
 
-    def __init__(self, scheduler: Scheduler, grid_pos: GridPos, agent_state: AgentState, grid):
-        self.__logger = logging.getLogger(f"Agent{Agent.num}")
-        Agent.num += 1
+    def __init__(self, scheduler: Scheduler, index: int, agent_state: AgentState, grid, report: bool = True):
+        """
+        :param report: Whether the new agent is reported to the GUI, off if the grid reports many agents in bulk
+        """
         self.__scheduler = scheduler
         self.__infectionState = agent_state
         self.__grid = grid
@@ -72,7 +119,8 @@ class Agent:
         self.__incubationDays = 0
         self.__infected_count = 0
 
-        self.__grid_pos = grid_pos
-        self.__scheduler.update_gui_state(self.__grid_pos, agent_state)
-        self.__logger.debug("Agent created, sent update")
+        self.__index = index
         self.__quarantined = False
+        self.__counted_since = None
+        if report:
+            self.__scheduler.update_gui_index(index, grid.get_size(), agent_state)
@@ -0,0 +1,224 @@
+import typing
+from controller.events import Events
+from controller.scheduler import Scheduler
+from model.agent_state import AgentState
+from model.state import SimState
+
+
+class DayCalendar:
+    """Calendar queue with one bucket per day.
+    Entries are appended to the bucket of their due day and handed out when that day is taken, so processing
+    a day costs as much as the entries due on it, no matter how many entries wait for later days."""
+
+    def __init__(self):
+        self.__buckets: typing.Dict[int, list] = dict()
+        self.__count = 0
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def schedule(self, day: int, entry) -> None:
+        """Adds an entry to the bucket of the passed day"""
+        bucket = self.__buckets.get(day)
+        if bucket is None:
+            bucket = self.__buckets[day] = []
+        bucket.append(entry)
+        self.__count += 1
+
+    def schedule_all(self, days: typing.Iterable[int], entries: typing.Iterable) -> None:
+        """Adds the entries to the buckets of their days, pairwise"""
+        for day, entry in zip(days, entries):
+            self.schedule(int(day), entry)
+
+    def take(self, day: int) -> list:
+        """Removes the bucket of the passed day
+        :return the entries of the day in the order they were scheduled, empty if there are none"""
+        bucket = self.__buckets.pop(day, [])
+        self.__count -= len(bucket)
+        return bucket
+
+    def clear(self) -> None:
+        self.__buckets.clear()
+        self.__count = 0
+
+
+class TransitionCalendar:
+    """Schedules the incubation and recovery transitions of the agents of a grid (see
+    SimState.transition_calendar_enabled).
+    The per day strategies draw for every infective agent every day whether it is removed, and count up the days
+    of every incubating agent. Both durations are known in distribution once an agent enters the state: the
+    number of days until the removal is geometric with the removal probability, the incubation ends
+    incubation_period + 1 days after it began. So the transition day is drawn once and the agent is put into the
+    bucket of that day. After the status update of a day only the agents due on it are touched.
+    An agent entering a state on day d is first processed on day d + 1, like in the synchronous status update.
+    Whether a removed agent dies or becomes immune is decided on the day of its removal. As the geometric
+    distribution is memoryless, all removals are drawn again from the current day on when the removal probability
+    changes.
+    Besides the agent transitions, bulk events (e.g. a vaccination campaign) can be put on the calendar. They are
+    called at the beginning of their day, before the agents move, whether the agent transitions are scheduled or
+    not."""
+
+    def day(self) -> int:
+        """Number of days since the placement of the agents"""
+        return self.__day
+
+    def is_active(self) -> bool:
+        return self.__active
+
+    def scheduled_count(self) -> int:
+        return len(self.__calendar)
+
+    def schedule_event(self, day: int, event: typing.Callable[[SimState], None]) -> None:
+        """Calls the event with the state at the beginning of the passed day. Days that already began are ignored.
+        :param day: Day to call the event on
+        :param event: Callable taking the state"""
+        if day > self.__day:
+            self.__events.schedule(day, event)
+
+    def on_state_change(self, agent, old_state: AgentState, new_state: AgentState) -> None:
+        """Called by the grid on every state change (and creation) of an agent, including quarantined ones.
+        The agents are collected and scheduled together after the status update. Their sick and incubation days
+        are derived from the day they entered the state (see Agent.start_day_count)."""
+        if old_state is new_state:
+            return
+        agent.stop_day_count(self.__day, old_state)
+        if self.__active and (new_state is AgentState.INFECTIVE or new_state is AgentState.INCUBATION):
+            agent.start_day_count(self.__day)
+            self.__entered.append(agent)
+
+    def on_agents_created(self, agents: list, agent_state: AgentState) -> None:
+        """Called by the grid for agents spawned in bulk, like on_state_change from EMPTY for each of them"""
+        if self.__active and (agent_state is AgentState.INFECTIVE or agent_state is AgentState.INCUBATION):
+            day = self.__day
+            for agent in agents:
+                agent.start_day_count(day)
+            self.__entered.extend(agents)
+
+    def reset(self) -> None:
+        """Forgets all scheduled transitions and events and starts again with day 0"""
+        self.__calendar.clear()
+        self.__events.clear()
+        self.__entered = []
+        self.__active = False
+        self.__day = 0
+
+    def init_listeners(self) -> None:
+        self.__scheduler.register_handler(Events.PRE_NEXT_STEP, self.__pre_next_step)
+        self.__scheduler.register_handler(Events.POST_STATUS_UPDATE, self.__post_status_update)
+
+    def remove_listeners(self) -> None:
+        self.__scheduler.get_observable().off(Events.PRE_NEXT_STEP, self.__pre_next_step)
+        self.__scheduler.get_observable().off(Events.POST_STATUS_UPDATE, self.__post_status_update)
+
+    def __pre_next_step(self, state: SimState) -> None:
+        enabled = state.transition_calendar_enabled()
+        if enabled and not self.__active:
+            self.__activate(state)
+        elif not enabled and self.__active:
+            self.__deactivate()
+        elif self.__active and state.remove_prob() != self.__remove_prob:
+            self.__reschedule_removals(state)
+
+        self.__day += 1
+        for event in self.__events.take(self.__day):
+            event(state)
+
+    def __post_status_update(self, state: SimState) -> None:
+        if not self.__active:
+            return
+
+        due = self.__calendar.take(self.__day)
+        if due:
+            self.__transition(due, state)
+        self.__schedule_entered(state)
+
+    def __transition(self, due: list, state: SimState) -> None:
+        rs = self.__grid.random_state()
+        lethality = state.lethality_toggle()
+        removals = [agent for agent, from_state, generation in due
+                    if from_state is AgentState.INFECTIVE and generation == self.__generation
+                    and agent.state() is AgentState.INFECTIVE]
+        dies = rs.random_sample(len(removals)) < state.lethality() if lethality and removals else None
+
+        for agent, from_state, _ in due:
+            if from_state is AgentState.INCUBATION and agent.state() is AgentState.INCUBATION:
+                agent.set_state(AgentState.INFECTIVE)
+
+        for i, agent in enumerate(removals):
+            if dies is None:
+                agent.set_state(AgentState.REMOVED)
+            else:
+                agent.set_state(AgentState.DEAD if dies[i] else AgentState.IMMUNE)
+
+    def __schedule_entered(self, state: SimState) -> None:
+        entered = self.__entered
+        if not entered:
+            return
+        self.__entered = []
+
+        infective = [agent for agent in entered if agent.state() is AgentState.INFECTIVE]
+        incubating = [agent for agent in entered if agent.state() is AgentState.INCUBATION]
+        self.__schedule_removals(infective, state)
+        due = self.__day + state.incubation_period() + 1
+        for agent in incubating:
+            self.__calendar.schedule(due, (agent, AgentState.INCUBATION, self.__generation))
+
+    def __schedule_removals(self, agents: list, state: SimState) -> None:
+        p = state.remove_prob()
+        if not agents or p <= 0:
+            return  # Nobody recovers, the agents are scheduled once the probability is raised
+        days = self.__day + self.__grid.random_state().geometric(min(p, 1.0), len(agents))
+        self.__calendar.schedule_all(days, [(agent, AgentState.INFECTIVE, self.__generation) for agent in agents])
+
+    def __reschedule_removals(self, state: SimState) -> None:
+        # Entries of an older generation are dropped when they are due
+        self.__generation += 1
+        self.__remove_prob = state.remove_prob()
+        self.__schedule_removals(self.__agents_in(AgentState.INFECTIVE), state)
+
+    def __activate(self, state: SimState) -> None:
+        self.__active = True
+        self.__calendar.clear()
+        self.__entered = []
+        self.__generation += 1
+        self.__remove_prob = state.remove_prob()
+
+        infective = self.__agents_in(AgentState.INFECTIVE)
+        self.__schedule_removals(infective, state)
+        period = state.incubation_period()
+        incubating = self.__agents_in(AgentState.INCUBATION)
+        for agent in incubating:
+            due = self.__day + max(period - agent.incubation_days(), 0) + 1
+            self.__calendar.schedule(due, (agent, AgentState.INCUBATION, self.__generation))
+        for agent in infective + incubating:
+            agent.start_day_count(self.__day)
+
+    def __deactivate(self) -> None:
+        self.__active = False
+        self.__calendar.clear()
+        self.__entered.clear()
+        # The daily strategies take over the counting of the days
+        for agent_state in (AgentState.INFECTIVE, AgentState.INCUBATION):
+            for agent in self.__agents_in(agent_state):
+                agent.stop_day_count(self.__day, agent_state)
+
+    def __agents_in(self, agent_state: AgentState) -> list:
+        """Agents in the passed state, on the grid and in quarantine"""
+        agents = list(self.__grid.agents_in_state(agent_state))
+        agents.extend(agent for agent in self.__grid.get_quarantinedAgents() if agent.state() is agent_state)
+        return agents
+
+    def __init__(self, scheduler: Scheduler, grid):
+        """
+        :param scheduler: Scheduler of the simulation, the calendar listens to its day events
+        :param grid: Grid of the agents, provides the random stream
+        """
+        self.__scheduler = scheduler
+        self.__grid = grid
+        self.__calendar = DayCalendar()
+        self.__events = DayCalendar()
+        self.__entered = []
+        self.__active = False
+        self.__day = 0
+        self.__generation = 0
+        self.__remove_prob = 0.0
@@ -1,5 +1,8 @@
+import gc
+import heapq
 import logging
 import time
+import typing
 
 import numpy as np
 from numpy import uint
@@ -8,16 +11,36 @@ from controller.events import Events
 from controller.scheduler import Scheduler
 from model.agent import Agent
 from model.agent_state import AgentState
+from model.calendar import TransitionCalendar
 from model.grid_pos import GridPos
+from model.live_agents import LiveAgents
 from model.state import SimState
+from model.update_mode import UpdateMode
+from model.vaccination import VaccinationCampaign
 
 
 class Grid:
     """Class representing the grid on which the agents move
+    Cells are stored in one flat list, a position is addressed by its flat index (row * size + col).
+    The *_at methods take flat indices and are meant for the hot paths, the GridPos based methods
+    are kept for the API boundaries.
+    The free cells are kept in an index (a dense list of the free cells and the slot of every cell in it), so
+    checking for a free cell and drawing a random one are O(1).
     Author: Konstantin Schlosser, Andreas Stiglmeier"""
 
+    def index_of(self, grid_pos: GridPos) -> int:
+        """Converts a position to its flat index"""
+        return int(grid_pos.row()) * self.__size + int(grid_pos.col())
+
+    def pos_of(self, index: int) -> GridPos:
+        """Converts a flat index to its position"""
+        return GridPos(index // self.__size, index % self.__size)
+
     def get_agent(self, grid_pos: GridPos) -> Agent:
-        return self.__grid[grid_pos.row()][grid_pos.col()]
+        return self.__cells[self.index_of(grid_pos)]
+
+    def get_agent_at(self, index: int) -> Agent:
+        return self.__cells[index]
 
     def is_occupied(self, grid_pos: GridPos) -> bool:
         """
@@ -25,108 +48,307 @@ class Grid:
         :param grid_pos:
         :return: Whether the field is occupied.
         """
-        if self.get_agent(grid_pos) is None:
-            return False
+        return self.is_occupied_at(self.index_of(grid_pos))
 
-        if self.get_agent(grid_pos).state() == AgentState.EMPTY:
-            return False
-        return True
+    def is_occupied_at(self, index: int) -> bool:
+        """
+        :param index: Flat index of the field
+        :return: Whether the field is occupied.
+        """
+        agent = self.__cells[index]
+        return agent is not None and agent.state() is not AgentState.EMPTY
 
     def is_fully_occupied(self) -> bool:
         """
         Author: Beil Benedikt
         :return: Whether the whole grid is occupied
         """
-        for i in range(self.get_size()):
-            for j in range(self.get_size()):
-                if not self.is_occupied(GridPos(uint(i), uint(j))):
-                    return False
-        return True
+        return len(self.__free_cells) == 0
+
+    def free_cell_count(self) -> int:
+        return len(self.__free_cells)
+
+    def random_free_cell(self) -> int:
+        """Draws a free cell uniformly at random
+        :return: Flat index of the cell"""
+        free_cells = self.__free_cells
+        if not free_cells:
+            raise Exception("All fields are occupied.")
+        return free_cells[self.rs.randint(len(free_cells))]
+
+    def free_cells(self) -> np.ndarray:
+        """:return Flat indices of all free cells, in no particular order"""
+        return np.array(self.__free_cells, dtype=np.intp)
+
+    def __occupy(self, index: int) -> None:
+        """Removes a cell from the free cell index by moving the last free cell into its slot"""
+        free_cells = self.__free_cells
+        free_slots = self.__free_slots
+        slot = free_slots[index]
+        if slot < 0:
+            return
+        last = free_cells.pop()
+        if last != index:
+            free_cells[slot] = last
+            free_slots[last] = slot
+        free_slots[index] = -1
+
+    def __vacate(self, index: int) -> None:
+        """Adds a cell to the free cell index"""
+        if self.__free_slots[index] >= 0:
+            return
+        self.__free_slots[index] = len(self.__free_cells)
+        self.__free_cells.append(index)
 
     def set_agent(self, agent: Agent, grid_pos: GridPos) -> None:
-        self.__grid[grid_pos.row()][grid_pos.col()] = agent
+        self.set_agent_at(agent, self.index_of(grid_pos))
+
+    def set_agent_at(self, agent: Agent, index: int) -> None:
+        previous = self.__cells[index]
+        if previous is not None and previous is not agent:
+            self.__agents_by_state[previous.state()].pop(previous, None)
+            self.__live_agents.remove(previous)
+        self.__cells[index] = agent
+        if agent is not None:
+            self.__agents_by_state[agent.state()][agent] = None
+            self.__live_agents.add(agent)
+            self.__occupy(index)
+        else:
+            self.__vacate(index)
+
+    def live_agents(self) -> LiveAgents:
+        """All agents on the grid (quarantined agents excluded)"""
+        return self.__live_agents
+
+    def agents_in_state(self, agent_state: AgentState):
+        """Agents on the grid (quarantined agents excluded) currently in the passed state.
+        :return: Insertion ordered view, do not modify the grid while iterating it"""
+        return self.__agents_by_state[agent_state].keys()
+
+    def defer_state_change(self, agent: Agent, new_state: AgentState) -> bool:
+        """Buffers a state change while a synchronous status update is running.
+        The first change requested for an agent wins, later ones are dropped.
+        :return: Whether the change was buffered, i.e. must not be applied by the agent now"""
+        next_states = self.__next_states
+        if next_states is None:
+            return False
+        if agent not in next_states:
+            next_states[agent] = new_state
+        return True
+
+    def has_pending_state(self, agent: Agent) -> bool:
+        """Whether a state change of the agent is buffered by the running synchronous status update"""
+        return self.__next_states is not None and agent in self.__next_states
+
+    def on_agent_state_change(self, agent: Agent, old_state: AgentState, new_state: AgentState) -> None:
+        """Keeps the per state agent index up to date. Called by the agent on every state change.
+        :param agent: Agent that changed its state
+        :param old_state: State before the change
+        :param new_state: State after the change"""
+        self.__calendar.on_state_change(agent, old_state, new_state)
+
+        by_state = self.__agents_by_state
+        if agent not in by_state[old_state]:
+            return  # Not on the grid (e.g. quarantined)
+
+        del by_state[old_state][agent]
+        by_state[new_state][agent] = None
+
+        if self.__pass_queue is not None and new_state in self.__pass_states and agent not in self.__pass_scheduled:
+            # The agent became active during the status pass. In the random order of the whole population its
+            # turn is still ahead with the probability of its random key being greater than the current one.
+            self.__pass_scheduled[agent] = None
+            key = self.rs.random_sample()
+            if key > self.__pass_key:
+                heapq.heappush(self.__pass_queue, (key, len(self.__pass_scheduled), agent))
 
     def move_agent(self, old_pos: GridPos, new_pos: GridPos) -> None:
+        self.move_agent_at(self.index_of(old_pos), self.index_of(new_pos))
+
+    def move_agent_at(self, old_index: int, new_index: int) -> None:
         if self.is_fully_occupied():
             self.__logger.error("All fields are occupied.")
             raise Exception("All fields are occupied. No agent can move.")
 
-        if self.is_occupied(new_pos):
+        if self.is_occupied_at(new_index):
             self.__logger.error("The field is already occupied.")
             raise Exception("The field is already occupied.")
 
-        copy = self.get_agent(new_pos)
-        agent = self.get_agent(old_pos)
-        self.set_agent(agent, new_pos)
-        self.set_agent(copy, old_pos)
+        cells = self.__cells
+        copy = cells[new_index]
+        agent = cells[old_index]
+        cells[new_index] = agent
+        cells[old_index] = copy
+        self.__occupy(new_index)
+        self.__vacate(old_index)
         if copy is not None:
-            copy.set_pos(old_pos)
+            copy.set_index(old_index)
         else:
-            self.__scheduler.update_gui_state(old_pos, AgentState.EMPTY)
-        agent.set_pos(new_pos)
+            self.__scheduler.update_gui_index(old_index, self.__size, AgentState.EMPTY)
+        agent.set_index(new_index)
+
+    def move_agents_at(self, old_indices: np.ndarray, new_indices: np.ndarray) -> None:
+        """Moves many agents at once. All agents at the old indices are taken off the grid before they are put on
+        the new indices, pairwise, so a target may be a cell vacated by another moving agent (or its own one).
+        The changed cells are reported in bulk, one event per state.
+        :param old_indices: Flat indices of the moving agents
+        :param new_indices: Distinct flat indices, free or in old_indices"""
+        cells = self.__cells
+        old_indices = [int(index) for index in old_indices]
+        new_indices = [int(index) for index in new_indices]
+        moving_from = set(old_indices)
+        if len(set(new_indices)) != len(new_indices) \
+                or any(cells[index] is not None and index not in moving_from for index in new_indices):
+            raise Exception("The target fields are not distinct or already occupied.")
+
+        agents = [cells[index] for index in old_indices]
+        for index in old_indices:
+            cells[index] = None
+            self.__vacate(index)
+
+        by_state = dict()
+        for agent, index in zip(agents, new_indices):
+            cells[index] = agent
+            self.__occupy(index)
+            agent.relocate(index)
+            by_state.setdefault(agent.state(), []).append(index)
+
+        vacated = moving_from.difference(new_indices)
+        self.__scheduler.update_gui_indices(sorted(vacated), self.__size, AgentState.EMPTY)
+        for agent_state, indices in by_state.items():
+            self.__scheduler.update_gui_indices(indices, self.__size, agent_state)
 
     def get_size(self) -> int:
-        return len(self.__grid[0])
+        return self.__size
+
+    def calendar(self) -> TransitionCalendar:
+        """Calendar of the scheduled incubation and recovery transitions"""
+        return self.__calendar
+
+    def vaccination(self) -> VaccinationCampaign:
+        return self.__vaccination
 
-    def get_quarantinedAgents(self):
+    def get_quarantinedAgents(self) -> dict:
+        """Quarantined agents, as insertion ordered dict keys. Use quarantine_agent and release_agent to change it"""
         return self._quarantined_agents
 
+    def quarantine_agent(self, agent: Agent) -> None:
+        """Takes an agent off the grid into the quarantine"""
+        self.quarantine_agents([agent])
+
+    def quarantine_agents(self, agents: typing.Sequence[Agent]) -> None:
+        """Takes agents off the grid into the quarantine, the cleared cells are reported in one batch"""
+        indices = []
+        for agent in agents:
+            index = agent.get_index()
+            agent.set_quarantined(True)
+            self._quarantined_agents[agent] = None
+            self.set_agent_at(None, index)
+            indices.append(index)
+        self.__scheduler.update_gui_indices(indices, self.__size, AgentState.EMPTY)
+
+    def release_agent(self, agent: Agent) -> bool:
+        """Puts a quarantined agent back on a free cell drawn uniformly at random
+        :return: Whether the agent was released, i.e. the grid was not fully occupied"""
+        if self.is_fully_occupied():
+            return False
+        index = self.random_free_cell()
+        del self._quarantined_agents[agent]
+        agent.set_quarantined(False)
+        self.set_agent_at(agent, index)
+        agent.set_index(index)
+        return True
+
     def init_listeners(self) -> None:
         self.__scheduler.register_handler(Events.AGENT_MOVEMENT, self.on_move_update)
         self.__scheduler.register_handler(Events.STATUS_UPDATE, self.on_status_update)
+        # The campaign schedules its start before the calendar begins the day
+        self.__vaccination.init_listeners()
+        self.__calendar.init_listeners()
 
     def remove_listeners(self) -> None:
-        if self.__scheduler.get_observable().is_registered(Events.AGENT_MOVEMENT.value, self.on_move_update):
-            self.__scheduler.get_observable().off(Events.AGENT_MOVEMENT.value, self.on_move_update)
-        if self.__scheduler.get_observable().is_registered(Events.STATUS_UPDATE.value, self.on_status_update):
-            self.__scheduler.get_observable().off(Events.STATUS_UPDATE.value, self.on_status_update)
+        self.__scheduler.get_observable().off(Events.AGENT_MOVEMENT, self.on_move_update)
+        self.__scheduler.get_observable().off(Events.STATUS_UPDATE, self.on_status_update)
+        self.__vaccination.remove_listeners()
+        self.__calendar.remove_listeners()
 
     def exec_for_agents_in_rand_order(self, exec) -> None:
         """Executes the updates in a random order for all agents.
+        Only the agents on the grid are shuffled, empty cells are never visited.
         Author: Benjamin Eder"""
-        if self.__grid is None:
+        if self.__cells is None:
             return
 
-        agents = [None] * (self.get_size() ** 2)
-
-        a = 0
-        for i in range(self.get_size()):
-            for j in range(self.get_size()):
-                agents[a] = self.__grid[i][j]
-                a += 1
-
-        for i in self.rs.choice(len(agents), len(agents), replace=False):
-            agent = agents[i]
-            if agent is not None:
+        for chunk in self.__live_agents.chunks_in_random_order(self.rs):
+            for agent in chunk:
                 exec(agent)
 
     def on_move_update(self, state: SimState) -> None:
-        from controller.provider import active_provider
+        movement_strategy = self.__simulation.get_movement_strategy()
 
         t1 = time.time_ns()
-        self.exec_for_agents_in_rand_order(
-            lambda agent: active_provider.get_movement_strategy().move_agent(agent, state))
+        movement_strategy.move_agents(self, state)
         t2 = time.time_ns()
         self.__logger.info(f'Movement update took {(t2 - t1) / 1000 / 1000}ms')
 
     def on_status_update(self, state: SimState) -> None:
-        from controller.provider import active_provider
-        strategies = active_provider.get_status_strategies()
-        filtered = dict()
-        for key in strategies:
-            strat = strategies[key]
-            filtered[key] = list(filter(lambda item: item[1](state), strat))
+        """Runs the status strategies of all agents in random order.
+        Only agents in states with at least one strategy that can change something today are visited. Every
+        visited agent gets a uniform random key and the agents are processed in key order, which is a random
+        permutation. Agents that become active during the pass (e.g. freshly infected ones) draw their key
+        at that moment and are only processed if it is ahead of the current one. This way the result is
+        distributed exactly like visiting the whole population in random order, at the cost of the active
+        agents only.
+        In synchronous mode (see UpdateMode) all strategies read the states of the beginning of the day, the
+        changes are written into a buffer that is applied after all agents were processed."""
+        pipeline = self.__simulation.get_status_pipeline().compile(state)
+
+        # Bulk steps of the active strategies, once per strategy instance
+        for strategy in pipeline.bulk_strategies():
+            strategy.execute_bulk(self, state)
+
+        dispatch = pipeline.dispatch()
 
         def execute_all(agent: Agent):
-            try:
-                func_list = filtered[agent.state()]
-                for func in func_list:
-                    func[0].execute(agent, state)
-            except KeyError:
-                pass
-        self.exec_for_agents_in_rand_order(execute_all)
-        for agent in self._quarantined_agents:
-            execute_all(agent)
+            for execute in dispatch[agent.state()]:
+                execute(agent, state)
+
+        active_states = pipeline.active_states()
+
+        scheduled = dict()
+        for agent_state in active_states:
+            scheduled.update(self.__agents_by_state[agent_state])
+
+        keys = self.rs.random_sample(len(scheduled))
+        queue = list(zip(keys.tolist(), range(len(scheduled)), scheduled))
+        heapq.heapify(queue)
+
+        self.__pass_queue = queue
+        self.__pass_states = frozenset(active_states)
+        self.__pass_scheduled = scheduled
+        if state.update_mode() is UpdateMode.SYNCHRONOUS:
+            self.__next_states = dict()
+        try:
+            while queue:
+                self.__pass_key, _, agent = heapq.heappop(queue)
+                execute_all(agent)
+
+            for agent in list(self._quarantined_agents):
+                execute_all(agent)
+        finally:
+            self.__pass_queue = None
+            self.__pass_scheduled = None
+            next_states = self.__next_states
+            self.__next_states = None
+
+        if next_states is not None:
+            # Swap in the buffered states
+            for agent, new_state in next_states.items():
+                agent.set_state(new_state)
+
+    def random_state(self) -> np.random.RandomState:
+        """Random stream of the simulation owning this grid, seeded on every placement of the agents"""
+        return self.rs
 
     def init_empty_grid(self, width: uint, length: uint) -> None:
         """
@@ -135,8 +357,30 @@ class Grid:
         :param length:
         :return:
         """
-        self.__grid = None
-        self.__grid = [[None for j in range(width)] for i in range(length)]
+        self.__size = int(width)
+        self.__cells = [None] * (int(width) * int(length))
+        self.__free_cells = list(range(len(self.__cells)))
+        self.__free_slots = list(range(len(self.__cells)))
+        self.__agents_by_state = {agent_state: dict() for agent_state in AgentState}
+        self.__live_agents = LiveAgents()
+
+    def clear(self) -> None:
+        """Removes all agents, the quarantined ones included, and resets the calendar and the vaccination campaign.
+        The buffers are reused, so a grid of the same size can be filled again without allocating new ones."""
+        if self.__cells is not None:
+            count = len(self.__cells)
+            self.__cells[:] = [None] * count
+            self.__free_cells[:] = range(count)
+            self.__free_slots[:] = range(count)
+        for agents in self.__agents_by_state.values():
+            agents.clear()
+        self.__live_agents.clear()
+        self._quarantined_agents.clear()
+        self.__calendar.reset()
+        self.__vaccination.reset()
+        self.__next_states = None
+        self.__pass_queue = None
+        self.__pass_scheduled = None
 
     def spawn_agent(self, grid_pos: GridPos, agent_state: AgentState) -> None:
         """
@@ -146,21 +390,76 @@ class Grid:
         :param agent_state:
         :return: Nothing
         """
-        if self.is_occupied(grid_pos):
+        self.spawn_agent_at(self.index_of(grid_pos), agent_state)
+
+    def spawn_agent_at(self, index: int, agent_state: AgentState) -> None:
+        """
+        Create an agent with the status at the flat index, if it is not already occupied.
+        :param index:
+        :param agent_state:
+        :return: Nothing
+        """
+        if self.is_occupied_at(index):
             raise ValueError("This field is already occupied. No agent can be created here. ")
-        self.set_agent(Agent(self.__scheduler, grid_pos, agent_state, self), grid_pos)
+        agent = Agent(self.__scheduler, index, agent_state, self)
+        self.__cells[index] = agent
+        self.__occupy(index)
+        self.__agents_by_state[agent_state][agent] = None
+        self.__live_agents.add(agent)
+        self.__calendar.on_state_change(agent, AgentState.EMPTY, agent_state)
+
+    def spawn_agents_at(self, indices: typing.Sequence[int], agent_state: AgentState) -> None:
+        """
+        Creates agents with the status at many free flat indices at once. The cells are reported with one bulk
+        event instead of one event per agent.
+        :param indices: Distinct flat indices of free cells
+        :param agent_state:
+        :return: Nothing
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        free_slots = np.array(self.__free_slots, dtype=np.intp)
+        if len(np.unique(indices)) != len(indices) or np.any(free_slots[indices] < 0):
+            raise ValueError("The fields are not distinct or already occupied. No agents can be created here. ")
+
+        # Rebuild the free cell index without the taken cells
+        free_cells = np.array(self.__free_cells, dtype=np.intp)
+        taken = np.zeros(len(free_slots), dtype=bool)
+        taken[indices] = True
+        free_cells = free_cells[~taken[free_cells]]
+        free_slots[:] = -1
+        free_slots[free_cells] = np.arange(len(free_cells))
+        self.__free_cells = free_cells.tolist()
+        self.__free_slots = free_slots.tolist()
+
+        indices = indices.tolist()
+        cells = self.__cells
+        scheduler = self.__scheduler
+        # Creating many objects triggers the cyclic garbage collector over and over, although none of them is garbage
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            agents = [Agent(scheduler, index, agent_state, self, report=False) for index in indices]
+        finally:
+            if gc_enabled:
+                gc.enable()
+        for index, agent in zip(indices, agents):
+            cells[index] = agent
+        self.__agents_by_state[agent_state].update(dict.fromkeys(agents))
+        self.__live_agents.add_all(agents)
+        self.__calendar.on_agents_created(agents, agent_state)
+        scheduler.update_gui_indices(indices, self.__size, agent_state)
 
     def place_agents_on_the_field(self, width: uint, length: uint, seed: int, susceptible_share: float,
-                                  infected_share: float):
+                                  infected_share: float) -> int:
         """Inital placements of agents on the field.
-        Author: Benjamin Eder, Konstantin Schlosser"""
-        if self.__grid is None:
+        The chosen cell i is the flat index of row i // width and column i % width.
+        Author: Benjamin Eder, Konstantin Schlosser
+        :return: Number of placed agents"""
+        if self.__cells is None:
             self.init_empty_grid(width, length)
-        np.random.seed(seed)
-        self.rs = np.random.RandomState(
-            np.random._mt19937.MT19937(np.random._bit_generator.SeedSequence(seed)))
+        self.rs = np.random.RandomState(np.random.MT19937(np.random.SeedSequence(seed)))
 
-        total_num_of_fields = width * length
+        total_num_of_fields = int(width) * int(length)
 
         # Fill shares randomly in the underlying data
         choice = self.rs.choice(
@@ -170,24 +469,35 @@ class Grid:
         )
         susceptible_count = int(round(susceptible_share * total_num_of_fields))
 
-        for i in choice[:susceptible_count]:
-            row = uint(i // width)
-            col = uint(i % length)
-            self.spawn_agent(GridPos(row, col), AgentState.SUSCEPTIBLE)
-
-        for i in choice[susceptible_count:]:
-            row = uint(i // width)
-            col = uint(i % length)
-            self.spawn_agent(GridPos(row, col), AgentState.INFECTIVE)
+        self.spawn_agents_at(choice[:susceptible_count], AgentState.SUSCEPTIBLE)
+        self.spawn_agents_at(choice[susceptible_count:], AgentState.INFECTIVE)
+        return len(choice)
 
-    def reset(self, state: SimState) -> None:
-        self.place_agents_on_the_field(state.size(), state.size(), state.get_seed(), state.susceptible_share(),
-                                       state.infected_share())
+    def reset(self, state: SimState) -> int:
+        """Places the agents of the state
+        :return: Number of placed agents"""
+        return self.place_agents_on_the_field(state.size(), state.size(), state.get_seed(),
+                                              state.susceptible_share(), state.infected_share())
 
-    def __init__(self, scheduler: Scheduler):
-        self.__id = np.random.randint(0, 10000)
+    def __init__(self, scheduler: Scheduler, simulation=None):
         self.__scheduler = scheduler
+        self.__simulation = simulation
+        self.rs = None
         self.__logger = logging.getLogger("grid")
+        self.__calendar = TransitionCalendar(scheduler, self)
+        self.__vaccination = VaccinationCampaign(scheduler, self)
         self.init_listeners()
-        self.__grid = None
-        self._quarantined_agents = []
+        self.__cells = None
+        self.__size = 0
+        self.__agents_by_state = {agent_state: dict() for agent_state in AgentState}
+        self.__live_agents = LiveAgents()
+        self._quarantined_agents = dict()
+        self.__free_cells = []
+        self.__free_slots = []
+
+        # Bookkeeping of the running status pass, see on_status_update
+        self.__next_states = None
+        self.__pass_queue = None
+        self.__pass_states = frozenset()
+        self.__pass_scheduled = None
+        self.__pass_key = 0.0
@@ -1,17 +1,18 @@
-from numpy import uint
-
-
 class GridPos:
     """
+    Position on the grid, used at the API boundaries. Internally the grid addresses cells by their flat index.
+    Coordinates are stored as plain ints, numpy scalars passed in are converted.
     Author: Beil Benedikt
     """
 
-    def __init__(self, row: uint, col: uint):
-        self.__row = row
-        self.__col = col
+    __slots__ = ('__row', '__col')
+
+    def __init__(self, row: int, col: int):
+        self.__row = int(row)
+        self.__col = int(col)
 
-    def row(self) -> uint:
+    def row(self) -> int:
         return self.__row
 
-    def col(self) -> uint:
+    def col(self) -> int:
         return self.__col
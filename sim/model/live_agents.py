@@ -0,0 +1,83 @@
+import typing
+import numpy as np
+
+
+class LiveAgents:
+    """Compact registry of the agents placed on a grid.
+    The agents are kept in a dense list (removal swaps the last agent into the free slot), so iterating them
+    never touches empty cells. The random order is produced by shuffling a permutation buffer in place, which is
+    reused as long as the number of agents does not change."""
+
+    def __init__(self):
+        self.__agents = []
+        self.__slots = dict()
+        self.__buffer = np.arange(0, dtype=np.intp)
+        self.__buffer_valid = 0
+
+    def __len__(self) -> int:
+        return len(self.__agents)
+
+    def __contains__(self, agent) -> bool:
+        return agent in self.__slots
+
+    def add(self, agent) -> None:
+        if agent in self.__slots:
+            return
+        self.__slots[agent] = len(self.__agents)
+        self.__agents.append(agent)
+
+    def add_all(self, agents: typing.Sequence) -> None:
+        """Adds agents that are not registered yet"""
+        slots = self.__slots
+        start = len(self.__agents)
+        slots.update(zip(agents, range(start, start + len(agents))))
+        self.__agents.extend(agents)
+
+    def remove(self, agent) -> None:
+        slot = self.__slots.pop(agent, None)
+        if slot is None:
+            return
+        last = self.__agents.pop()
+        if last is not agent:
+            self.__agents[slot] = last
+            self.__slots[last] = slot
+
+    def clear(self) -> None:
+        """Removes all agents. The permutation buffer is kept but restarts from the identity, so a cleared
+        registry shuffles like a new one"""
+        self.__agents.clear()
+        self.__slots.clear()
+        self.__buffer_valid = 0
+
+    def to_list(self) -> list:
+        """:return Copy of the registered agents, in registry order"""
+        return list(self.__agents)
+
+    def __permutation(self, rs: np.random.RandomState) -> np.ndarray:
+        """Shuffles the reusable buffer and returns the view holding a permutation of all agent slots"""
+        count = len(self.__agents)
+        if count > len(self.__buffer):
+            self.__buffer = np.arange(max(count, 2 * len(self.__buffer)), dtype=np.intp)
+            self.__buffer_valid = 0
+        view = self.__buffer[:count]
+        if self.__buffer_valid != count:
+            # Any permutation works as starting point of a shuffle, it only has to be rebuilt on size changes
+            view[:] = np.arange(count, dtype=np.intp)
+            self.__buffer_valid = count
+        rs.shuffle(view)
+        return view
+
+    def chunks_in_random_order(self, rs: np.random.RandomState, chunk_size: int = 4096) -> typing.Iterator[list]:
+        """Yields all agents in random order, chunk_size agents at a time.
+        The agents registered at the time of the call are visited, changes during the iteration are ignored.
+        :param rs: Random stream used to shuffle
+        :param chunk_size: Number of agents per yielded list"""
+        agents = list(self.__agents)
+        permutation = self.__permutation(rs)
+        for start in range(0, len(agents), chunk_size):
+            yield [agents[i] for i in permutation[start:start + chunk_size].tolist()]
+
+    def in_random_order(self, rs: np.random.RandomState) -> typing.Iterator:
+        """Yields all agents in random order, see chunks_in_random_order"""
+        for chunk in self.chunks_in_random_order(rs):
+            yield from chunk
@@ -0,0 +1,31 @@
+from functools import lru_cache
+from model.environmentmetric import EnvironmentMetric
+
+
+@lru_cache(maxsize=None)
+def environment_offsets(radius: int, metric: EnvironmentMetric) -> tuple:
+    """
+    Offsets (row, column) of all cells within the environment of a cell, the cell itself excluded.
+    The tables are computed once per (radius, metric) combination.
+    :param radius: Radius of the environment
+    :param metric: Metric used to measure the distance
+    :return: Tuple of (row offset, column offset) tuples
+    """
+    offsets = []
+    env_size = radius * 2 + 1
+
+    if metric == EnvironmentMetric.MANHATTAN:
+        for r in range(0, env_size):
+            offset = abs(radius - r)
+            for c in range(offset, env_size - offset):
+                offsets.append((r - radius, c - radius))
+    elif metric == EnvironmentMetric.EUCLIDEAN:
+        for r in range(0, env_size):
+            for c in range(0, env_size):
+                distance = round(((radius - r) ** 2 + (radius - c) ** 2) ** 0.5)
+                if 0 < distance <= radius:
+                    offsets.append((r - radius, c - radius))
+    else:
+        raise ValueError('Metric not implemented')
+
+    return tuple(offset for offset in offsets if offset != (0, 0))
@@ -1,6 +1,7 @@
 import numpy as np
 from model.agent_state import AgentState
 from model.environmentmetric import EnvironmentMetric
+from model.update_mode import UpdateMode
 
 """
 AUTHOR: Benjamin Eder, Konstantin Schlosser
@@ -31,6 +32,7 @@ class SimState:
     __vaccine_time = 50
     __vaccine_share = 0.5
     __vaccine_toggle = False
+    __vaccine_daily_capacity = 0
     __movement_limit_enabled = False
     __movement_limit_high_distances_are_uncommon = False
     __movement_limit_radius = 3
@@ -41,6 +43,10 @@ class SimState:
     __quarantine_share = 0.5
     __quarantined_count = 0
     __beginningTotalCount = 0
+    __update_mode = UpdateMode.SEQUENTIAL
+    __transition_calendar_enabled = False
+    __bulk_movement_enabled = False
+    __config_version = 0
 
     def __init__(
             self,
@@ -79,11 +85,42 @@ class SimState:
     def set_beginning_total_count(self, count: int) -> None:
         self.__beginningTotalCount = count
 
+    def config_version(self) -> int:
+        """Counter of the changes of the settings that decide which status strategies are active (incubation,
+        quarantine, lethality and the transition calendar). Lets the status pipeline cache its compiled form, see
+        model.strategies.status_pipeline"""
+        return self.__config_version
+
+    def update_mode(self) -> UpdateMode:
+        """Semantics of the status update, see UpdateMode"""
+        return self.__update_mode
+
+    def set_update_mode(self, value: UpdateMode) -> None:
+        self.__update_mode = value
+
+    def transition_calendar_enabled(self) -> bool:
+        """Whether the incubation and recovery transitions are drawn once per agent and scheduled on a calendar
+        (see model.calendar.TransitionCalendar) instead of being decided by a daily draw per agent"""
+        return self.__transition_calendar_enabled
+
+    def set_transition_calendar_enabled(self, value: bool) -> None:
+        self.__transition_calendar_enabled = value
+        self.__config_version += 1
+
+    def bulk_movement_enabled(self) -> bool:
+        """Whether all agents move at once with array operations instead of one after another
+        (see MovementStrategy.move_agents)"""
+        return self.__bulk_movement_enabled
+
+    def set_bulk_movement_enabled(self, value: bool) -> None:
+        self.__bulk_movement_enabled = value
+
     def quarantine_enabled(self) -> bool:
         return self.__quarantine_enabled
 
     def set_quarantine_enabled(self, value: bool) -> None:
         self.__quarantine_enabled = value
+        self.__config_version += 1
 
     def quarantine_share(self) -> float:
         """Share [0.0; 1.0] of infected people that are isolated (in quarantine)"""
@@ -97,6 +134,7 @@ class SimState:
 
     def set_incubation_period_enabled(self, value: bool) -> None:
         self.__incubation_period_enabled = value
+        self.__config_version += 1
 
     def incubation_period(self) -> int:
         return self.__incubation_period
@@ -157,6 +195,7 @@ class SimState:
 
     def set_lethality_toggle(self, lethality: bool) -> None:
         self.__lethality_toggle = lethality
+        self.__config_version += 1
 
     def vaccine_toggle(self) -> bool:
         return self.__vaccine_toggle
@@ -176,6 +215,15 @@ class SimState:
     def set_vaccine_share(self, share: float) -> None:
         self.__vaccine_share = share
 
+    def vaccine_daily_capacity(self) -> int:
+        """Maximum number of agents vaccinated per day, 0 to vaccinate the whole share on one day"""
+        return self.__vaccine_daily_capacity
+
+    def set_vaccine_daily_capacity(self, capacity: int) -> None:
+        if capacity < 0:
+            raise ValueError('Vaccine daily capacity must not be negative, value was {}'.format(capacity))
+        self.__vaccine_daily_capacity = capacity
+
     def speed(self) -> int:
         """Get the ms per second to simulate with"""
         return self.__speed
@@ -319,6 +367,39 @@ class SimState:
 
         self.__data[row][col] = state
 
+    def bulk_agent_update(self, rows: np.ndarray, cols: np.ndarray, state: int) -> None:
+        """Same as agent_update for many cells set to the same state at once
+        :param rows: Rows of the cells, no cell may appear twice
+        :param cols: Columns of the cells
+        :param state: New state value of all cells"""
+        if len(rows) == 0:
+            return
+        previous = np.bincount(self.__data[rows, cols].astype(np.intp), minlength=len(AgentState))
+        changes = -previous
+        changes[state] += len(rows)
+        self.__susceptible_count += int(changes[AgentState.SUSCEPTIBLE.value])
+        self.__infected_count += int(changes[AgentState.INFECTIVE.value])
+        self.__removed_count += int(changes[AgentState.REMOVED.value])
+        self.__immune_count += int(changes[AgentState.IMMUNE.value])
+        self.__dead_count += int(changes[AgentState.DEAD.value])
+        self.__incubation_count += int(changes[AgentState.INCUBATION.value])
+        self.__data[rows, cols] = state
+
+    def load_data(self, data: np.ndarray, quarantined_count: int = 0) -> None:
+        """Replaces the image data as a whole and recounts the agents per state, e.g. with a frame of a
+        simulation running in another process
+        :param data: State values of all cells, shape (size, size)
+        :param quarantined_count: Number of agents currently in quarantine (not part of the data)"""
+        self.__data = np.array(data, dtype=float)
+        counts = np.bincount(np.asarray(data, dtype=np.intp).reshape(-1), minlength=len(AgentState))
+        self.__susceptible_count = int(counts[AgentState.SUSCEPTIBLE.value])
+        self.__infected_count = int(counts[AgentState.INFECTIVE.value])
+        self.__removed_count = int(counts[AgentState.REMOVED.value])
+        self.__immune_count = int(counts[AgentState.IMMUNE.value])
+        self.__dead_count = int(counts[AgentState.DEAD.value])
+        self.__incubation_count = int(counts[AgentState.INCUBATION.value])
+        self.__quarantined_count = quarantined_count
+
     def reset(self) -> None:
         self.__infected_count = 0
         self.__susceptible_count = 0
@@ -326,4 +407,7 @@ class SimState:
         self.__dead_count = 0
         self.__immune_count = 0
         self.__incubation_count = 0
-        self.__data = np.zeros((self.size(), self.size()))
+        if self.__data is not None and self.__data.shape == (self.size(), self.size()):
+            self.__data.fill(0)  # Same size, the image buffer is reused
+        else:
+            self.__data = np.zeros((self.size(), self.size()))
@@ -1,9 +1,11 @@
-import random
+import typing
 import numpy as np
 from scipy.stats import norm
+from engine import kernels
 from model.agent import Agent
 from model.agent_state import AgentState
 from model.environmentmetric import EnvironmentMetric
+from model.neighborhood import environment_offsets
 from model.state import SimState
 from model.grid_pos import GridPos
 
@@ -18,6 +20,13 @@ class MovementStrategy:
         :param state: Current simulation state & parameters"""
         pass
 
+    def move_agents(self, grid, state: SimState) -> None:
+        """Moves all agents of the grid for one day, by default one after another in random order.
+        Strategies may move all agents at once if SimState.bulk_movement_enabled is set.
+        :param grid: Grid of the agents
+        :param state: Current simulation state & parameters"""
+        grid.exec_for_agents_in_rand_order(lambda agent: self.move_agent(agent, state))
+
     def __init__(self):
         pass
 
@@ -29,16 +38,35 @@ def get_free_pos(grid) -> GridPos:
     :param grid: Field, where a free position is to be searched.
     :return: A free prosition on the field, if there is one.
     """
+    return grid.pos_of(get_free_index(grid))
+
+
+def get_free_index(grid) -> int:
+    """
+    Returns the flat index of a free position on the field, if there is one.
+    :param grid: Field, where a free position is to be searched.
+    :return: Flat index of a free position on the field.
+    """
     if grid.is_fully_occupied():
         raise Exception("The field is completely occupied. The agent cannot move. ")
 
-    rand_x = np.uint(np.random.randint(low=0, high=grid.get_size()))
-    rand_y = np.uint(np.random.randint(low=0, high=grid.get_size()))
-    while grid.is_occupied(GridPos(rand_x, rand_y)):
-        rand_x = np.uint(np.random.randint(low=0, high=grid.get_size()))
-        rand_y = np.uint(np.random.randint(low=0, high=grid.get_size()))
+    return grid.random_free_cell()
 
-    return GridPos(rand_x, rand_y)
+
+def bulk_movers(grid, state: SimState) -> typing.Tuple[list, np.ndarray]:
+    """
+    Draws the agents moving today in one go, with the same chance as the per agent draw of the strategies.
+    Dead and quarantined agents never move.
+    :param grid: Field of the agents
+    :param state: Current simulation state & parameters
+    :return: The moving agents and their flat indices
+    """
+    agents = grid.live_agents().to_list()
+    chance = grid.random_state().randint(low=0, high=100, size=len(agents))
+    moving = [agents[i] for i in np.flatnonzero(chance <= state.get_mixing_value_m() * 100).tolist()
+              if agents[i].state() is not AgentState.DEAD]
+    indices = np.fromiter((agent.get_index() for agent in moving), dtype=np.intp, count=len(moving))
+    return moving, indices
 
 
 def get_free_pos_limited(
@@ -56,54 +84,69 @@ def get_free_pos_limited(
     :param metric:
     :return:
     """
-    possible_positions = []
+    return grid.pos_of(get_free_index_limited(grid, grid.index_of(pos), radius, metric))
 
-    env_size = radius * 2 + 1
 
+def get_free_index_limited(
+        grid,
+        index: int,
+        radius: int = 1,
+        metric: EnvironmentMetric = EnvironmentMetric.EUCLIDEAN,
+) -> int:
+    """
+    Same as get_free_pos_limited, but works on flat indices.
+    :param grid:
+    :param index: Flat index of the current position
+    :param radius:
+    :param metric:
+    :return: Flat index of a free position within the environment
+    """
     grid_size = grid.get_size()
-
-    cur_row = int(pos.row())
-    cur_col = int(pos.col())
-
-    if metric == EnvironmentMetric.MANHATTAN:
-        for r in range(0, env_size):
-            offset = abs(radius - r)
-            check_row = cur_row - radius + r
-            for c in range(offset, env_size - offset):
-                check_column = cur_col - radius + c
-                possible_positions.append((check_row, check_column))
-    elif metric == EnvironmentMetric.EUCLIDEAN:
-        for r in range(0, env_size):
-            check_row = cur_row - radius + r
-            for c in range(0, env_size):
-                check_column = cur_col - radius + c
-                distance = np.round(np.sqrt((radius - r) ** 2 + (radius - c) ** 2))
-                if 0 < distance <= radius:
-                    possible_positions.append((check_row, check_column))
-    else:
-        raise ValueError('Metric not implemented')
+    cur_row, cur_col = divmod(index, grid_size)
 
     # Filter positions that are no more in the Grid or are already used
-    possible_positions = list(
-        filter(
-            lambda pos: 0 <= pos[0] < grid_size and 0 <= pos[1] < grid_size
-                        and (pos[0] != cur_row or pos[1] != cur_col)
-                        and not grid.is_occupied(GridPos(np.uint(pos[0]), np.uint(pos[1]))),
-            possible_positions
-        )
-    )
+    possible_positions = []
+    for row_offset, col_offset in environment_offsets(radius, metric):
+        check_row = cur_row + row_offset
+        check_col = cur_col + col_offset
+        if 0 <= check_row < grid_size and 0 <= check_col < grid_size:
+            check_index = check_row * grid_size + check_col
+            if not grid.is_occupied_at(check_index):
+                possible_positions.append(check_index)
 
     if len(possible_positions) == 0:
         raise ValueError("No free positions available. ")
 
-    random_choice = random.choice(possible_positions)
-    return GridPos(np.uint(random_choice[0]), np.uint(random_choice[1]))
+    return possible_positions[grid.random_state().randint(len(possible_positions))]
 
 
 class DefaultMovementStrategy(MovementStrategy):
     """Current default strategy for movement. Long range movement only to free spaces.
     Author: Andreas Stiglmeier, Benedikt Beil, Konstantin Schlosser, Benjamin Eder"""
 
+    def move_agents(self, grid, state: SimState) -> None:
+        """In bulk mode the moving agents are drawn at once (see bulk_movers) and matched in random order with
+        distinct cells drawn from the free cells and the cells of the moving agents. All moves are then applied as
+        one permutation.
+        Difference to the sequential moves: there every agent takes a cell that is free at its turn, so it can use
+        a cell vacated by an agent moved before it, but never its own one. In bulk mode all moving agents leave
+        their cells first, so every vacated cell is available to every moving agent, including the own one. The
+        target of an agent is drawn without replacement from the pool of the free and the vacated cells, so it stays
+        on its own cell with probability 1 / len(pool), taking the cell of another moving agent is still a move. The
+        share of moving agents ending on a new cell is therefore 1 - 1 / len(pool) instead of 1."""
+        if not state.bulk_movement_enabled():
+            super().move_agents(grid, state)
+            return
+        if grid.is_fully_occupied():
+            return
+
+        moving, sources = bulk_movers(grid, state)
+        if len(moving) == 0:
+            return
+        pool = np.concatenate([grid.free_cells(), sources])
+        targets = pool[grid.random_state().permutation(len(pool))[:len(sources)]]
+        grid.move_agents_at(sources, targets)
+
     def move_agent(self, agent: Agent, state: SimState) -> None:
         grid = agent.grid()
         if grid.is_fully_occupied():
@@ -112,11 +155,9 @@ class DefaultMovementStrategy(MovementStrategy):
         if agent.state() is AgentState.DEAD or agent.is_quarantined():
             return  # We don't want zombies
 
-        move_probability = np.random.randint(low=0, high=100)
+        move_probability = grid.random_state().randint(low=0, high=100)
         if move_probability <= state.get_mixing_value_m() * 100:
-            new_grid_pos = get_free_pos(grid)
-            old_grid_pos = agent.get_pos()
-            grid.move_agent(old_grid_pos, new_grid_pos)
+            grid.move_agent_at(agent.get_index(), get_free_index(grid))
 
 
 class LimitedMovementStrategy(MovementStrategy):
@@ -125,6 +166,31 @@ class LimitedMovementStrategy(MovementStrategy):
     Author: Benjamin Eder
     """
 
+    def move_agents(self, grid, state: SimState) -> None:
+        """In bulk mode the moving agents are drawn at once (see bulk_movers) and move in a few proposal rounds
+        (see engine.kernels.limited_moves): every agent proposes a random offset of the cached offset table of its
+        environment, proposals leaving the grid or hitting an occupied cell are rejected and collisions are won by
+        a random priority. The losers propose again in the next round. All accepted moves are applied at once.
+        Difference to the sequential moves: there an agent picks among the free cells of its environment and only
+        stays if there is none. In bulk mode an agent that hit occupied cells in all rounds stays as well."""
+        if not state.bulk_movement_enabled():
+            super().move_agents(grid, state)
+            return
+        if grid.is_fully_occupied():
+            return
+
+        moving, sources = bulk_movers(grid, state)
+        if len(moving) == 0:
+            return
+        size = grid.get_size()
+        occupied = np.ones(size * size, dtype=bool)
+        occupied[grid.free_cells()] = False
+        moves = list(kernels.limited_move_rounds(occupied, (size, size), sources, kernels.MovementParams.of(state),
+                                                 grid.random_state()))
+        if moves:
+            grid.move_agents_at(np.concatenate([move[0] for move in moves]),
+                                np.concatenate([move[1] for move in moves]))
+
     def move_agent(self, agent: Agent, state: SimState) -> None:
         grid = agent.grid()
         if grid.is_fully_occupied():
@@ -133,7 +199,7 @@ class LimitedMovementStrategy(MovementStrategy):
         if agent.state() is AgentState.DEAD or agent.is_quarantined():
             return  # We don't want zombies
 
-        move_probability = np.random.randint(low=0, high=100)
+        move_probability = grid.random_state().randint(low=0, high=100)
         if move_probability <= state.get_mixing_value_m() * 100:
             radius = state.movement_limit_radius()
 
@@ -143,17 +209,16 @@ class LimitedMovementStrategy(MovementStrategy):
                 standard_deviation = radius / 3
 
                 radius = min(max(1, int(
-                    np.round(np.abs(norm.rvs(size=1, loc=mean, scale=standard_deviation)[0]))
+                    np.round(np.abs(norm.rvs(size=1, loc=mean, scale=standard_deviation, random_state=grid.random_state())[0]))
                 )), radius)
 
             try:
-                new_grid_pos = get_free_pos_limited(
+                new_index = get_free_index_limited(
                     grid,
-                    pos=agent.get_pos(),
+                    index=agent.get_index(),
                     radius=radius,
                     metric=state.movement_limit_metric(),
                 )
-                old_grid_pos = agent.get_pos()
-                grid.move_agent(old_grid_pos, new_grid_pos)
+                grid.move_agent_at(agent.get_index(), new_index)
             finally:
                 return
@@ -0,0 +1,65 @@
+import typing
+from model.agent_state import AgentState
+from model.state import SimState
+from model.strategies.status_strategy import StatusStrategy
+
+
+class StatusPipeline:
+    """Compiled form of the status strategies of a simulation.
+    The strategies are given as a dict of agent states to lists of (strategy, predicate) tuples, the predicate
+    decides from the settings whether the strategy is active. Evaluating the predicates for every status update
+    and looking up the list of every agent is wasted work, the result only changes with the settings. This class
+    evaluates them once and keeps per agent state a flat tuple of the bound execute methods of the active
+    strategies. It is compiled again only for another state, if the settings read by the predicates changed since
+    (see SimState.config_version) or after invalidate() was called."""
+
+    def compile(self, state: SimState) -> 'StatusPipeline':
+        """Compiles the pipeline for the settings, unless it is up to date already
+        :param state: Current setting of the application
+        :return: The pipeline itself"""
+        version = state.config_version()
+        if state is self.__state and version == self.__version:
+            return self
+
+        active = {agent_state: tuple(strategy for strategy, predicate in self.__strategies.get(agent_state, [])
+                                     if predicate(state))
+                  for agent_state in AgentState}
+
+        # Every agent state has an entry, so the status pass needs no lookup that can fail
+        self.__dispatch = {agent_state: tuple(strategy.execute for strategy in strategies)
+                           for agent_state, strategies in active.items()}
+        self.__bulk = tuple({id(strategy): strategy for agent_state in self.__strategies
+                             for strategy in active.get(agent_state, ())}.values())
+        self.__active_states = tuple(agent_state for agent_state, strategies in active.items()
+                                     if any(strategy.is_active_for(agent_state, state) for strategy in strategies))
+        self.__state = state
+        self.__version = version
+        return self
+
+    def invalidate(self) -> None:
+        """Forces the next compile, e.g. after the strategies dict was changed"""
+        self.__state = None
+
+    def dispatch(self) -> typing.Dict[AgentState, typing.Tuple[typing.Callable]]:
+        """:return: Execute methods of the active strategies per agent state, in the order of the strategies dict"""
+        return self.__dispatch
+
+    def bulk_strategies(self) -> typing.Tuple[StatusStrategy]:
+        """:return: Active strategies, every instance once, for their execute_bulk step"""
+        return self.__bulk
+
+    def active_states(self) -> typing.Tuple[AgentState]:
+        """:return: Agent states with at least one active strategy that may change such an agent (see
+        StatusStrategy.is_active_for)"""
+        return self.__active_states
+
+    def __init__(self, strategies: dict):
+        """
+        :param strategies: Status strategies per agent state, lists of (strategy, predicate) tuples
+        """
+        self.__strategies = strategies
+        self.__state = None
+        self.__version = None
+        self.__dispatch = {agent_state: () for agent_state in AgentState}
+        self.__bulk = ()
+        self.__active_states = ()
@@ -0,0 +1,113 @@
+from unittest import TestCase
+from controller.simulation import Simulation
+from model.agent_state import AgentState
+from model.calendar import DayCalendar
+from model.state import SimState
+from model.update_mode import UpdateMode
+
+
+class TestDayCalendar(TestCase):
+
+    def test_take_hands_out_the_bucket_once(self):
+        sut = DayCalendar()
+        sut.schedule(3, 'a')
+        sut.schedule_all([1, 3], ['b', 'c'])
+
+        self.assertEqual(len(sut), 3)
+        self.assertEqual(sut.take(2), [])
+        self.assertEqual(sut.take(3), ['a', 'c'])
+        self.assertEqual(sut.take(3), [])
+        self.assertEqual(len(sut), 1)
+
+
+class TestTransitionCalendar(TestCase):
+
+    def test_removal_days_are_geometric(self):
+        # Nobody gets infected, so the summed infected counts are the total of the infection durations
+        durations = dict()
+        for enabled in (False, True):
+            state = SimState(size=40, susceptible_share=0, infected_share=0.5, infection_prob=0, remove_prob=0.25)
+            state.set_mixing_value_m(0)
+            state.seed(4)
+            state.set_transition_calendar_enabled(enabled)
+            sut = Simulation(state)
+            sut.reset()
+
+            total = 0
+            while not sut.is_finished():
+                total += state.infected_count()
+                sut.step()
+            durations[enabled] = total / state.get_beginning_total_count()
+
+        self.assertAlmostEqual(durations[False], 4, delta=0.4)
+        self.assertAlmostEqual(durations[True], 4, delta=0.4)
+
+    def test_incubation_ends_on_the_same_day(self):
+        days = dict()
+        for enabled in (False, True):
+            # On a 2x2 grid all cells are within a radius of 2, so it does not matter whether the agents move
+            state = SimState(size=2, susceptible_share=0, infected_share=0, infection_prob=1, remove_prob=0)
+            state.set_infection_env_radius(2)
+            state.set_update_mode(UpdateMode.SYNCHRONOUS)
+            state.set_incubation_period_enabled(True)
+            state.set_incubation_period(2)
+            state.set_transition_calendar_enabled(enabled)
+            sut = Simulation(state)
+            sut.reset()
+            grid = sut.get_grid()
+            grid.spawn_agent_at(0, AgentState.INFECTIVE)
+            grid.spawn_agent_at(1, AgentState.SUSCEPTIBLE)
+            agent = grid.get_agent_at(1)
+
+            for day in range(1, 20):
+                sut.step()
+                if agent.state() is AgentState.INFECTIVE:
+                    days[enabled] = day
+                    break
+
+        # Infected on day 1, incubating for two full days
+        self.assertEqual(days, {False: 4, True: 4})
+
+    def test_days_are_counted_with_and_after_the_calendar(self):
+        state = SimState(size=2, susceptible_share=0, infected_share=0, infection_prob=1, remove_prob=0)
+        state.set_infection_env_radius(2)
+        state.set_update_mode(UpdateMode.SYNCHRONOUS)
+        state.set_incubation_period_enabled(True)
+        state.set_incubation_period(4)
+        state.set_transition_calendar_enabled(True)
+        sut = Simulation(state)
+        sut.reset()
+        grid = sut.get_grid()
+        grid.spawn_agent_at(0, AgentState.INFECTIVE)
+        grid.spawn_agent_at(1, AgentState.SUSCEPTIBLE)
+        infective, incubating = grid.get_agent_at(0), grid.get_agent_at(1)
+
+        for _ in range(3):
+            sut.step()
+        self.assertEqual(infective.sick_days(), 3)
+        self.assertEqual(incubating.incubation_days(), 2)
+
+        # The daily strategies go on from the counted days, the incubation still ends on day 6
+        state.set_transition_calendar_enabled(False)
+        states = []
+        for _ in range(3):
+            sut.step()
+            states.append(incubating.state())
+        self.assertEqual(states, [AgentState.INCUBATION, AgentState.INCUBATION, AgentState.INFECTIVE])
+        self.assertEqual(infective.sick_days(), 6)
+
+    def test_agents_spawned_in_bulk_are_scheduled(self):
+        state = SimState(size=4, susceptible_share=0, infected_share=0, infection_prob=0, remove_prob=0.5)
+        state.set_transition_calendar_enabled(True)
+        sut = Simulation(state)
+        sut.reset()
+        sut.step()
+        grid = sut.get_grid()
+        grid.spawn_agents_at([0, 1, 2, 3], AgentState.INFECTIVE)
+        grid.spawn_agent_at(4, AgentState.INFECTIVE)
+        agents = [grid.get_agent_at(index) for index in range(5)]
+
+        for _ in range(60):
+            sut.step()
+
+        self.assertEqual([agent.state() for agent in agents], [AgentState.REMOVED] * 5)
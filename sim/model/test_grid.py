@@ -3,6 +3,7 @@ from numpy import uint
 from model.grid import Grid
 from model.grid_pos import GridPos
 from model.agent_state import AgentState
+from controller.events import Events
 from controller.scheduler import Scheduler
 
 
@@ -34,5 +35,95 @@ class TestGrid(TestCase):
         self.assertFalse(sut.is_occupied(GridPos(uint(99), uint(0))))
         self.assertFalse(sut.is_occupied(GridPos(uint(0), uint(99))))
 
+    def test_flat_index_matches_grid_pos(self):
+        sut = self.__get_sut()
+        sut.init_empty_grid(uint(10), uint(10))
+        sut.spawn_agent(GridPos(uint(3), uint(7)), AgentState.SUSCEPTIBLE)
+        self.assertTrue(sut.is_occupied_at(37))
+        self.assertIs(sut.get_agent_at(37), sut.get_agent(GridPos(uint(3), uint(7))))
+        self.assertEqual(sut.pos_of(37).row(), 3)
+        self.assertEqual(sut.pos_of(37).col(), 7)
+
+    def test_move_agent_at(self):
+        sut = self.__get_sut()
+        sut.init_empty_grid(uint(10), uint(10))
+        sut.spawn_agent_at(0, AgentState.INFECTIVE)
+        agent = sut.get_agent_at(0)
+        sut.move_agent_at(0, 99)
+        self.assertIs(sut.get_agent_at(99), agent)
+        self.assertIsNone(sut.get_agent_at(0))
+        self.assertEqual(agent.get_index(), 99)
+        self.assertEqual(agent.get_pos().row(), 9)
+        self.assertRaises(Exception, lambda: sut.move_agent_at(99, 99))
+
+    def test_free_cell_index_follows_the_agents(self):
+        sut = self.__get_sut()
+        sut.place_agents_on_the_field(uint(10), uint(10), 7, 0.5, 0.1)
+        for _ in range(200):
+            occupied = [index for index in range(100) if sut.is_occupied_at(index)]
+            sut.move_agent_at(occupied[sut.random_state().randint(len(occupied))], sut.random_free_cell())
+
+        free = [index for index in range(100) if not sut.is_occupied_at(index)]
+        self.assertEqual(sut.free_cell_count(), 40)
+        self.assertEqual(len(free), 40)
+        for _ in range(50):
+            self.assertIn(sut.random_free_cell(), free)
+
+    def test_release_from_quarantine_to_a_free_cell(self):
+        sut = self.__get_sut()
+        sut.place_agents_on_the_field(uint(10), uint(10), 3, 0.98, 0.01)
+        agent = next(sut.get_agent_at(index) for index in range(100) if sut.is_occupied_at(index))
+        index = agent.get_index()
+
+        sut.quarantine_agent(agent)
+        self.assertIn(agent, sut.get_quarantinedAgents())
+        self.assertFalse(sut.is_occupied_at(index))
+        self.assertEqual(sut.free_cell_count(), 2)
+
+        free = [i for i in range(100) if not sut.is_occupied_at(i)]
+        self.assertTrue(sut.release_agent(agent))
+        self.assertNotIn(agent, sut.get_quarantinedAgents())
+        self.assertIn(agent.get_index(), free)
+        self.assertIs(sut.get_agent_at(agent.get_index()), agent)
+        self.assertEqual(sut.free_cell_count(), 1)
+
+    def test_move_agents_at_once(self):
+        sut = self.__get_sut()
+        sut.init_empty_grid(uint(10), uint(10))
+        sut.spawn_agent_at(0, AgentState.INFECTIVE)
+        sut.spawn_agent_at(1, AgentState.SUSCEPTIBLE)
+        first, second = sut.get_agent_at(0), sut.get_agent_at(1)
+
+        # The second agent takes the cell vacated by the first one
+        sut.move_agents_at([0, 1], [5, 0])
+        self.assertIs(sut.get_agent_at(5), first)
+        self.assertIs(sut.get_agent_at(0), second)
+        self.assertIsNone(sut.get_agent_at(1))
+        self.assertEqual((first.get_index(), second.get_index()), (5, 0))
+        self.assertEqual(sut.free_cell_count(), 98)
+        self.assertFalse(sut.is_occupied_at(1))
+        self.assertRaises(Exception, lambda: sut.move_agents_at([5], [0]))
+
+    def test_placement_on_a_non_square_field(self):
+        sut = self.__get_sut()
+        count = sut.place_agents_on_the_field(uint(4), uint(8), 11, 0.75, 0.25)
+        self.assertEqual(count, 32)
+        self.assertTrue(all(sut.is_occupied_at(index) for index in range(32)))
+        self.assertEqual(len(sut.agents_in_state(AgentState.INFECTIVE)), 8)
+
+    def test_placement_is_reported_in_bulk(self):
+        scheduler = Scheduler()
+        events = []
+        scheduler.register_gui_handler(Events.BULK_AGENT_CHANGE_GUI,
+                                       lambda rows, cols, state: events.append((len(rows), state)))
+        scheduler.register_gui_handler(Events.AGENT_CHANGE_GUI, lambda row, col, state: events.append((1, state)))
+        sut = Grid(scheduler)
+
+        count = sut.place_agents_on_the_field(uint(10), uint(10), 5, 0.5, 0.1)
+        self.assertEqual(count, 60)
+        self.assertEqual(events, [(50, AgentState.SUSCEPTIBLE.value), (10, AgentState.INFECTIVE.value)])
+        self.assertEqual(sut.free_cell_count(), 40)
+        self.assertEqual(len(sut.live_agents()), 60)
+
     def __get_sut(self) -> Grid:
         return Grid(Scheduler())
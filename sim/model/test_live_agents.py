@@ -0,0 +1,38 @@
+from unittest import TestCase
+import numpy as np
+from model.live_agents import LiveAgents
+
+
+class TestLiveAgents(TestCase):
+
+    def test_random_order_visits_everyone_once(self):
+        sut = LiveAgents()
+        for agent in range(100):
+            sut.add(agent)
+        sut.remove(10)
+        sut.remove(99)
+
+        rs = np.random.RandomState(1)
+        for _ in range(3):
+            visited = list(sut.in_random_order(rs))
+            self.assertEqual(sorted(visited), [a for a in range(100) if a not in (10, 99)])
+
+    def test_chunks(self):
+        sut = LiveAgents()
+        for agent in range(10):
+            sut.add(agent)
+
+        chunks = list(sut.chunks_in_random_order(np.random.RandomState(1), chunk_size=4))
+        self.assertEqual([len(chunk) for chunk in chunks], [4, 4, 2])
+
+    def test_remove_keeps_registry_compact(self):
+        sut = LiveAgents()
+        sut.add('a')
+        sut.add('b')
+        sut.add('c')
+        sut.remove('a')
+        sut.add('d')
+
+        self.assertEqual(len(sut), 3)
+        self.assertNotIn('a', sut)
+        self.assertEqual(sorted(sut.in_random_order(np.random.RandomState(2))), ['b', 'c', 'd'])
@@ -0,0 +1,59 @@
+from unittest import TestCase
+from controller.simulation import Simulation
+from model.state import SimState
+
+
+class TestVaccinationCampaign(TestCase):
+
+    def test_share_is_vaccinated_on_the_configured_day(self):
+        sut = self.__create_sut()
+        state = sut.get_state()
+        state.set_vaccine_time(3)
+
+        sut.step()
+        sut.step()
+        self.assertEqual(state.immune_count(), 0)
+
+        sut.step()
+        self.assertEqual(state.immune_count(), 50)
+        self.assertEqual(state.susceptible_count(), 50)
+        self.assertEqual(sut.get_grid().vaccination().remaining(), 0)
+
+    def test_rollout_with_daily_capacity(self):
+        sut = self.__create_sut()
+        state = sut.get_state()
+        state.set_vaccine_time(1)
+        state.set_vaccine_share(0.5)
+        state.set_vaccine_daily_capacity(20)
+
+        immune = []
+        for _ in range(4):
+            sut.step()
+            immune.append(state.immune_count())
+
+        self.assertEqual(immune, [20, 40, 50, 50])
+
+    def test_start_follows_the_vaccine_time(self):
+        sut = self.__create_sut()
+        state = sut.get_state()
+        state.set_vaccine_time(3)
+
+        sut.step()
+        self.assertEqual(state.immune_count(), 0)
+
+        # Moved forward after the start was scheduled for day 3
+        state.set_vaccine_time(2)
+        sut.step()
+        self.assertEqual(state.immune_count(), 50)
+        sut.step()
+        self.assertEqual(state.immune_count(), 50)
+
+    def __create_sut(self) -> Simulation:
+        # Nobody is infected, so the susceptible agents only change by vaccination
+        state = SimState(size=10, susceptible_share=1.0, infected_share=0)
+        state.seed(2)
+        state.set_vaccine_toggle(True)
+        state.set_vaccine_share(0.5)
+        sut = Simulation(state)
+        sut.reset()
+        return sut
@@ -0,0 +1,10 @@
+from enum import Enum
+
+
+class UpdateMode(Enum):
+    """Enumeration of the possible semantics of the status update
+    SEQUENTIAL: Changes are applied immediately while the agents are processed in random order.
+    SYNCHRONOUS: All agents read the state of the beginning of the day, changes are buffered and applied
+    at the end of the status update."""
+    SEQUENTIAL = 'Sequential'
+    SYNCHRONOUS = 'Synchronous'
@@ -0,0 +1,86 @@
+from controller.events import Events
+from controller.scheduler import Scheduler
+from model.agent_state import AgentState
+from model.state import SimState
+
+
+class VaccinationCampaign:
+    """Vaccination of the susceptible agents of a grid as a bulk event on its calendar (see
+    model.calendar.TransitionCalendar).
+    On day vaccine_time() the campaign starts with vaccine_share() of the agents that are susceptible at that moment.
+    They are selected in one draw without replacement and become immune. With a daily capacity (see
+    SimState.vaccine_daily_capacity) at most that many agents are vaccinated per day, the rest of the target is
+    rolled out on the following days among the agents still susceptible then. Apart from the days of the campaign
+    the only cost is a check whether the start is still scheduled for the configured day."""
+
+    def is_started(self) -> bool:
+        return self.__started
+
+    def vaccinated_count(self) -> int:
+        return self.__vaccinated
+
+    def remaining(self) -> int:
+        """Number of agents still to vaccinate by the running campaign"""
+        return self.__remaining
+
+    def reset(self) -> None:
+        self.__start_day = None
+        self.__started = False
+        self.__remaining = 0
+        self.__vaccinated = 0
+
+    def init_listeners(self) -> None:
+        self.__scheduler.register_handler(Events.PRE_NEXT_STEP, self.__pre_next_step)
+
+    def remove_listeners(self) -> None:
+        self.__scheduler.get_observable().off(Events.PRE_NEXT_STEP, self.__pre_next_step)
+
+    def __pre_next_step(self, state: SimState) -> None:
+        # Runs before the calendar begins the next day, the start may be moved as long as it has not begun
+        if self.__started or not state.vaccine_toggle():
+            return
+        start_day = state.vaccine_time()
+        if start_day != self.__start_day and start_day > self.__grid.calendar().day():
+            self.__start_day = start_day
+            self.__grid.calendar().schedule_event(start_day, self.__start)
+
+    def __start(self, state: SimState) -> None:
+        if self.__started or not state.vaccine_toggle() or self.__grid.calendar().day() != self.__start_day:
+            return  # Outdated start day or vaccination disabled
+
+        self.__started = True
+        susceptible_count = len(self.__grid.agents_in_state(AgentState.SUSCEPTIBLE))
+        self.__remaining = int(round(state.vaccine_share() * susceptible_count))
+        self.__vaccinate(state)
+
+    def __vaccinate(self, state: SimState) -> None:
+        if not state.vaccine_toggle():
+            self.__remaining = 0
+            return  # Campaign stopped
+
+        susceptible = list(self.__grid.agents_in_state(AgentState.SUSCEPTIBLE))
+        count = min(self.__remaining, len(susceptible))
+        capacity = state.vaccine_daily_capacity()
+        if capacity > 0:
+            count = min(count, capacity)
+
+        for i in self.__grid.random_state().choice(len(susceptible), count, replace=False):
+            susceptible[i].set_state(AgentState.IMMUNE)
+        self.__vaccinated += count
+        self.__remaining = self.__remaining - count if count < len(susceptible) else 0
+
+        if self.__remaining > 0:
+            calendar = self.__grid.calendar()
+            calendar.schedule_event(calendar.day() + 1, self.__vaccinate)
+
+    def __init__(self, scheduler: Scheduler, grid):
+        """
+        :param scheduler: Scheduler of the simulation, the campaign listens to its day events
+        :param grid: Grid of the agents, provides the calendar and the random stream
+        """
+        self.__scheduler = scheduler
+        self.__grid = grid
+        self.__start_day = None
+        self.__started = False
+        self.__remaining = 0
+        self.__vaccinated = 0
@@ -12,18 +12,22 @@ AUTHOR: Benjamin Eder and Konstantin Schlosser (a little ;))
 class SimStateViz:
     """Visualizations for the current simulator state"""
 
-    __r_points = []
-    __r_estimate_points = []
-    __sus_counts = []
-    __inf_counts = []
-    __rem_counts = []
-    __ded_counts = []
-    __imm_counts = []
-    __inc_counts = []
-
-    def __init__(self, state: SimState):
-        """Create visualizations for the passed state"""
+    def __init__(self, state: SimState, simulation):
+        """Create visualizations for the passed state
+        :param state: State to visualize
+        :param simulation: Simulation the state belongs to, used to inspect its grid. None if the simulation runs
+                           in another process, the R values are passed in then"""
         self.state = state
+        self.simulation = simulation
+
+        self.__r_points = []
+        self.__r_estimate_points = []
+        self.__sus_counts = []
+        self.__inf_counts = []
+        self.__rem_counts = []
+        self.__ded_counts = []
+        self.__imm_counts = []
+        self.__inc_counts = []
 
         view: pg.GraphicsLayoutWidget = pg.GraphicsLayoutWidget()
         qGraphicsGridLayout = view.ci.layout
@@ -100,10 +104,11 @@ class SimStateViz:
     def inc_counts(self) -> list:
         return self.__inc_counts
 
-    def reset(self) -> None:
+    def reset(self, r_value: float = None) -> None:
+        """Clears the series, see calc_next_r for the r_value"""
         self.__r_points = []
         self.__r_estimate_points = []
-        self.calc_next_r()
+        self.calc_next_r(r_value)
 
         self.__sus_counts = []
         self.__inf_counts = []
@@ -116,6 +121,17 @@ class SimStateViz:
 
     def update(self, update_legend=False) -> None:
         """Tell the visualization to refresh based on the simulator state"""
+        self.__record_shares()
+        self.refresh(update_legend)
+
+    def record_day(self, r_value: float = None) -> None:
+        """Appends the values of the current day without drawing them, for days that are not shown on their own
+        (see refresh). See calc_next_r for the r_value"""
+        self.calc_next_r(r_value)
+        self.__record_shares()
+
+    def refresh(self, update_legend=False) -> None:
+        """Draws the recorded values and the current simulator state"""
         self.__update_shares_plot()
         self.__update_r_plot()
         self.__update_img()
@@ -180,14 +196,8 @@ class SimStateViz:
             cfg.COLOR_INCUBATION  # Removed
         ]), levels=(0.0, 6.0))
 
-    def __update_shares_plot(self) -> None:
-        """
-        Draws the course of the simulation for the new values.
-        Edited by Beil Benedikt vor the incubation line
-        :return: Nothing
-        """
-        self.shares_plot.clear()
-
+    def __record_shares(self) -> None:
+        """Appends the cumulated shares of the current counts"""
         sus_count = self.state.susceptible_count()
         inf_count = self.state.infected_count()
         rem_count = self.state.removed_count()
@@ -209,6 +219,14 @@ class SimStateViz:
         share_sum += ded_count
         self.__ded_counts.append(share_sum / total_population)
 
+    def __update_shares_plot(self) -> None:
+        """
+        Draws the course of the simulation for the new values.
+        Edited by Beil Benedikt vor the incubation line
+        :return: Nothing
+        """
+        self.shares_plot.clear()
+
         x = np.arange(len(self.__sus_counts))
 
         self.shares_plot.setXRange(0, len(x))
@@ -268,13 +286,16 @@ class SimStateViz:
         self.r_plot.plot(x, self.__r_estimate_points, pen=cfg.COLOR_EFFECTIVE_REPRODUCTION_NUMBER_ESTIMATED,
                          name='R̄ estimate')
 
-    def calc_next_r(self) -> None:
-        if self.state.calculate_real_effective_reproduction_number() or len(self.__r_points) == 0:
-            from controller.provider import active_provider
-
+    def calc_next_r(self, r_value: float = None) -> None:
+        """Appends the R values of the current day
+        :param r_value: Real R value calculated elsewhere (e.g. by a simulation in another process), calculated
+                        from the grid of the simulation if omitted"""
+        if r_value is not None:
+            self.__r_points.append(r_value)
+        elif self.state.calculate_real_effective_reproduction_number() or len(self.__r_points) == 0:
             # Calculate real R-value
             self.__r_points.append(calc_effective_reproduction_number(
-                active_provider.get_grid(),
+                self.simulation.get_grid(),
                 remove_probability=self.state.remove_prob(),
                 infection_probability=self.state.infection_prob(),
                 infection_radius=self.state.infection_env_radius(),
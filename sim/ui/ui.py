@@ -9,12 +9,16 @@ from PyQt5 import QtCore, QtWidgets, QtGui, QtSvg
 from PyQt5.QtCore import QThreadPool, pyqtSignal
 import controller.events
 import controller.scheduler
-from controller.provider import active_provider
+from controller.batch import configured_batch
+from controller.remote import RemoteSimulation
+from controller.simulation import Simulation
 from model.environmentmetric import EnvironmentMetric
 from model.state import SimState
+from model.update_mode import UpdateMode
 from model.strategies.movement_strategy import LimitedMovementStrategy, DefaultMovementStrategy
 from model.worker import Worker
 from ui.state_viz import SimStateViz
+from util.statistics import EnsembleStatistics
 
 """
 AUTHOR: Benjamin Eder, Konstantin Schlosser (a bit ;))
@@ -26,9 +30,16 @@ class SimUi(QtCore.QObject):
 
     __repaint_signal = pyqtSignal()
 
-    def __init__(self, state: SimState):
+    def __init__(self, state: SimState, remote: bool = False):
+        """
+        :param state: State to simulate
+        :param remote: Whether to run the simulation in a child process (see RemoteSimulation) instead of a worker
+                       thread of the UI process
+        """
         super().__init__()
         self.state = state
+        self.remote = RemoteSimulation() if remote else None
+        self.simulation = None if remote else Simulation(state)
         self.__paused = True
         self.__numOfInfected = 10000
         self.threadpool = QThreadPool()
@@ -66,12 +77,96 @@ class SimUi(QtCore.QObject):
         self.__build_visualizations()
         self.__build_settings()
 
-        active_provider.get_scheduler().register_gui_handler(controller.events.Events.REPAINT,
-                                                             self.__after_step_completion)
-        self.__repaint_signal.connect(self.__repaint_viz)
-        active_provider.get_scheduler().register_gui_handler(controller.events.Events.AGENT_CHANGE_GUI,
-                                                             self.state.agent_update)
-        active_provider.get_scheduler().trigger_gui_event(controller.events.Events.RESET, kw={"state": self.state})
+        if self.remote is not None:
+            self.app.aboutToQuit.connect(self.remote.close)
+            self.remote.reset(self.state)
+
+            # Pick up the frames published by the child process
+            self.frame_timer = QtCore.QTimer()
+            self.frame_timer.setInterval(15)
+            self.frame_timer.timeout.connect(self.__poll_frame)
+            self.frame_timer.start()
+        else:
+            self.simulation.get_scheduler().register_gui_handler(controller.events.Events.REPAINT,
+                                                                 self.__after_step_completion)
+            self.__repaint_signal.connect(self.__repaint_viz)
+            self.simulation.get_scheduler().trigger_gui_event(controller.events.Events.RESET, kw={"state": self.state})
+
+    def __poll_frame(self) -> None:
+        """Records all frames the remote simulation published since the last poll, one per day, and shows the
+        latest one"""
+        self.remote.sync(self.state)
+        frame = self.remote.next_frame()
+        if frame is None:
+            return
+
+        while frame is not None:
+            self.state.load_data(frame.data, frame.quarantined_count)
+            self.state.set_beginning_total_count(frame.beginning_total_count)
+            if frame.day == 0:
+                self.state_viz.reset(frame.r_value)
+            else:
+                self.state_viz.record_day(frame.r_value)
+            finished = frame.finished
+            frame = self.remote.next_frame()
+        self.state_viz.refresh()
+
+        if finished and not self.__paused:
+            self.__pause_simulation()
+
+    def __batch_config(self) -> str:
+        """:return JSON object of the settings, written into the batch result file"""
+        return f"""{{
+\t\t\"size\": {self.state.size()},
+\t\t\"susceptible_share\": {self.state.susceptible_share()},
+\t\t\"infected_share\": {self.state.infected_share()},
+\t\t\"infection_probability\": {self.state.infection_prob()},
+\t\t\"remove_probability\": {self.state.remove_prob()},
+\t\t\"movement_mixing\": {self.state.get_mixing_value_m()},
+\t\t\"infection_env_radius\": {self.state.infection_env_radius()},
+\t\t\"infection_env_metric\": \"{self.state.infection_env_metric().value}\",
+\t\t\"calc_real_effective_reproduction_rate\": {str(self.state.calculate_real_effective_reproduction_number()).lower()},
+\t\t\"breakdown_dead_immune_enabled\": {str(self.state.lethality_toggle()).lower()},
+\t\t\"lethality\": {self.state.lethality()},
+\t\t\"vaccine_enabled\": {str(self.state.vaccine_toggle()).lower()},
+\t\t\"vaccine_time\": {self.state.vaccine_time()},
+\t\t\"vaccine_share\": {self.state.vaccine_share()},
+\t\t\"vaccine_daily_capacity\": {self.state.vaccine_daily_capacity()},
+\t\t\"movement_limit_enabled\": {str(self.state.movement_limit_enabled()).lower()},
+\t\t\"movement_limit_radius\": {self.state.movement_limit_radius()},
+\t\t\"movement_limit_metric\": \"{self.state.movement_limit_metric().value}\",
+\t\t\"movement_limit_high_distances_are_uncommon\": {str(self.state.movement_limit_high_distances_are_uncommon()).lower()},
+\t\t\"incubation_period_enabled\": {str(self.state.incubation_period_enabled()).lower()},
+\t\t\"incubation_period\": {self.state.incubation_period()},
+\t\t\"quarantine_enabled\": {str(self.state.quarantine_enabled()).lower()},
+\t\t\"quarantine_share\": {self.state.quarantine_share()},
+\t\t\"update_mode\": \"{self.state.update_mode().value}\",
+\t\t\"transition_calendar_enabled\": {str(self.state.transition_calendar_enabled()).lower()},
+\t\t\"bulk_movement_enabled\": {str(self.state.bulk_movement_enabled()).lower()}
+\t}}"""
+
+    def __compartment_counts(self) -> tuple:
+        """:return The current counts in the order of util.statistics.COMPARTMENTS"""
+        return (self.state.susceptible_count(), self.state.infected_count(), self.state.removed_count(),
+                self.state.dead_count(), self.state.immune_count(), self.state.incubation_count())
+
+    def __reset_simulation(self) -> None:
+        """Resets the simulation with the current settings"""
+        if self.remote is not None:
+            self.remote.reset(self.state)  # The visualization is reset with the first frame
+            return
+
+        self.simulation.get_scheduler().trigger_gui_event(controller.events.Events.RESET, kw={"state": self.state})
+        self.state_viz.reset()
+
+    def __next_step(self) -> None:
+        """Simulates the next day"""
+        if self.remote is not None:
+            self.remote.step()
+            return
+
+        self.simulation.get_scheduler().trigger_gui_event(controller.scheduler.Events.NEXT_STEP,
+                                                          {"state": self.state})
 
     def __after_step_completion(self) -> None:
         self.state_viz.calc_next_r()
@@ -95,7 +190,7 @@ class SimUi(QtCore.QObject):
                 self.state.infected_count() > 0 or self.state.get_total_count() < self.state.get_beginning_total_count()):
             start = time.time_ns()
 
-            active_provider.get_scheduler().trigger_gui_event(controller.scheduler.Events.NEXT_STEP,
+            self.simulation.get_scheduler().trigger_gui_event(controller.scheduler.Events.NEXT_STEP,
                                                               {"state": self.state})
 
             took = (time.time_ns() - start) // 1000000
@@ -113,7 +208,7 @@ class SimUi(QtCore.QObject):
             self.__pause_simulation()
 
     def __build_visualizations(self) -> None:
-        self.state_viz = SimStateViz(self.state)
+        self.state_viz = SimStateViz(self.state, self.simulation)
         self.root_layout.addWidget(self.state_viz.view)
 
     def __build_controls(self) -> None:
@@ -153,8 +248,7 @@ class SimUi(QtCore.QObject):
             remove_prob_slider.setValue(round(self.state.remove_prob() * 100))
 
             self.state.reset()
-            active_provider.get_scheduler().trigger_gui_event(controller.events.Events.RESET, kw={"state": self.state})
-            self.state_viz.reset()
+            self.__reset_simulation()
 
         reset_btn.clicked.connect(reset_clicked)
 
@@ -165,8 +259,7 @@ class SimUi(QtCore.QObject):
         next_btn.setToolTip('Go to next simulation step manually')
 
         def next_clicked() -> None:
-            active_provider.get_scheduler().trigger_gui_event(controller.scheduler.Events.NEXT_STEP,
-                                                              {"state": self.state})
+            self.__next_step()
 
         next_btn.clicked.connect(next_clicked)
 
@@ -186,7 +279,28 @@ class SimUi(QtCore.QObject):
 
             self.__paused = False
 
-            if cfg.BATCH_RUN_ENABLED:
+            if cfg.BATCH_RUN_ENABLED and cfg.BATCH_ADAPTIVE_ENABLED and self.remote is None:
+                runs = []
+                batch = configured_batch(self.state)
+                report = batch.run(lambda i, result: runs.append({
+                    "iteration": i + 1,
+                    "seed": result.seed,
+                    "elapsed_days": len(result.counts) - 1,
+                    **result.metrics
+                }))
+                print(f'Adaptive batch stopped by {report["stopped_by"]} after {report["runs"]} runs')
+
+                with open(cfg.BATCH_RESULT_FILE, 'w') as results_file:
+                    results_file.write(f"""{{
+\t\"config\": {self.__batch_config()},
+\t\"stopping\": {json.dumps(report)},
+\t\"runs\": {json.dumps(runs)}
+}}
+""")
+
+                with open(cfg.BATCH_SUMMARY_FILE, 'w') as summary_file:
+                    json.dump(batch.statistics().summary(), summary_file)
+            elif cfg.BATCH_RUN_ENABLED and self.remote is None:
                 # Prepare results file
                 try:
                     os.remove(cfg.BATCH_RESULT_FILE)
@@ -195,39 +309,21 @@ class SimUi(QtCore.QObject):
 
                 with open(cfg.BATCH_RESULT_FILE, 'a+') as results_file:
                     results_file.write(f"""{{
-\t\"config\": {{
-\t\t\"size\": {self.state.size()},
-\t\t\"susceptible_share\": {self.state.susceptible_share()},
-\t\t\"infected_share\": {self.state.infected_share()},
-\t\t\"infection_probability\": {self.state.infection_prob()},
-\t\t\"remove_probability\": {self.state.remove_prob()},
-\t\t\"movement_mixing\": {self.state.get_mixing_value_m()},
-\t\t\"infection_env_radius\": {self.state.infection_env_radius()},
-\t\t\"infection_env_metric\": \"{self.state.infection_env_metric().value}\",
-\t\t\"calc_real_effective_reproduction_rate\": {str(self.state.calculate_real_effective_reproduction_number()).lower()},
-\t\t\"breakdown_dead_immune_enabled\": {str(self.state.lethality_toggle()).lower()},
-\t\t\"lethality\": {self.state.lethality()},
-\t\t\"vaccine_enabled\": {str(self.state.vaccine_toggle()).lower()},
-\t\t\"vaccine_time\": {self.state.vaccine_time()},
-\t\t\"vaccine_share\": {self.state.vaccine_share()},
-\t\t\"movement_limit_enabled\": {str(self.state.movement_limit_enabled()).lower()},
-\t\t\"movement_limit_radius\": {self.state.movement_limit_radius()},
-\t\t\"movement_limit_metric\": \"{self.state.movement_limit_metric().value}\",
-\t\t\"movement_limit_high_distances_are_uncommon\": {str(self.state.movement_limit_high_distances_are_uncommon()).lower()},
-\t\t\"incubation_period_enabled\": {str(self.state.incubation_period_enabled()).lower()},
-\t\t\"incubation_period\": {self.state.incubation_period()},
-\t\t\"quarantine_enabled\": {str(self.state.quarantine_enabled()).lower()},
-\t\t\"quarantine_share\": {self.state.quarantine_share()}
-\t}},
+\t\"config\": {self.__batch_config()},
 \t\"runs\": [
 """)
 
                     # Run a batch of simulations
+                    statistics = EnsembleStatistics()
                     for i in range(cfg.BATCH_RUN_ITERATIONS):
                         print(f'Running batch job {i + 1} of {cfg.BATCH_RUN_ITERATIONS}...')
+                        statistics.begin_run()
+                        statistics.add_day(self.__compartment_counts())
                         while self.state.infected_count() > 0 or self.state.get_total_count() < self.state.get_beginning_total_count():
-                            active_provider.get_scheduler().trigger_gui_event(controller.scheduler.Events.NEXT_STEP,
+                            self.simulation.get_scheduler().trigger_gui_event(controller.scheduler.Events.NEXT_STEP,
                                                                               {"state": self.state})
+                            statistics.add_day(self.__compartment_counts())
+                        statistics.end_run()
 
                         results_file.write(f"""\t\t{{
 \t\t\t\"iteration\": {i + 1},
@@ -247,13 +343,18 @@ class SimUi(QtCore.QObject):
                         self.state.seed()  # Reseed simulation
 
                         self.state.reset()
-                        active_provider.get_scheduler().trigger_gui_event(controller.events.Events.RESET,
+                        self.simulation.get_scheduler().trigger_gui_event(controller.events.Events.RESET,
                                                                           kw={"state": self.state})
                         self.state_viz.reset()
 
                     results_file.write(f"""\t]
 }}
 """)
+
+                with open(cfg.BATCH_SUMMARY_FILE, 'w') as summary_file:
+                    json.dump(statistics.summary(), summary_file)
+            elif self.remote is not None:
+                self.remote.play()
             else:
                 self.__event_stop.clear()
                 worker = Worker(self.__run)
@@ -268,6 +369,8 @@ class SimUi(QtCore.QObject):
 
             self.__paused = True
 
+            if self.remote is not None:
+                self.remote.pause()
             self.__event_stop.set()
 
         self.__pause_simulation = lambda: pause_simulation()
@@ -293,8 +396,7 @@ class SimUi(QtCore.QObject):
             next_btn.setEnabled(True)
 
             self.state.reset()
-            active_provider.get_scheduler().trigger_gui_event(controller.events.Events.RESET, kw={"state": self.state})
-            self.state_viz.reset()
+            self.__reset_simulation()
 
         self.__restart = lambda: restart_clicked()
 
@@ -391,8 +493,7 @@ class SimUi(QtCore.QObject):
             self.state.set_size(np.uint(size_slider.value()))
 
             self.state.reset()
-            active_provider.get_scheduler().trigger_gui_event(controller.events.Events.RESET, kw={"state": self.state})
-            self.state_viz.reset()
+            self.__reset_simulation()
 
         size_slider.valueChanged.connect(on_size_slider_value_change)
         size_slider.sliderReleased.connect(on_size_slider_released)
@@ -458,8 +559,7 @@ class SimUi(QtCore.QObject):
             self.state.set_susceptible_share(new_share)
 
             self.state.reset()
-            active_provider.get_scheduler().trigger_gui_event(controller.events.Events.RESET, kw={"state": self.state})
-            self.state_viz.reset()
+            self.__reset_simulation()
 
         susceptible_share_slider.valueChanged.connect(on_susceptible_slider_value_change)
         susceptible_share_slider.sliderReleased.connect(on_susceptible_slider_released)
@@ -497,8 +597,7 @@ class SimUi(QtCore.QObject):
             self.state.set_infected_share(new_share)
 
             self.state.reset()
-            active_provider.get_scheduler().trigger_gui_event(controller.events.Events.RESET, kw={"state": self.state})
-            self.state_viz.reset()
+            self.__reset_simulation()
 
         infected_share_slider.valueChanged.connect(on_infected_slider_value_change)
         infected_share_slider.sliderReleased.connect(on_infected_slider_released)
@@ -678,6 +777,17 @@ class SimUi(QtCore.QObject):
         _, r_settings = self.__build_r_settings()
         layout.addLayout(r_settings)
 
+        layout.addWidget(self.__build_horizontal_separator())
+
+        _, update_mode_settings = self.__build_update_mode_settings()
+        layout.addLayout(update_mode_settings)
+
+        _, transition_calendar_settings = self.__build_transition_calendar_settings()
+        layout.addLayout(transition_calendar_settings)
+
+        _, bulk_movement_settings = self.__build_bulk_movement_settings()
+        layout.addLayout(bulk_movement_settings)
+
         layout.addStretch(1)
 
         self.root_layout.addWidget(controls_widget)
@@ -859,6 +969,54 @@ class SimUi(QtCore.QObject):
 
         return checkbox, layout
 
+    def __build_update_mode_settings(self) -> [QtWidgets.QCheckBox, QtWidgets.QHBoxLayout]:
+        layout = QtWidgets.QHBoxLayout()
+
+        checkbox = QtWidgets.QCheckBox('Synchronous status update')
+        checkbox.setToolTip('All agents see the state of the beginning of the day, changes apply at its end')
+        checkbox.setChecked(self.state.update_mode() is UpdateMode.SYNCHRONOUS)
+
+        def on_change(v) -> None:
+            self.state.set_update_mode(UpdateMode.SYNCHRONOUS if checkbox.isChecked() else UpdateMode.SEQUENTIAL)
+
+        checkbox.stateChanged.connect(on_change)
+
+        layout.addWidget(checkbox)
+
+        return checkbox, layout
+
+    def __build_transition_calendar_settings(self) -> [QtWidgets.QCheckBox, QtWidgets.QHBoxLayout]:
+        layout = QtWidgets.QHBoxLayout()
+
+        checkbox = QtWidgets.QCheckBox('Scheduled transitions')
+        checkbox.setToolTip('Incubation and recovery days are drawn once per agent instead of every day')
+        checkbox.setChecked(self.state.transition_calendar_enabled())
+
+        def on_change(v) -> None:
+            self.state.set_transition_calendar_enabled(checkbox.isChecked())
+
+        checkbox.stateChanged.connect(on_change)
+
+        layout.addWidget(checkbox)
+
+        return checkbox, layout
+
+    def __build_bulk_movement_settings(self) -> [QtWidgets.QCheckBox, QtWidgets.QHBoxLayout]:
+        layout = QtWidgets.QHBoxLayout()
+
+        checkbox = QtWidgets.QCheckBox('Bulk movement')
+        checkbox.setToolTip('All agents move at once instead of one after another')
+        checkbox.setChecked(self.state.bulk_movement_enabled())
+
+        def on_change(v) -> None:
+            self.state.set_bulk_movement_enabled(checkbox.isChecked())
+
+        checkbox.stateChanged.connect(on_change)
+
+        layout.addWidget(checkbox)
+
+        return checkbox, layout
+
     def __build_removed_or_dead_immune_distinction_checkbox(self, callback) -> [QtWidgets.QCheckBox,
                                                                                 QtWidgets.QVBoxLayout]:
         layout = QtWidgets.QVBoxLayout()
@@ -920,6 +1078,7 @@ class SimUi(QtCore.QObject):
             self.state.set_vaccine_toggle(checkbox.isChecked())
             slider.setEnabled(checkbox.isChecked())
             spinbox.setEnabled(checkbox.isChecked())
+            capacity_spinbox.setEnabled(checkbox.isChecked())
 
             callback(v)
 
@@ -932,6 +1091,11 @@ class SimUi(QtCore.QObject):
 
         layout.addLayout(finish_spinbox_layout)
 
+        capacity_spinbox, capacity_spinbox_layout = self.__build_vaccine_capacity_spinbox()
+        capacity_spinbox.setEnabled(checkbox.isChecked())
+
+        layout.addLayout(capacity_spinbox_layout)
+
         slider, vaccine_share_slider_layout = self.__build_vaccine_share_slider()
         slider.setEnabled(checkbox.isChecked())
 
@@ -959,6 +1123,26 @@ class SimUi(QtCore.QObject):
 
         return spinbox, layout
 
+    def __build_vaccine_capacity_spinbox(self) -> [QtWidgets.QSpinBox, QtWidgets.QHBoxLayout]:
+        layout = QtWidgets.QHBoxLayout()
+
+        layout.addWidget(QtWidgets.QLabel('Per day (0 = all at once):'))
+
+        spinbox = QtWidgets.QSpinBox()
+        spinbox.setMinimum(0)
+        spinbox.setMaximum(1000000)
+        spinbox.setSingleStep(10)
+        spinbox.setValue(self.state.vaccine_daily_capacity())
+
+        def value_change() -> None:
+            self.state.set_vaccine_daily_capacity(spinbox.value())
+
+        spinbox.valueChanged.connect(value_change)
+
+        layout.addWidget(spinbox)
+
+        return spinbox, layout
+
     def __build_vaccine_share_slider(self):
         layout = QtWidgets.QVBoxLayout()
         slider = QtWidgets.QSlider(QtCore.Qt.Horizontal)
@@ -996,10 +1180,12 @@ class SimUi(QtCore.QObject):
         def on_change(v):
             self.state.set_movement_limit_enabled(checkbox.isChecked())
 
-            if v:
-                active_provider.set_movement_strategy(LimitedMovementStrategy())
+            if self.simulation is None:
+                pass  # The remote simulation picks the strategy from the synced settings
+            elif v:
+                self.simulation.set_movement_strategy(LimitedMovementStrategy())
             else:
-                active_provider.set_movement_strategy(DefaultMovementStrategy())
+                self.simulation.set_movement_strategy(DefaultMovementStrategy())
 
             metric_select.setEnabled(checkbox.isChecked())
             radius_slider.setEnabled(checkbox.isChecked())
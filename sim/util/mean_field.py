@@ -0,0 +1,135 @@
+import math
+import typing
+import numpy as np
+from model.neighborhood import environment_offsets
+from model.state import SimState
+from util.statistics import COMPARTMENTS
+
+"""
+Mean field approximation of the simulation.
+The population is described by its compartment sizes only, a day is one step of a deterministic map with the
+expected flows of the agent based model. It takes microseconds per day, so it is meant to prune parameter sweeps
+and to seed calibrations before running the agent based simulation.
+The map ignores the spatial correlations of the grid (infected agents sit next to each other), so it overestimates
+the spread, the more the less the agents mix.
+"""
+
+
+class MeanFieldParams(typing.NamedTuple):
+    """Rates of the mean field map, derived from the SimState settings"""
+    agents: float
+    susceptible: float
+    infected: float
+    contacts: float
+    infection_prob: float
+    remove_prob: float
+    lethality: float
+    incubation_days: int
+    quarantine_share: float
+    vaccine_time: int
+    vaccine_share: float
+    vaccine_daily_capacity: int
+
+    @staticmethod
+    def of(state: SimState) -> 'MeanFieldParams':
+        """
+        Maps the settings of the state to the rates.
+        An agent has one cell per offset of the infection environment, the cells are occupied with the density of
+        the population. Without mixing the agent that infected another one stays next to it and is not susceptible
+        anymore, so with the mixing value m an infection finds 1 - m contacts less than the environment holds.
+        :param state: Settings of the simulation
+        :return: Parameters of the map
+        """
+        cells = float(state.size()) ** 2
+        susceptible = state.susceptible_share() * cells
+        infected = state.infected_share() * cells
+        density = (susceptible + infected) / cells
+        neighbours = len(environment_offsets(state.infection_env_radius(), state.infection_env_metric())) * density
+        return MeanFieldParams(
+            agents=susceptible + infected,
+            susceptible=susceptible,
+            infected=infected,
+            contacts=max(0.0, neighbours - (1.0 - state.get_mixing_value_m())),
+            infection_prob=state.infection_prob(),
+            remove_prob=state.remove_prob(),
+            lethality=state.lethality() if state.lethality_toggle() else None,
+            incubation_days=state.incubation_period() + 1 if state.incubation_period_enabled() else 0,
+            quarantine_share=state.quarantine_share() if state.quarantine_enabled() else 0.0,
+            vaccine_time=state.vaccine_time() if state.vaccine_toggle() else None,
+            vaccine_share=state.vaccine_share(),
+            vaccine_daily_capacity=state.vaccine_daily_capacity(),
+        )
+
+
+def reproduction_number(params: MeanFieldParams) -> float:
+    """
+    Basic reproduction number of the map: infections caused by one infectious agent in a susceptible population
+    during its incubation and its infective days (1 / remove_prob on average).
+    """
+    if params.remove_prob <= 0:
+        return math.inf
+    infectious_days = params.incubation_days + (1.0 - params.quarantine_share) / params.remove_prob
+    return params.infection_prob * params.contacts * infectious_days
+
+
+def mean_field_counts(state: SimState, max_days: int = None, threshold: float = 0.5) -> np.ndarray:
+    """
+    Iterates the mean field map until less than threshold agents are infective or incubating.
+    Every day, from the sizes of the beginning of the day: the vaccination takes its share of the susceptible
+    agents (at most vaccine_daily_capacity per day), a susceptible agent is infected with probability
+    1 - (1 - p)^(contacts * x), x being the share of infectious agents on the grid, the infected agents are
+    removed with remove_prob (immune or dead with lethality) and the incubation ends after incubation_period + 1
+    days. With quarantine the share of the infected agents is off the grid, they do not infect and are not
+    counted as infected (like the counters of SimState).
+    :param state: Settings of the simulation
+    :param max_days: Optional upper bound of days
+    :param threshold: Number of infectious agents below which the epidemic is over
+    :return: Expected compartment counts of shape (days + 1, compartments) in the order of COMPARTMENTS, like the
+             counts of a batch run (see controller.batch.run_replicate)
+    """
+    params = MeanFieldParams.of(state)
+    agents = params.agents
+    susceptible = params.susceptible
+    infected = params.infected
+    removed = dead = immune = 0.0
+    # Agents per remaining incubation day, the last one becomes infective next
+    incubating = [0.0] * params.incubation_days
+    log_not_infected = math.log1p(-min(params.infection_prob, 1.0 - 1e-12))
+    vaccine_target = None
+
+    def counts() -> tuple:
+        return susceptible, infected * (1.0 - params.quarantine_share), removed, dead, immune, sum(incubating)
+
+    series = [counts()]
+    day = 0
+    while infected + sum(incubating) >= threshold and (max_days is None or day < max_days):
+        day += 1
+        vaccinated = 0.0
+        if day == params.vaccine_time:
+            vaccine_target = params.vaccine_share * susceptible
+        if vaccine_target is not None and vaccine_target > 0:
+            vaccinated = min(vaccine_target, susceptible)
+            if params.vaccine_daily_capacity > 0:
+                vaccinated = min(vaccinated, params.vaccine_daily_capacity)
+            vaccine_target -= vaccinated
+
+        infectious = infected * (1.0 - params.quarantine_share) + sum(incubating)
+        exposure = params.contacts * infectious / agents if agents > 0 else 0.0
+        new_infected = (susceptible - vaccinated) * -math.expm1(log_not_infected * exposure)
+        new_removed = infected * params.remove_prob
+
+        susceptible -= vaccinated + new_infected
+        immune += vaccinated
+        if incubating:
+            infected += incubating.pop() - new_removed
+            incubating.insert(0, new_infected)
+        else:
+            infected += new_infected - new_removed
+        if params.lethality is None:
+            removed += new_removed
+        else:
+            dead += new_removed * params.lethality
+            immune += new_removed * (1.0 - params.lethality)
+        series.append(counts())
+
+    return np.array(series, dtype=float).reshape(-1, len(COMPARTMENTS))
@@ -0,0 +1,299 @@
+import copy
+import typing
+import numpy as np
+
+"""
+Streaming statistics for ensembles of simulation runs.
+All estimators take one observation at a time and use constant memory, no matter how many runs are fed.
+"""
+
+# Compartments fed by the batch runs, in this order
+COMPARTMENTS = ('susceptible', 'infected', 'removed', 'dead', 'immune', 'incubated')
+
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+class P2Quantiles:
+    """Streaming quantile estimates with the P² algorithm (Jain and Chlamtac, 1985).
+    Estimates several quantiles of several series at once: every observation is an array of the series shape,
+    each element updates the estimators of its series. Every estimator keeps five markers, the middle one is the
+    estimate. Until five observations were seen the exact quantile of the observations is returned."""
+
+    def count(self) -> int:
+        return self.__count
+
+    def probabilities(self) -> tuple:
+        return self.__probabilities
+
+    def push(self, values: np.ndarray) -> None:
+        x = np.broadcast_to(np.asarray(values, dtype=float)[..., np.newaxis], self.__heights.shape[:-1])
+        if self.__count < 5:
+            self.__heights[..., self.__count] = x
+            self.__count += 1
+            if self.__count == 5:
+                self.__heights.sort(axis=-1)
+            return
+        self.__count += 1
+
+        heights = self.__heights
+        positions = self.__positions
+
+        # Cell k with heights[k] <= x < heights[k + 1], extreme markers follow new extremes
+        np.minimum(heights[..., 0], x, out=heights[..., 0])
+        np.maximum(heights[..., 4], x, out=heights[..., 4])
+        cell = np.clip(np.sum(x[..., np.newaxis] >= heights[..., 1:4], axis=-1), 0, 3)
+        positions += np.arange(5) > cell[..., np.newaxis]
+        self.__desired += self.__increments
+
+        for i in (1, 2, 3):
+            d = self.__desired[..., i] - positions[..., i]
+            up = (d >= 1) & (positions[..., i + 1] - positions[..., i] > 1)
+            down = (d <= -1) & (positions[..., i - 1] - positions[..., i] < -1)
+            step = np.where(up, 1.0, 0.0) - np.where(down, 1.0, 0.0)
+            if not step.any():
+                continue
+
+            q_prev, q, q_next = heights[..., i - 1], heights[..., i], heights[..., i + 1]
+            n_prev, n, n_next = positions[..., i - 1], positions[..., i], positions[..., i + 1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                parabolic = q + step / (n_next - n_prev) * (
+                        (n - n_prev + step) * (q_next - q) / (n_next - n)
+                        + (n_next - n - step) * (q - q_prev) / (n - n_prev))
+                neighbour_height = np.where(step > 0, q_next, q_prev)
+                neighbour_position = np.where(step > 0, n_next, n_prev)
+                linear = q + step * (neighbour_height - q) / (neighbour_position - n)
+            adjusted = np.where((q_prev < parabolic) & (parabolic < q_next), parabolic, linear)
+
+            moving = step != 0
+            heights[..., i] = np.where(moving, adjusted, q)
+            positions[..., i] = n + step
+
+    def quantiles(self) -> np.ndarray:
+        """:return Estimates of shape (*series shape, len(probabilities)), NaN before the first observation"""
+        if self.__count == 0:
+            return np.full(self.__heights.shape[:-1], np.nan)
+        if self.__count < 5:
+            seen = np.sort(self.__heights[..., :self.__count], axis=-1)
+            probabilities = np.broadcast_to(np.asarray(self.__probabilities), seen.shape[:-1])
+            index = np.round(probabilities * (self.__count - 1)).astype(int)
+            return np.take_along_axis(seen, index[..., np.newaxis], axis=-1)[..., 0]
+        return self.__heights[..., 2].copy()
+
+    def __init__(self, shape: tuple, probabilities: typing.Sequence[float] = DEFAULT_QUANTILES):
+        """
+        :param shape: Shape of the observed series
+        :param probabilities: Quantiles to estimate, each in [0.0; 1.0]
+        """
+        self.__probabilities = tuple(probabilities)
+        p = np.asarray(self.__probabilities, dtype=float)
+        full_shape = tuple(shape) + (len(p),)
+
+        self.__count = 0
+        self.__heights = np.zeros(full_shape + (5,))
+        self.__positions = np.broadcast_to(np.arange(5, dtype=float), full_shape + (5,)).copy()
+        self.__desired = np.broadcast_to(np.stack([0 * p, 2 * p, 4 * p, 2 + 2 * p, 4 + 0 * p], axis=-1),
+                                         full_shape + (5,)).copy()
+        self.__increments = np.stack([0 * p, p / 2, p, (1 + p) / 2, 1 + 0 * p], axis=-1)
+
+
+class RunningStatistics:
+    """Count, mean, variance (Welford), minimum, maximum and P² quantiles of a stream of observations.
+    An observation is an array of a fixed shape, the statistics are kept per element."""
+
+    def count(self) -> int:
+        return self.__count
+
+    def push(self, values) -> None:
+        x = np.asarray(values, dtype=float)
+        self.__count += 1
+        delta = x - self.__mean
+        self.__mean = self.__mean + delta / self.__count
+        self.__m2 = self.__m2 + delta * (x - self.__mean)
+        self.__min = np.minimum(self.__min, x)
+        self.__max = np.maximum(self.__max, x)
+        self.__quantiles.push(x)
+
+    def mean(self) -> np.ndarray:
+        return self.__mean.copy() if self.__count > 0 else np.full(self.__shape, np.nan)
+
+    def variance(self) -> np.ndarray:
+        """Sample variance, NaN for less than two observations"""
+        if self.__count < 2:
+            return np.full(self.__shape, np.nan)
+        return self.__m2 / (self.__count - 1)
+
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.variance())
+
+    def minimum(self) -> np.ndarray:
+        return self.__min.copy()
+
+    def maximum(self) -> np.ndarray:
+        return self.__max.copy()
+
+    def quantiles(self) -> np.ndarray:
+        """:return Estimates of shape (*shape, len(probabilities)), see P2Quantiles"""
+        return self.__quantiles.quantiles()
+
+    def probabilities(self) -> tuple:
+        return self.__quantiles.probabilities()
+
+    def summary(self) -> dict:
+        """:return JSON serializable summary"""
+        def values(array: np.ndarray):
+            return array.tolist()
+
+        return {
+            'count': self.__count,
+            'mean': values(self.mean()),
+            'std': values(self.std()),
+            'min': values(self.minimum()),
+            'max': values(self.maximum()),
+            'quantiles': {str(p): values(self.quantiles()[..., i]) for i, p in enumerate(self.probabilities())},
+        }
+
+    def __init__(self, shape: tuple = (), probabilities: typing.Sequence[float] = DEFAULT_QUANTILES):
+        self.__shape = tuple(shape)
+        self.__count = 0
+        self.__mean = np.zeros(self.__shape)
+        self.__m2 = np.zeros(self.__shape)
+        self.__min = np.full(self.__shape, np.inf)
+        self.__max = np.full(self.__shape, -np.inf)
+        self.__quantiles = P2Quantiles(self.__shape, probabilities)
+
+
+class EnsembleStatistics:
+    """Per day statistics of the compartment counts of an ensemble of runs, fed day by day.
+    Runs end at different days. A finished run keeps its final counts, so it is counted with them on all later
+    days, also on days that only later runs reach. Besides the daily counts the distributions of the final size
+    (drop of the susceptible count from the first to the last day) and of the peak day (first day with the
+    maximum infected count) are kept.
+    Memory grows with the number of days of the longest run, not with the number of runs."""
+
+    def runs(self) -> int:
+        """Number of finished runs"""
+        return self.__finals.count()
+
+    def days(self) -> int:
+        """Number of days of the longest run (including day 0)"""
+        return len(self.__daily)
+
+    def compartments(self) -> tuple:
+        return self.__compartments
+
+    def begin_run(self) -> None:
+        if self.__run_days is not None:
+            raise RuntimeError('The previous run was not ended')
+        self.__run_days = 0
+        self.__first = None
+        self.__last = None
+        self.__peak = (-np.inf, 0)
+
+    def add_day(self, counts: typing.Sequence[float]) -> None:
+        """Feeds the counts of the next day (starting with day 0) of the current run
+        :param counts: One count per compartment, in the order of compartments()"""
+        if self.__run_days is None:
+            raise RuntimeError('No run was begun')
+        values = np.asarray(counts, dtype=float)
+        day = self.__run_days
+        if day == len(self.__daily):
+            # All finished runs are over by now, so the new day starts with their final counts
+            self.__daily.append(copy.deepcopy(self.__finals))
+        self.__daily[day].push(values)
+
+        if self.__first is None:
+            self.__first = values
+        self.__last = values
+        infected = values[self.__infected_index]
+        if infected > self.__peak[0]:
+            self.__peak = (infected, day)
+        self.__run_days += 1
+
+    def end_run(self) -> None:
+        """Ends the current run, its last counts are carried over to all later days"""
+        if not self.__run_days:
+            raise RuntimeError('No day was added to the run')
+        for day in range(self.__run_days, len(self.__daily)):
+            self.__daily[day].push(self.__last)
+        self.__finals.push(self.__last)
+
+        self.__final_size.push(self.__first[self.__susceptible_index] - self.__last[self.__susceptible_index])
+        self.__peak_day.push(self.__peak[1])
+        self.__elapsed_days.push(self.__run_days - 1)
+        self.__run_days = None
+
+    def add_run(self, series: np.ndarray) -> None:
+        """Feeds a whole run
+        :param series: Counts of shape (days, compartments)"""
+        self.begin_run()
+        for counts in series:
+            self.add_day(counts)
+        self.end_run()
+
+    def daily(self, day: int) -> RunningStatistics:
+        """Statistics of the counts of a day over all finished runs"""
+        return self.__daily[day]
+
+    def mean(self) -> np.ndarray:
+        """:return Mean counts of shape (days, compartments)"""
+        return np.array([statistics.mean() for statistics in self.__daily]).reshape(-1, len(self.__compartments))
+
+    def std(self) -> np.ndarray:
+        """:return Standard deviations of shape (days, compartments)"""
+        return np.array([statistics.std() for statistics in self.__daily]).reshape(-1, len(self.__compartments))
+
+    def quantiles(self) -> np.ndarray:
+        """:return Quantile estimates of shape (days, compartments, len(probabilities))"""
+        return np.array([statistics.quantiles() for statistics in self.__daily]) \
+            .reshape(-1, len(self.__compartments), len(self.__probabilities))
+
+    def final_size(self) -> RunningStatistics:
+        return self.__final_size
+
+    def peak_day(self) -> RunningStatistics:
+        return self.__peak_day
+
+    def elapsed_days(self) -> RunningStatistics:
+        return self.__elapsed_days
+
+    def summary(self) -> dict:
+        """:return JSON serializable summary of all statistics"""
+        quantiles = self.quantiles()
+        return {
+            'runs': self.runs(),
+            'compartments': list(self.__compartments),
+            'daily': {
+                'mean': self.mean().tolist(),
+                'std': self.std().tolist(),
+                'quantiles': {str(p): quantiles[..., i].tolist() for i, p in enumerate(self.__probabilities)},
+            },
+            'final_size': self.__final_size.summary(),
+            'peak_day': self.__peak_day.summary(),
+            'elapsed_days': self.__elapsed_days.summary(),
+        }
+
+    def __init__(self, compartments: typing.Sequence[str] = COMPARTMENTS,
+                 probabilities: typing.Sequence[float] = DEFAULT_QUANTILES,
+                 infected: str = 'infected', susceptible: str = 'susceptible'):
+        """
+        :param compartments: Names of the fed counts
+        :param probabilities: Quantiles to estimate
+        :param infected: Compartment used for the peak day
+        :param susceptible: Compartment used for the final size
+        """
+        self.__compartments = tuple(compartments)
+        self.__probabilities = tuple(probabilities)
+        self.__infected_index = self.__compartments.index(infected)
+        self.__susceptible_index = self.__compartments.index(susceptible)
+
+        shape = (len(self.__compartments),)
+        self.__daily = []
+        self.__finals = RunningStatistics(shape, probabilities)
+        self.__final_size = RunningStatistics((), probabilities)
+        self.__peak_day = RunningStatistics((), probabilities)
+        self.__elapsed_days = RunningStatistics((), probabilities)
+
+        self.__run_days = None
+        self.__first = None
+        self.__last = None
+        self.__peak = (-np.inf, 0)
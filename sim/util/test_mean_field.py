@@ -0,0 +1,53 @@
+from unittest import TestCase
+from controller.batch import run_metrics
+from model.state import SimState
+from util.mean_field import MeanFieldParams, mean_field_counts, reproduction_number
+from util.statistics import COMPARTMENTS
+
+
+class TestMeanField(TestCase):
+
+    def test_recovery_without_infections(self):
+        state = SimState(size=10, susceptible_share=0.5, infected_share=0.5, infection_prob=0, remove_prob=0.5)
+
+        counts = mean_field_counts(state)
+
+        self.assertEqual(counts.shape[1], len(COMPARTMENTS))
+        self.assertEqual(counts.shape[0], 8)  # 50 * 0.5^7 < 0.5
+        self.assertAlmostEqual(counts[3, COMPARTMENTS.index('infected')], 50 * 0.5 ** 3)
+        self.assertAlmostEqual(counts[-1].sum(), 100)
+        self.assertEqual(counts[-1, COMPARTMENTS.index('susceptible')], 50)
+
+    def test_contacts_from_environment_density_and_mixing(self):
+        state = SimState(size=10, susceptible_share=0.4, infected_share=0.1)
+        state.set_infection_env_radius(2)
+        state.set_mixing_value_m(0.75)
+
+        params = MeanFieldParams.of(state)
+
+        # 12 cells within a Manhattan radius of 2, half of them occupied, the infector is there a quarter of the time
+        self.assertAlmostEqual(params.contacts, 12 * 0.5 - 0.25)
+        self.assertAlmostEqual(reproduction_number(params), 0.2 * 5.75 / 0.6)
+
+    def test_incubation_lethality_and_vaccination(self):
+        state = SimState(size=20, susceptible_share=0.69, infected_share=0.01)
+        state.set_incubation_period_enabled(True)
+        state.set_incubation_period(2)
+        state.set_lethality_toggle(True)
+        state.set_vaccine_toggle(True)
+        state.set_vaccine_time(1)
+        state.set_vaccine_daily_capacity(20)
+
+        counts = mean_field_counts(state)
+
+        incubated = counts[:, COMPARTMENTS.index('incubated')]
+        infected = counts[:, COMPARTMENTS.index('infected')]
+        # Nobody new is infective before day 4
+        self.assertAlmostEqual(infected[3], 4 * 0.4 ** 3)
+        self.assertGreater(infected[4], 4 * 0.4 ** 4)
+        self.assertGreater(incubated[1], 0)
+        self.assertAlmostEqual(counts[1, COMPARTMENTS.index('immune')], 20 + 4 * 0.6 * 0.97)
+        self.assertAlmostEqual(counts[-1].sum(), 280)
+        self.assertGreater(counts[-1, COMPARTMENTS.index('dead')], 0)
+        self.assertEqual(counts[-1, COMPARTMENTS.index('removed')], 0)
+        self.assertEqual(set(run_metrics(counts)), {'final_removed_share', 'peak_infected', 'peak_day'})
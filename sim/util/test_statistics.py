@@ -0,0 +1,37 @@
+from unittest import TestCase
+import numpy as np
+from util.statistics import P2Quantiles, RunningStatistics, EnsembleStatistics
+
+
+class TestStatistics(TestCase):
+
+    def test_p2_quantiles_close_to_exact(self):
+        samples = np.random.RandomState(1).normal(size=(5000, 2)) * [1.0, 10.0]
+        sut = P2Quantiles((2,), (0.05, 0.5, 0.95))
+        for sample in samples:
+            sut.push(sample)
+
+        exact = np.quantile(samples, (0.05, 0.5, 0.95), axis=0).T
+        np.testing.assert_allclose(sut.quantiles()[0], exact[0], atol=0.05)
+        np.testing.assert_allclose(sut.quantiles()[1], exact[1], atol=0.5)
+
+    def test_running_moments_match_numpy(self):
+        samples = np.random.RandomState(2).exponential(size=(500, 3))
+        sut = RunningStatistics((3,))
+        for sample in samples:
+            sut.push(sample)
+
+        np.testing.assert_allclose(sut.mean(), samples.mean(axis=0))
+        np.testing.assert_allclose(sut.variance(), samples.var(axis=0, ddof=1))
+        np.testing.assert_allclose(sut.maximum(), samples.max(axis=0))
+
+    def test_finished_runs_keep_their_final_counts(self):
+        sut = EnsembleStatistics(compartments=('susceptible', 'infected'))
+        sut.add_run(np.array([[10, 2], [8, 3], [8, 0]]))
+        sut.add_run(np.array([[10, 2], [6, 4], [4, 5], [3, 0]]))
+
+        self.assertEqual(sut.runs(), 2)
+        self.assertEqual(sut.days(), 4)
+        np.testing.assert_allclose(sut.mean()[3], [(8 + 3) / 2, 0])
+        np.testing.assert_allclose(sut.final_size().mean(), (2 + 7) / 2)
+        np.testing.assert_allclose(sut.peak_day().mean(), (1 + 2) / 2)